@@ -0,0 +1,176 @@
+"""Benchmark the database under concurrent reads and writes: `python -m bench.db`
+
+Runs on a throwaway copy of the schema, filled with reviews. Every process (the
+API and the job workers are separate ones in production) runs writers that
+update a review the way job callbacks do, loading it with its relations and
+committing alone, and readers that page the review list and open a review.
+`--write update` stores the same change with a plain UPDATE instead, and
+`--write queue` hands that UPDATE to the group-committing writer of
+`lib.writer` the way job results are stored. Compare runs with different `DB_*`
+or `WRITER_*` settings, or before and after a change."""
+
+import json
+import os
+from argparse import ArgumentParser
+from asyncio import create_task, gather, run
+from collections import defaultdict
+from multiprocessing import get_context
+from random import choice
+from tempfile import TemporaryDirectory
+from time import monotonic
+from typing import Any
+
+
+def _percentile(values: list[float], percent: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def _seed(rows: int):
+    from lib import db
+    from lib.engine import dispose
+
+    await db.init()
+
+    async def _inner(session):
+        ids = []
+        for _ in range(rows):
+            topic = db.Topic(status=db.Status.done, part=db.TopicPart.III, question="?")
+            submission = db.Submission(topic_id=topic.id, submission="I agree. " * 40)
+            review = db.Review(
+                topic_id=topic.id, submission_id=submission.id, status=db.Status.pending
+            )
+            session.add_all([topic, submission, review])
+            ids.append(review.id)
+        await session.commit()
+        return ids
+
+    ids = await db.create_session_and_run(_inner)
+    await dispose()
+    return ids
+
+
+async def _run(ids: list[str], writers: int, readers: int, duration: float, mode: str):
+    from sqlalchemy import bindparam, update
+
+    from lib import db
+    from lib.engine import dispose
+    from lib.metrics import counters
+    from lib.writer import execute, run_writer, stop_writer
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    errors: dict[str, int] = defaultdict(int)
+    stop_at = monotonic() + duration
+
+    async def _write(id: str):
+        async def _inner(session):
+            review = await db._get_review(id, session)
+            review.overall_feedback = f"Updated at {monotonic()}"
+            session.add(review)
+            await session.commit()
+
+        await db.create_session_and_run(_inner)
+
+    statement = update(db.Review.__table__).where(  # type: ignore
+        db.Review.id == bindparam("review_id")
+    )
+
+    async def _update(id: str):
+        # Commits on its own unless the writer runs
+        await execute(statement, {"review_id": id, "overall_feedback": f"{monotonic()}"})
+
+    async def _read(id: str):
+        await db.list_reviews()
+        await db.get_review(id)
+
+    async def _loop(kind: str, operation):
+        while monotonic() < stop_at:
+            started_at = monotonic()
+            try:
+                await operation(choice(ids))
+                latencies[kind].append(monotonic() - started_at)
+            except Exception as error:
+                errors[f"{kind} {type(error).__name__}"] += 1
+
+    writer = create_task(run_writer()) if mode == "queue" else None
+    operation = _write if mode == "reload" else _update
+    await gather(
+        *[_loop("write", operation) for _ in range(writers)],
+        *[_loop("read", _read) for _ in range(readers)],
+    )
+    if writer:
+        await stop_writer()
+    await dispose()
+    return {
+        "latencies": dict(latencies),
+        "errors": dict(errors),
+        "locked": counters.get("db.locked", 0),
+    }
+
+
+def _process(ids: list[str], writers: int, readers: int, duration: float, mode: str):
+    return run(_run(ids, writers, readers, duration, mode))
+
+
+def _summary(results: list[dict[str, Any]], duration: float):
+    summary: dict[str, Any] = {}
+    for kind in ("write", "read"):
+        values = [
+            value for result in results for value in result["latencies"].get(kind, [])
+        ]
+        summary[kind] = {
+            "per_second": round(len(values) / duration, 1),
+            "p50": round(_percentile(values, 50) * 1000, 1),
+            "p99": round(_percentile(values, 99) * 1000, 1),
+        }
+    errors: dict[str, int] = defaultdict(int)
+    for result in results:
+        for name, count in result["errors"].items():
+            errors[name] += count
+    summary["errors"] = dict(errors)
+    summary["locked"] = sum(result["locked"] for result in results)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark concurrent database access")
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=8, help="Per process")
+    parser.add_argument("--readers", type=int, default=8, help="Per process")
+    parser.add_argument("--rows", type=int, default=2000, help="Reviews to fill in")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds")
+    parser.add_argument(
+        "--write",
+        choices=["reload", "update", "queue"],
+        default="reload",
+        help="How writers store their change",
+    )
+    parser.add_argument("--json", help="Also write the summary to this file")
+    options = parser.parse_args()
+
+    with TemporaryDirectory() as directory:
+        os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory}/bench.sqlite"
+        os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+        ids = run(_seed(options.rows))
+
+        # Fresh interpreters, each with its own engine like separate servers
+        with get_context("spawn").Pool(options.processes) as pool:
+            results = pool.starmap(
+                _process,
+                [(ids, options.writers, options.readers, options.duration, options.write)]
+                * options.processes,
+            )
+
+    summary = _summary(results, options.duration)
+    print(
+        f"writes {summary['write']['per_second']}/s "
+        f"p50 {summary['write']['p50']}ms p99 {summary['write']['p99']}ms, "
+        f"reads {summary['read']['per_second']}/s "
+        f"p50 {summary['read']['p50']}ms p99 {summary['read']['p99']}ms"
+    )
+    print(f"database is locked {summary['locked']:.0f}, errors {summary['errors']}")
+    if options.json:
+        with open(options.json, "w") as file:
+            json.dump(summary, file, indent=2)
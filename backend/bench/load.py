@@ -0,0 +1,231 @@
+"""Load test the API at a target request rate: `python -m bench.load [options]`
+
+Start `bench.mock` and the API pointed at it first. Leave the per-client admission
+limits unset, every request comes from this one address.
+
+Requests start on a Poisson schedule whether or not earlier ones are done, picked
+by the `--mix` weights:
+    topic   POST /topic for a Part 2 or 3 topic
+    review  POST /submission to a finished topic, then POST /review
+    poll    GET /topic or /review of one still pending, or the /topics list
+Reports throughput, latency percentiles per endpoint, how long topics and reviews
+take to finish, job queue depth and "database is locked" errors."""
+
+import json
+from argparse import ArgumentParser
+from asyncio import Task, create_task, gather, run, sleep, wait
+from collections import Counter, defaultdict
+from random import choice, choices, expovariate, random
+from time import monotonic
+from typing import Any
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+
+ESSAY = (
+    "In my opinion, companies should encourage employees to volunteer in the local "
+    "community. Firstly, volunteering builds connections between colleagues, which "
+    "improves teamwork at the office. Secondly, it raises the company's reputation "
+    "with customers, who prefer to buy from businesses that care about society. "
+    "For example, my company planted trees last spring and many clients joined us. "
+    "In conclusion, volunteer work benefits the employees, the company and society."
+)
+
+
+def _percentile(values: list[float], percent: float):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.outcomes: dict[str, Counter[str]] = defaultdict(Counter)
+        self.queued: list[int] = []
+        self.running: list[int] = []
+        self.db_locked = 0.0
+        self.skipped = 0
+
+    def record(self, name: str, seconds: float, outcome: int | str):
+        self.latencies[name].append(seconds)
+        self.outcomes[name][str(outcome)] += 1
+
+    def summary(self, duration: float):
+        requests = sum(sum(outcomes.values()) for outcomes in self.outcomes.values())
+        return {
+            "duration": round(duration, 1),
+            "requests": requests,
+            "throughput": round(requests / duration, 2),
+            "skipped_reviews": self.skipped,
+            "endpoints": {
+                name: {
+                    "count": len(values),
+                    "p50": round(_percentile(values, 50), 3),
+                    "p90": round(_percentile(values, 90), 3),
+                    "p99": round(_percentile(values, 99), 3),
+                    "max": round(max(values), 3),
+                    "outcomes": dict(self.outcomes[name]),
+                }
+                for name, values in sorted(self.latencies.items())
+            },
+            "queue_depth": {
+                "max": max(self.queued, default=0),
+                "mean": round(sum(self.queued) / max(1, len(self.queued)), 1),
+                "running_max": max(self.running, default=0),
+            },
+            "db_locked": self.db_locked,
+        }
+
+
+class Load:
+    def __init__(self, session: ClientSession, recorder: Recorder):
+        self.session = session
+        self.recorder = recorder
+        self.pending_topics: dict[str, float] = {}
+        self.pending_reviews: dict[str, float] = {}
+        self.done_topics: list[str] = []
+
+    async def call(self, name: str, method: str, path: str, **kwargs) -> Any:
+        started_at = monotonic()
+        try:
+            async with self.session.request(method, path, **kwargs) as response:
+                body = await response.read()
+                self.recorder.record(name, monotonic() - started_at, response.status)
+                if response.status < 300 and body:
+                    return json.loads(body)
+        except (ClientError, TimeoutError) as error:
+            self.recorder.record(name, monotonic() - started_at, type(error).__name__)
+        return None
+
+    async def topic(self):
+        part = choice(["2", "3"])
+        topic = await self.call("POST /topic", "POST", "/topic", params={"part": part})
+        if topic:
+            self.pending_topics[topic["id"]] = monotonic()
+
+    async def review(self):
+        if not self.done_topics:
+            self.recorder.skipped += 1
+            return
+
+        # A unique text each time, a cached review would finish instantly
+        text = f"{ESSAY} ({random()})"
+        submission = await self.call(
+            "POST /submission",
+            "POST",
+            "/submission",
+            params={"topic_id": choice(self.done_topics)},
+            json={"submission": text},
+        )
+        if not submission:
+            return
+        id = await self.call(
+            "POST /review", "POST", "/review", params={"submission_id": submission["id"]}
+        )
+        if id:
+            self.pending_reviews[id] = monotonic()
+
+    async def poll(self):
+        pending = [("topic", id) for id in self.pending_topics]
+        pending += [("review", id) for id in self.pending_reviews]
+        if not pending:
+            await self.call("GET /topics", "GET", "/topics")
+            return
+
+        kind, id = choice(pending)
+        result = await self.call(f"GET /{kind}", "GET", f"/{kind}", params={"id": id})
+        if not result or result["status"] == "pending":
+            return
+
+        ids = self.pending_topics if kind == "topic" else self.pending_reviews
+        created_at = ids.pop(id, None)
+        if created_at is not None:
+            seconds = monotonic() - created_at
+            self.recorder.record(f"{kind} ready", seconds, result["status"])
+        if kind == "topic" and result["status"] == "done":
+            self.done_topics.append(id)
+
+    async def sample(self):
+        """Queue depth and lock errors once a second, from the jobs and metrics APIs"""
+        while True:
+            for state, series in (
+                ("queued", self.recorder.queued),
+                ("running", self.recorder.running),
+            ):
+                async with self.session.get(
+                    "/jobs", params={"state": state, "limit": 1000}
+                ) as response:
+                    series.append(len(await response.json()))
+            async with self.session.get("/metrics") as response:
+                metrics = await response.json()
+                self.recorder.db_locked = metrics["counters"].get("db.locked", 0)
+            await sleep(1)
+
+
+async def main(
+    url: str, rps: float, duration: float, drain: float, mix: dict[str, float]
+):
+    recorder = Recorder()
+    async with ClientSession(base_url=url, timeout=ClientTimeout(total=60)) as session:
+        load = Load(session, recorder)
+        scenarios = {"topic": load.topic, "review": load.review, "poll": load.poll}
+        sampler = create_task(load.sample())
+        in_flight: set[Task] = set()
+
+        started_at = monotonic()
+        while monotonic() - started_at < duration:
+            (name,) = choices(list(mix), weights=list(mix.values()))
+            task = create_task(scenarios[name]())
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            await sleep(expovariate(rps))
+
+        if in_flight:
+            await wait(in_flight, timeout=drain)
+        elapsed = monotonic() - started_at
+        sampler.cancel()
+        await gather(sampler, *in_flight, return_exceptions=True)
+
+    return recorder.summary(elapsed)
+
+
+def _print(summary: dict[str, Any]):
+    print(
+        f"{summary['requests']} requests in {summary['duration']}s, "
+        f"{summary['throughput']} req/s, {summary['skipped_reviews']} reviews skipped"
+    )
+    print(f"{'endpoint':<18} {'count':>6} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}")
+    for name, stats in summary["endpoints"].items():
+        print(
+            f"{name:<18} {stats['count']:>6} {stats['p50']:>8} {stats['p90']:>8} "
+            f"{stats['p99']:>8} {stats['max']:>8}  {stats['outcomes']}"
+        )
+    queue = summary["queue_depth"]
+    print(
+        f"queued jobs max {queue['max']} mean {queue['mean']}, "
+        f"running max {queue['running_max']}, db locked {summary['db_locked']:.0f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Drive the API at a target request rate")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--rps", type=float, default=5, help="Scenarios per second")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds")
+    parser.add_argument("--drain", type=float, default=10, help="Seconds to wait after")
+    parser.add_argument(
+        "--mix", default="topic=1,review=2,poll=7", help="Scenario weights"
+    )
+    parser.add_argument("--json", help="Also write the summary to this file")
+    options = parser.parse_args()
+
+    mix = {
+        name: float(weight)
+        for name, weight in (part.split("=") for part in options.mix.split(","))
+    }
+    summary = run(main(options.url, options.rps, options.duration, options.drain, mix))
+    _print(summary)
+    if options.json:
+        with open(options.json, "w") as file:
+            json.dump(summary, file, indent=2)
@@ -0,0 +1,262 @@
+"""Stand-in for OpenRouter's chat completions: `python -m bench.mock [options]`
+
+Answers `/proxy/v1/chat/completions` with made-up topics, reviews and pictures, so
+the API can run and be load tested without paying for real calls. Point the API
+at it with `OPENROUTER_URL=http://127.0.0.1:9999/` (any `OPENROUTER_API_KEY`).
+
+Latency is drawn from `--latency`: a fixed `0.8`, `uniform:0.2,2` or
+`lognormal:1.5,0.6` (median seconds, sigma). Failures are injected at the given
+rates, and `GET /stats` returns what was served so far."""
+
+import json
+import re
+from argparse import ArgumentParser
+from asyncio import sleep
+from base64 import b64encode
+from collections import defaultdict
+from math import exp
+from os import urandom
+from random import choice, gauss, randint, random, randrange, uniform
+from typing import Any, Callable
+
+from aiohttp import web
+
+WORDS = (
+    "office manager client budget schedule meeting report project delivery invoice "
+    "customer order team supplier contract deadline presentation training policy "
+    "warehouse colleague department conference survey proposal"
+).split()
+LEVELS = [(8, 170, 190), (7, 140, 160), (6, 110, 130), (5, 90, 100), (4, 70, 80)]
+ANNOTATION_TYPES = ["grammar", "vocabulary", "coherence", "mechanics"]
+FORMATTING_REQUEST = "### JSON FORMATTING CORRECTION REQUEST"
+SUBMISSION_REQUEST = "### TOEIC SUBMISSION DATA"
+
+stats: dict[str, float] = defaultdict(float)
+
+
+def _latency(spec: str) -> Callable[[], float]:
+    kind, _, args = spec.partition(":")
+    if not args:
+        return lambda: float(kind)
+
+    a, b = (float(value) for value in args.split(","))
+    if kind == "uniform":
+        return lambda: uniform(a, b)
+    if kind == "lognormal":
+        return lambda: a * exp(gauss(0, b))
+    raise ValueError(f"unknown latency distribution {kind}")
+
+
+def _words(low: int, high: int):
+    return " ".join(choice(WORDS) for _ in range(randint(low, high))).capitalize()
+
+
+def _summary():
+    return {"summary": _words(3, 6), "description": _words(10, 20)}
+
+
+def _p1():
+    return {"artist_prompt": _words(15, 30), "keywords": [choice(WORDS), choice(WORDS)]}
+
+
+def _p2():
+    return {
+        "information": _summary(),
+        "test_content": {
+            "email_header": {
+                "from_": "Alex Kim <alex@example.com>",
+                "to": "Sam Lee <sam@example.com>",
+                "subject": _words(3, 6),
+                "sent": "March 12, 2:30 P.M.",
+            },
+            "email_body": _words(60, 120),
+            "direction": _words(20, 30),
+        },
+    }
+
+
+def _p3():
+    return {
+        "information": _summary(),
+        "test_content": {
+            "context_statement": _words(20, 40),
+            "question_prompt": _words(10, 20),
+            "task_requirement": _words(10, 20),
+        },
+    }
+
+
+def _review():
+    # Mostly settled reviews within one level's band, some straddling two levels
+    level, low, high = choice(LEVELS)
+    if random() < 0.3:
+        high += 20
+    return {
+        "score_range": [low, high],
+        "level_achieved": level,
+        "overall_feedback": _words(40, 80),
+        "summary_feedback": _words(10, 20),
+        "detail_score": {
+            "grammar": randint(1, 5),
+            "vocabulary": randint(1, 5),
+            "organization": randint(1, 5),
+            "task_fulfillment": randint(1, 5),
+        },
+        "annotations": [
+            {
+                "target_text": choice(WORDS),
+                "context_before": _words(3, 6),
+                "type": choice(ANNOTATION_TYPES),
+                "replacement": choice([None, choice(WORDS)]),
+                "feedback": _words(8, 16),
+            }
+            for _ in range(randint(2, 8))
+        ],
+        "improvement_suggestions": [_words(8, 16) for _ in range(3)],
+    }
+
+
+SCHEMAS: dict[str, Callable[[], dict[str, Any]]] = {
+    "P1Response": _p1,
+    "P2Response": _p2,
+    "P3Response": _p3,
+    "ReviewResponse": _review,
+}
+
+
+def _content(body: dict[str, Any]) -> dict[str, Any] | None:
+    """Something shaped like what the request asks for, by schema or by prompt"""
+    messages = body["messages"]
+    system = messages[0]["content"] if len(messages) > 1 else ""
+    user = messages[-1]["content"]
+
+    response_format = body.get("response_format") or {}
+    name = (response_format.get("json_schema") or {}).get("name")
+    if name in SCHEMAS:
+        return SCHEMAS[name]()
+
+    if user.startswith(FORMATTING_REQUEST):
+        # Answer the repair with a clean object of the same kind
+        for key, factory in (
+            ("score_range", _review),
+            ("email_header", _p2),
+            ("context_statement", _p3),
+            ("artist_prompt", _p1),
+        ):
+            if key in user:
+                return factory()
+        return None
+    if user.startswith(SUBMISSION_REQUEST):
+        return _review()
+    if "**PART:** 1" in user:
+        if name == "P1BatchResponse" or "several distinct" in system:
+            return {"questions": [_p1() for _ in range(user.count("### Scenario"))]}
+        return _p1()
+    if "**PART:** 2" in user:
+        return _p2()
+    if "**PART:** 3" in user:
+        return _p3()
+    return None
+
+
+def _malform(text: str):
+    """Break `text` the ways models do, each answer has to be repaired differently"""
+    mode = randrange(4)
+    if mode == 0:
+        return "```json\n" + text[: len(text) * 3 // 4]  # Fenced and cut off
+    if mode == 1:
+        return "Here is the JSON you asked for:\n" + text
+    if mode == 2:
+        return text.replace('"grammar"', '"Grammar"').replace('"vocabulary"', '"Vocab"')
+    return re.sub(r'"(\w+)":', r"'\1':", text)  # Single quoted keys
+
+
+def _completion(body: dict[str, Any], message: dict[str, Any]):
+    return {
+        "id": "mock",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body["model"],
+        "choices": [{"index": 0, "message": message}],
+        "usage": {"prompt_tokens": 500, "completion_tokens": 500, "total_tokens": 1000},
+    }
+
+
+async def _stream(request: web.Request, text: str):
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    await response.write(b": OPENROUTER PROCESSING\n\n")
+    for start in range(0, len(text), 16):
+        delta = {"content": text[start : start + 16]}
+        chunk = {"id": "mock", "choices": [{"index": 0, "delta": delta}]}
+        await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await sleep(0.005)
+    await response.write(b"data: [DONE]\n\n")
+    return response
+
+
+async def completions(request: web.Request):
+    options = request.app["options"]
+    body = await request.json()
+    stats["requests"] += 1
+
+    await sleep(options.latency())
+    if random() < options.rate_limit:
+        stats["rate_limited"] += 1
+        return web.json_response(
+            {"error": "rate limited"}, status=429, headers={"Retry-After": "1"}
+        )
+    if random() < options.error_rate:
+        stats["errors"] += 1
+        return web.json_response({"error": "upstream unavailable"}, status=503)
+
+    if "modalities" in body:
+        stats["images"] += 1
+        url = f"data:image/png;base64,{b64encode(options.image).decode()}"
+        message = {
+            "role": "assistant",
+            "content": "",
+            "images": [{"type": "image_url", "image_url": {"url": url}}],
+        }
+        return web.json_response(_completion(body, message))
+
+    content = _content(body)
+    text = "pong" if content is None else json.dumps(content)
+    constrained = (body.get("response_format") or {}).get("type") == "json_schema"
+    if content is not None and not constrained and random() < options.malformed:
+        stats["malformed"] += 1
+        text = _malform(text)
+
+    stats["streams" if body.get("stream") else "completions"] += 1
+    if body.get("stream"):
+        return await _stream(request, text)
+    return web.json_response(_completion(body, {"role": "assistant", "content": text}))
+
+
+async def get_stats(_: web.Request):
+    return web.json_response(stats)
+
+
+def _image(size: int):
+    # A PNG signature and random filler, the API only stores it
+    return b"\x89PNG\r\n\x1a\n" + urandom(size)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve fake OpenRouter chat completions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--latency", type=_latency, default=_latency("0.5"))
+    parser.add_argument("--error-rate", type=float, default=0, help="Share of 503s")
+    parser.add_argument("--rate-limit", type=float, default=0, help="Share of 429s")
+    parser.add_argument("--malformed", type=float, default=0, help="Share of bad JSON")
+    parser.add_argument("--image-kb", type=int, default=512, help="Fake picture size")
+    options = parser.parse_args()
+    options.image = _image(options.image_kb * 1024)
+
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["options"] = options
+    app.router.add_post("/proxy/v1/chat/completions", completions)
+    app.router.add_get("/stats", get_stats)
+    print(f"mock OpenRouter on http://{options.host}:{options.port}/")
+    web.run_app(app, host=options.host, port=options.port, print=None)
@@ -0,0 +1,101 @@
+from asyncio import Lock, sleep
+from collections import Counter
+from contextlib import asynccontextmanager
+from math import ceil
+from time import monotonic
+
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from .engine import create_session_and_run
+from .env import ADMISSION_MAX_WAIT, ADMISSION_QUEUE_SIZE
+from .exception import Overloaded
+from .metrics import gauge, inc
+from .task import Job, JobState
+
+
+class Admission:
+    """Budget of unfinished jobs of some kinds, counted from the job table so every
+    API process sees the same numbers. Requests over the global budget wait in a
+    bounded queue, requests over their client's budget are turned away at once."""
+
+    def __init__(self, name: str, kinds: list[str], limit: int, client_limit: int):
+        self.name = name
+        self.kinds = kinds
+        self.limit = limit
+        self.client_limit = client_limit
+        self.waiting = 0  # Requests not yet admitted or turned away
+        self.reserved = 0  # Admitted requests whose job isn't queued yet
+        self._reserved_by: Counter[str | None] = Counter()
+        self._lock = Lock()
+
+    async def _in_flight(self, client: str | None):
+        async def _inner(session: AsyncSession):
+            statement = select(
+                func.count(),
+                func.count().filter(Job.client == client),  # type: ignore
+            ).where(
+                Job.kind.in_(self.kinds),  # type: ignore
+                Job.state.in_([JobState.queued, JobState.running]),  # type: ignore
+            )
+            return (await session.execute(statement)).one()
+
+        total, mine = await create_session_and_run(_inner, read=True)
+        gauge(f"admission.{self.name}.in_flight", total)
+        return total, mine
+
+    def _reject(self, reason: str, status: int, retry_after: float):
+        inc(f"admission.{self.name}.rejected.{reason}")
+        return Overloaded(status, max(1, ceil(retry_after)))
+
+    @asynccontextmanager
+    async def admit(self, client: str | None = None):
+        """Wait until a new job fits the budget, raise `Overloaded` if it doesn't.
+        Queue the job inside the block, until then its slot is held in this process
+        so that requests admitted meanwhile count it without sharing one lock."""
+        if self.limit <= 0:
+            yield
+            return
+
+        if self.waiting >= ADMISSION_QUEUE_SIZE:
+            raise self._reject("queue_full", 503, ADMISSION_MAX_WAIT)
+
+        self._count_waiting(1)
+        try:
+            await self._reserve(client)
+        finally:
+            self._count_waiting(-1)
+
+        try:
+            yield
+        finally:
+            self.reserved -= 1
+            self._reserved_by[client] -= 1
+            if not self._reserved_by[client]:
+                del self._reserved_by[client]
+
+    async def _reserve(self, client: str | None):
+        deadline = monotonic() + ADMISSION_MAX_WAIT
+        while True:
+            async with self._lock:
+                total, mine = await self._in_flight(client)
+                total += self.reserved
+                mine += self._reserved_by[client]
+                if client and self.client_limit > 0 and mine >= self.client_limit:
+                    raise self._reject("client", 429, ADMISSION_MAX_WAIT)
+                if total < self.limit:
+                    inc(f"admission.{self.name}.admitted")
+                    self.reserved += 1
+                    self._reserved_by[client] += 1
+                    return
+
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                raise self._reject("timeout", 503, ADMISSION_MAX_WAIT)
+            # Jobs may finish in another process, so there is nothing to wait on
+            await sleep(min(0.25, remaining))
+
+    def _count_waiting(self, change: int):
+        self.waiting += change
+        gauge(f"admission.{self.name}.waiting", self.waiting)
@@ -1,26 +1,88 @@
 import json
-from random import choice, choices
-from typing import Any, Literal, Optional, Union
-
-from aiohttp import ClientSession
+from asyncio import FIRST_COMPLETED, Task, create_task, shield, sleep, wait
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from functools import partial
+from hashlib import sha256
+from random import choice, choices, random
+from time import monotonic
+from traceback import format_exc
+from typing import Any, Callable, Coroutine, Literal, Optional, TypeVar, Union, cast
+from uuid import uuid4
+
+from aiofiles import open as open_file
+from aiofiles.os import remove
+from aiohttp import (
+    ClientConnectionError,
+    ClientResponse,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+)
 from pydantic import BaseModel, Field, ValidationError
 from sqlmodel import SQLModel
 
+from .breaker import BreakerState, CircuitBreaker
 from .env import (
+    AI_BREAKER_COOLDOWN,
+    AI_HEDGE_DELAY,
+    AI_HEDGE_MIN_SAMPLES,
+    AI_HEDGE_PERCENTILE,
+    AI_HEDGE_SAME_MODEL,
+    AI_JSON_SCHEMA_MODELS,
+    AI_MAX_ATTEMPTS,
+    AI_MAX_GENERATIONS,
     ARTIST_MODEL,
+    ARTIST_MODEL_CONCURRENCY,
+    ARTIST_MODEL_RPM,
+    ARTIST_MODEL_TIMEOUT,
+    ARTIST_MODEL_TPM,
     OPENROUTER_API_KEY,
     OPENROUTER_URL,
+    QUESTION_FALLBACK_MODEL,
     QUESTION_MODEL,
+    QUESTION_MODEL_CONCURRENCY,
+    QUESTION_MODEL_RPM,
+    QUESTION_MODEL_TIMEOUT,
+    QUESTION_MODEL_TPM,
+    REVIEW_CASCADE_MAX_RANGE,
+    REVIEW_CASCADE_MODEL,
+    REVIEW_FALLBACK_MODEL,
     REVIEW_MODEL,
+    REVIEW_MODEL_CONCURRENCY,
+    REVIEW_MODEL_RPM,
+    REVIEW_MODEL_TIMEOUT,
+    REVIEW_MODEL_TPM,
 )
+from .exception import UpstreamError
+from .metrics import LatencyWindow, counters, gauge, inc
+from .ratelimit import ModelLimiter
+from .repair import repair
+from .schema import json_schema
+from .util import DataURLStreamDecoder, JSONObjectStreamScanner
+
+T = TypeVar("T")
+M = TypeVar("M", bound=BaseModel)
+
+IMAGE_CHUNK_SIZE = 64 * 1024
 
 client: ClientSession
 
 
 def init():
     global client
+    pool_size = (
+        QUESTION_MODEL_CONCURRENCY + REVIEW_MODEL_CONCURRENCY + ARTIST_MODEL_CONCURRENCY
+    )
     client = ClientSession(
         base_url=OPENROUTER_URL,
+        connector=TCPConnector(
+            limit=pool_size,
+            limit_per_host=pool_size,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        ),
         headers={
             "Authorization": f"Bearer {OPENROUTER_API_KEY}",
             "Content-Type": "application/json",
@@ -59,6 +121,10 @@ class P1Response(BaseModel):
     keywords: tuple[str, str]
 
 
+class P1BatchResponse(BaseModel):
+    questions: list[P1Response]
+
+
 class P2ContentHeader(BaseModel):
     from_: str
     to: str
@@ -90,6 +156,7 @@ class P3Response(BaseModel):
 
 system_prompt_for_topic_p1 = ""
 system_prompt_for_image_p1 = ""
+system_prompt_for_topic_p1_batch = ""
 system_prompt_for_topic_p2 = ""
 system_prompt_for_topic_p3 = ""
 themes_for_p1: list[P1Theme] = []
@@ -108,6 +175,9 @@ with open("assets/topic/p1/system.txt") as file:
 with open("assets/topic/p1/image.txt") as file:
     system_prompt_for_image_p1 = file.read()
 
+with open("assets/topic/p1/batch.txt") as file:
+    system_prompt_for_topic_p1_batch = file.read()
+
 with open("assets/topic/p1/theme.json") as file:
     raw_themes = json.load(file)
     themes_for_p1 = [P1Theme.model_validate(theme) for theme in raw_themes]
@@ -165,11 +235,22 @@ class BaseRequestFormat(BaseModel):
     type: Literal["json_object"]
 
 
+class SchemaRequestFormat(BaseModel):
+    type: Literal["json_schema"]
+    json_schema: dict[str, Any]
+
+
 class BaseRequest(BaseModel):
     model: str
     messages: list[BaseUserMessage] | str
     stream: bool = Field(default=False)
-    response_format: Optional[BaseRequestFormat] = Field(default=None)
+    response_format: Optional[BaseRequestFormat | SchemaRequestFormat] = Field(
+        default=None
+    )
+
+
+class ProbeRequest(BaseRequest):
+    max_tokens: int
 
 
 class ImageConfig(BaseModel):
@@ -192,12 +273,34 @@ class BaseReponseChoice(BaseModel):
     message: BaseReponseMessage
 
 
+class BaseResponseUsage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+
+
 class BaseReponse(BaseModel):
     id: str
     object: str
     created: int
     model: str
     choices: list[BaseReponseChoice]
+    usage: Optional[BaseResponseUsage] = Field(default=None)
+
+
+class BaseStreamDelta(BaseModel):
+    role: Optional[str] = Field(default=None)
+    content: Optional[str] = Field(default=None)
+
+
+class BaseStreamChoice(BaseModel):
+    index: int
+    delta: BaseStreamDelta
+
+
+class BaseStreamResponse(BaseModel):
+    id: str
+    choices: list[BaseStreamChoice]
 
 
 class ReviewResponse(SQLModel):
@@ -230,46 +333,539 @@ class Annotation(SQLModel):
     feedback: str
 
 
+ReviewPath = Literal["premium", "cheap", "escalated", "cached"]
+
+
+class ReviewOutcome(BaseModel):
+    response: Optional[ReviewResponse]
+    path: ReviewPath
+    escalation: Optional[str] = Field(default=None)  # Why the cheap review was dropped
+
+
+class ReviewStreamEvent(BaseModel):
+    event: Literal["field", "annotation", "done", "failed"]
+    data: Any = Field(default=None)
+
+
+in_flight: dict[str, Task[Any]] = {}
+
+
+def fingerprint(request: BaseRequest):
+    return sha256(request.model_dump_json().encode()).hexdigest()
+
+
+async def single_flight(key: str, factory: Callable[[], Coroutine[Any, Any, T]]) -> T:
+    """
+    Run `factory()` once per `key` at a time: concurrent callers with the same key
+    await the same task instead of sending their own identical request.
+    """
+    task = in_flight.get(key)
+    if task is None:
+        task = create_task(factory())
+        in_flight[key] = task
+        task.add_done_callback(lambda _: in_flight.pop(key, None))
+        inc("single_flight.leader")
+    else:
+        inc("single_flight.shared")
+
+    # Shielded so that one caller being cancelled doesn't cancel the others
+    return await shield(task)
+
+
+ModelRole = Literal["question", "review", "artist"]
+
+limiters: dict[ModelRole, ModelLimiter] = {
+    "question": ModelLimiter(
+        "question", QUESTION_MODEL_CONCURRENCY, QUESTION_MODEL_RPM, QUESTION_MODEL_TPM
+    ),
+    "review": ModelLimiter(
+        "review", REVIEW_MODEL_CONCURRENCY, REVIEW_MODEL_RPM, REVIEW_MODEL_TPM
+    ),
+    "artist": ModelLimiter(
+        "artist", ARTIST_MODEL_CONCURRENCY, ARTIST_MODEL_RPM, ARTIST_MODEL_TPM
+    ),
+}
+
+# Rough completion size per role, reserved from the token bucket up front
+expected_output_tokens: dict[ModelRole, int] = {
+    "question": 1000,
+    "review": 4000,
+    "artist": 1500,
+}
+
+
+timeouts: dict[ModelRole, float] = {
+    "question": QUESTION_MODEL_TIMEOUT,
+    "review": REVIEW_MODEL_TIMEOUT,
+    "artist": ARTIST_MODEL_TIMEOUT,
+}
+
+fallback_models: dict[ModelRole, str | None] = {
+    "question": QUESTION_FALLBACK_MODEL,
+    "review": REVIEW_FALLBACK_MODEL,
+    "artist": None,
+}
+
+latencies: dict[ModelRole, LatencyWindow] = {
+    "question": LatencyWindow(),
+    "review": LatencyWindow(),
+    "artist": LatencyWindow(),
+}
+
+
+breakers: dict[str, CircuitBreaker] = {}
+
+
+def _breaker(model: str):
+    if model not in breakers:
+        breakers[model] = CircuitBreaker(model)
+    return breakers[model]
+
+
+def _route(role: ModelRole, model: str):
+    """The model a call meant for `model` goes to, its fallback while it is cut off"""
+    if _breaker(model).allow():
+        return model
+
+    fallback = fallback_models[role]
+    if fallback and fallback != model and _breaker(fallback).allow():
+        inc(f"ai.{role}.rerouted")
+        return fallback
+
+    inc(f"ai.{role}.fast_failed")
+    raise UpstreamError(503, f"{role} model is unavailable")
+
+
+# Models that turned a `json_schema` request down, they get `json_object` from now on
+json_schema_rejected: set[str] = set()
+
+
+def _response_format(response_model: type[BaseModel]):
+    """Constrain the output to the schema of `response_model` when it is enabled"""
+    if not AI_JSON_SCHEMA_MODELS:
+        return BaseRequestFormat(type="json_object")
+    return SchemaRequestFormat(
+        type="json_schema", json_schema=json_schema(response_model)
+    )
+
+
+def _fit_format(
+    format: BaseRequestFormat | SchemaRequestFormat | None, model: str
+) -> BaseRequestFormat | SchemaRequestFormat | None:
+    """Fall back to plain JSON mode for models that can't take a schema"""
+    if not isinstance(format, SchemaRequestFormat):
+        return format
+    if model in json_schema_rejected or not (
+        "*" in AI_JSON_SCHEMA_MODELS or model in AI_JSON_SCHEMA_MODELS
+    ):
+        return BaseRequestFormat(type="json_object")
+    return format
+
+
+def _estimate_tokens(role: ModelRole, body: dict[str, Any]):
+    return len(json.dumps(body)) // 4 + expected_output_tokens[role]
+
+
+def _retry_after(response: ClientResponse):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0, (parsedate_to_datetime(value) - datetime.now(UTC)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+@asynccontextmanager
+async def _open(role: ModelRole, request: BaseRequest):
+    """
+    Send `request` through the limiter of `role`, retrying 429 and 5xx responses,
+    and yield the successful response while still holding the limiter slot.
+    Fails fast, or goes to the fallback model, while the model's breaker is open.
+    """
+    limiter = limiters[role]
+    body = request.model_dump()
+    estimated_tokens = _estimate_tokens(role, body)
+
+    failure: Exception = UpstreamError(429, f"{role} model kept rejecting the request")
+    for attempt in range(AI_MAX_ATTEMPTS):
+        body["model"] = _route(role, request.model)
+        breaker = _breaker(body["model"])
+        format = _fit_format(request.response_format, body["model"])
+        body["response_format"] = format.model_dump() if format else None
+        async with limiter.slot(estimated_tokens) as usage:
+            try:
+                response = await client.post(
+                    url="/proxy/v1/chat/completions",
+                    json=body,
+                    timeout=ClientTimeout(total=timeouts[role]),
+                )
+            except TimeoutError:
+                breaker.failure()
+                inc(f"ai.{role}.timeouts")
+                delay = min(2**attempt, 30) + random()
+                print(f"{role} model timed out, retry in {delay:.1f}s")
+                failure = TimeoutError(f"{role} model kept timing out")
+
+            except ClientConnectionError as error:
+                breaker.failure()
+                inc(f"ai.{role}.connection_errors")
+                delay = min(2**attempt, 30) + random()
+                print(f"{role} model unreachable ({error}), retry in {delay:.1f}s")
+                failure = UpstreamError(503, f"{role} model is unreachable: {error}")
+
+            else:
+                if response.status >= 500:
+                    breaker.failure()
+                elif response.status != 429:
+                    breaker.success()
+
+                if response.status == 429 or response.status >= 500:
+                    delay = _retry_after(response) or min(2**attempt, 30) + random()
+                    response.release()
+                    if response.status == 429:
+                        limiter.pause(delay)
+                    print(
+                        f"{role} model returned {response.status}, retry in {delay:.1f}s"
+                    )
+                    failure = UpstreamError(
+                        response.status, f"{role} model kept rejecting the request"
+                    )
+
+                elif response.status >= 400:
+                    message = await response.text()
+                    response.release()
+                    if not isinstance(format, SchemaRequestFormat):
+                        raise UpstreamError(response.status, message)
+
+                    # Most likely the schema isn't supported, resend in JSON mode
+                    json_schema_rejected.add(body["model"])
+                    inc(f"ai.{role}.json_schema_rejected")
+                    print(f"{role} model rejected the JSON schema: {message}")
+                    delay = 0
+
+                else:
+                    async with response:
+                        yield response, usage
+                    return
+
+        await sleep(delay)
+
+    raise failure
+
+
+async def _probe(model: str):
+    breaker = breakers[model]
+    request = ProbeRequest(
+        model=model,
+        messages=[BaseUserMessage(role="user", content="ping")],
+        max_tokens=1,
+    )
+    try:
+        async with client.post(
+            url="/proxy/v1/chat/completions",
+            json=request.model_dump(),
+            timeout=ClientTimeout(total=AI_BREAKER_COOLDOWN),
+        ) as response:
+            if response.status >= 500:
+                breaker.failure()
+            elif response.status != 429:
+                breaker.success()
+    except (TimeoutError, ClientConnectionError):
+        breaker.failure()
+
+
+async def run_probe():
+    """
+    Send a tiny request to every cut off model once its cooldown is over, so that a
+    recovered model is closed again even when all of its traffic is rerouted.
+    """
+    while True:
+        await sleep(1)
+        for model, breaker in list(breakers.items()):
+            if breaker.state != BreakerState.closed and breaker.allow():
+                try:
+                    await _probe(model)
+                except Exception:
+                    print(format_exc())
+
+
+async def _post(
+    role: ModelRole, request: BaseRequest, latency: LatencyWindow | None = None
+):
+    async with _open(role, request) as (response, usage):
+        # Validated straight from the body bytes, without an intermediate dict
+        data = BaseReponse.model_validate_json(await response.read())
+        if data.usage:
+            usage.tokens = data.usage.total_tokens
+        if latency is not None:
+            # From when the request went out, waiting for the limiter is not the model
+            latency.observe(monotonic() - usage.started_at)
+        return data
+
+
+def _parse(content: str, response_model: type[M]):
+    schema = response_model.__name__
+    try:
+        result = response_model.model_validate_json(slice_md(content))
+        inc(f"json_repair.{schema}.direct")
+        return result, None
+    except ValidationError:
+        pass
+
+    try:
+        result = repair(content, response_model)
+        inc(f"json_repair.{schema}.local_repair")
+        return result, None
+    except (json.decoder.JSONDecodeError, ValidationError) as error:
+        print(error)
+        return None, error
+
+
+def _hedge_delay(role: ModelRole):
+    if AI_HEDGE_PERCENTILE <= 0 or not (fallback_models[role] or AI_HEDGE_SAME_MODEL):
+        return None
+    if len(latencies[role]) < AI_HEDGE_MIN_SAMPLES:
+        return AI_HEDGE_DELAY
+    return latencies[role].percentile(AI_HEDGE_PERCENTILE)
+
+
+async def _hedged(
+    role: ModelRole,
+    request: BaseRequest,
+    parse: Callable[[str], tuple[T | None, Exception | None]],
+    metric: str,
+):
+    """
+    Send `request`, and a duplicate to the fallback model if it is still unanswered
+    once it is slower than most recent calls. The first answer that parses wins and
+    the other call is cancelled. Returns the content, the result and the parse error,
+    of the first answer when none parses.
+    """
+
+    def _attempt(request: BaseRequest):
+        return create_task(_complete(role, request, metric, latencies[role]))
+
+    primary = _attempt(request)
+    attempts = [primary]
+    inc(f"ai.{role}.calls")
+    try:
+        delay = _hedge_delay(role)
+        if delay is not None:
+            gauge(f"ai.{role}.hedge_delay", delay)
+            done, _ = await wait(attempts, timeout=delay)
+            if not done:
+                inc(f"ai.{role}.hedged")
+                model = fallback_models[role] or request.model
+                attempts.append(_attempt(request.model_copy(update={"model": model})))
+
+        content: str | None = None
+        error: Exception | None = None
+        failure: Exception | None = None
+        pending = set(attempts)
+        while pending:
+            done, pending = await wait(pending, return_when=FIRST_COMPLETED)
+            for task in done:
+                try:
+                    answer = task.result()
+                except Exception as exception:
+                    failure = failure or exception
+                    continue
+
+                result, parse_error = parse(answer)
+                if result is not None:
+                    if task is not primary:
+                        inc(f"ai.{role}.hedge_won")
+                    return answer, result, None
+                if content is None:
+                    content, error = answer, parse_error
+
+        if content is None:
+            raise cast(Exception, failure)
+        return content, None, error
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+async def _generate(role: ModelRole, request: BaseRequest, response_model: type[M]):
+    """
+    Request a JSON completion and parse it as `response_model`, recovering from bad
+    output in increasingly expensive stages: a local repair, then a short repair
+    request with only the broken output, and only then a full regeneration.
+    """
+    schema = response_model.__name__
+    format = _fit_format(request.response_format, request.model)
+    mode = format.type if format else "text"
+    for attempt in range(AI_MAX_GENERATIONS):
+        if attempt:
+            inc(f"json_repair.{schema}.full_retry")
+            await sleep(min(2**attempt, 30) * random())
+
+        content, result, error = await _hedged(
+            role,
+            request,
+            partial(_parse, response_model=response_model),
+            f"json_repair.{schema}.generation",
+        )
+
+        # How often each response format needs a repair request or a regeneration
+        inc(f"json_repair.{schema}.{mode}.generations")
+        if result is None:
+            inc(f"json_repair.{schema}.{mode}.retried")
+        generations = counters[f"json_repair.{schema}.{mode}.generations"]
+        retried = counters[f"json_repair.{schema}.{mode}.retried"]
+        gauge(f"json_repair.{schema}.{mode}.retry_rate", retried / generations)
+        if result is not None:
+            return result
+
+        fix_request = BaseRequest(
+            model=request.model,
+            messages=[
+                BaseUserMessage(
+                    role="user",
+                    content=base_fix_json_request.format(
+                        previous_response=content, error=error
+                    ),
+                )
+            ],
+            response_format=_response_format(response_model),
+        )
+        try:
+            content = await _complete(
+                role, fix_request, f"json_repair.{schema}.repair_request"
+            )
+        except (UpstreamError, TimeoutError) as error:
+            # A failed repair request is no worse than a bad one, regenerate in full
+            print(error)
+            continue
+
+        try:
+            result = repair(content, response_model)
+            inc(f"json_repair.{schema}.repair_request")
+            return result
+        except (json.decoder.JSONDecodeError, ValidationError) as error:
+            print(error)
+
+    inc(f"json_repair.{schema}.failed")
+    return None
+
+
+async def _complete(
+    role: ModelRole,
+    request: BaseRequest,
+    metric: str,
+    latency: LatencyWindow | None = None,
+):
+    started_at = monotonic()
+    data = await _post(role, request, latency)
+    inc(f"{metric}.seconds", monotonic() - started_at)
+    if data.usage:
+        inc(f"{metric}.tokens", data.usage.total_tokens)
+    return data.choices[0].message.content
+
+
 def format_message(messages: list[BaseUserMessage]):
     return [message.model_dump() for message in messages]
 
 
-async def generate_image(prompt: str):
-    response = await client.post(
-        url="/proxy/v1/chat/completions",
-        json=BaseImageRequest(
-            model=ARTIST_MODEL,
+async def generate_image(prompt: str, directory: str):
+    """
+    Generate a picture for `prompt` into `directory` and return its file name. The
+    image is decoded to disk while the response streams in, it is never held whole.
+    """
+    request = BaseImageRequest(
+        model=ARTIST_MODEL,
+        messages=[
+            BaseUserMessage(role="system", content=system_prompt_for_image_p1),
+            BaseUserMessage(
+                role="user",
+                content=prompt,
+            ),
+        ],
+        modalities=["image"],
+        image_config=ImageConfig(aspect_ratio="5:4"),
+    )
+    image_id = str(uuid4())
+    decoder = DataURLStreamDecoder(lambda extension: f"{image_id}.{extension}")
+    file = None
+    try:
+        async with _open("artist", request) as (response, usage):
+            async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+                image = decoder.feed(chunk)
+                if file is None and decoder.extension:
+                    file = await open_file(
+                        f"{directory}/{image_id}.{decoder.extension}", "wb"
+                    )
+                if file and image:
+                    await file.write(image)
+            decoder.close()
+
+            data = BaseReponse.model_validate_json(decoder.document)
+            if data.usage:
+                usage.tokens = data.usage.total_tokens
+
+        images = data.choices[0].message.images
+        if images and file:
+            await file.close()
+            return images[0].image_url.url
+    except BaseException:
+        if file:
+            await file.close()
+            await remove(file.name)
+        raise
+
+    # A data URL outside of `images` is not a picture that was asked for
+    if file:
+        await file.close()
+        await remove(file.name)
+    return None
+
+
+def _theme_p1():
+    theme = choice(themes_for_p1)
+    subject = choice(theme.subjects)
+    action = choice(theme.actions)
+    object = choice(theme.objects)
+    return f"**Subject:** {subject}\n**Action:** {action}\n**Object:** {object}"
+
+
+async def generate_topics_p1(count: int):
+    """Generate `count` Part 1 picture prompts with a single request"""
+    themes = "\n\n".join(
+        f"### Scenario {index + 1}\n{_theme_p1()}" for index in range(count)
+    )
+    response = await _generate(
+        "question",
+        BaseRequest(
+            model=QUESTION_MODEL,
             messages=[
-                BaseUserMessage(role="system", content=system_prompt_for_image_p1),
+                BaseUserMessage(role="system", content=system_prompt_for_topic_p1_batch),
                 BaseUserMessage(
                     role="user",
-                    content=prompt,
+                    content=base_user_prompt_for_topic.format(part="1", theme=themes),
                 ),
             ],
-            modalities=["image"],
-            image_config=ImageConfig(aspect_ratio="5:4"),
-        ).model_dump(),
-    )
-    data = BaseReponse(**(await response.json()))
-    return (
-        data.choices[0].message.images[0].image_url.url
-        if data.choices[0].message.images
-        else None
+            response_format=_response_format(P1BatchResponse),
+        ),
+        P1BatchResponse,
     )
+    return response.questions[:count] if response else []
 
 
 async def generate_topic(part: Literal["1", "2", "3"]):
+    response_model: type[P1Response | P2Response | P3Response]
     if part == "1":
         system_prompt = system_prompt_for_topic_p1
-        theme = choice(themes_for_p1)
-        subject = choice(theme.subjects)
-        action = choice(theme.actions)
-        object = choice(theme.objects)
-        topic_theme = (
-            f"**Subject:** {subject}\n**Action:** {action}\n**Object:** {object}"
-        )
+        response_model = P1Response
+        topic_theme = _theme_p1()
     elif part == "2":
         system_prompt = system_prompt_for_topic_p2
+        response_model = P2Response
         theme = choice(themes_for_p2)
         sender = choice(theme.senders)
         recipient = choice(theme.recipients)
@@ -279,81 +875,198 @@ async def generate_topic(part: Literal["1", "2", "3"]):
         )
     elif part == "3":
         system_prompt = system_prompt_for_topic_p3
+        response_model = P3Response
         theme = choice(themes_for_p3)
         opinion = choice(theme.opinions)
         keywords = choices(theme.keywords, k=2)
         topic_theme = f"**Opinion:** {opinion}\n**Keywords:** {', '.join(keywords)}"
 
-    for _ in range(5):
-        response = await client.post(
-            url="/proxy/v1/chat/completions",
-            json=BaseRequest(
-                model=QUESTION_MODEL,
-                messages=[
-                    BaseUserMessage(
-                        role="system",
-                        content=system_prompt,
-                    ),
-                    BaseUserMessage(
-                        role="user",
-                        content=base_user_prompt_for_topic.format(
-                            part=part, theme=topic_theme
-                        ),
+    return await _generate(
+        "question",
+        BaseRequest(
+            model=QUESTION_MODEL,
+            messages=[
+                BaseUserMessage(
+                    role="system",
+                    content=system_prompt,
+                ),
+                BaseUserMessage(
+                    role="user",
+                    content=base_user_prompt_for_topic.format(
+                        part=part, theme=topic_theme
                     ),
-                ],
-                response_format=BaseRequestFormat(type="json_object"),
-            ).model_dump(),
-        )
+                ),
+            ],
+            response_format=_response_format(response_model),
+        ),
+        response_model,
+    )
 
-        data = BaseReponse(**(await response.json()))
-        sliced = slice_md(data.choices[0].message.content)
 
-        try:
-            parsed_topic = json.loads(sliced)
-            if part == "1":
-                return P1Response.model_validate(parsed_topic)
-            elif part == "2":
-                return P2Response.model_validate(parsed_topic)
-            elif part == "3":
-                return P3Response.model_validate(parsed_topic)
+def _review_request(
+    part: Literal["1", "2", "3"], topic: str, submission: str, hints: str | None = None
+):
+    content = base_user_prompt_for_submit_2_3.format(
+        part=part,
+        topic=topic,
+        submission=submission,
+    )
+    if hints:
+        # Measured offline, so the model doesn't count words or repeat these slips
+        content += f"\n\n**LOCAL PRE-ANALYSIS:**\n{hints}"
+    return BaseRequest(
+        model=REVIEW_MODEL,
+        messages=[
+            BaseUserMessage(role="system", content=system_prompt_for_review_2_3),
+            BaseUserMessage(role="user", content=content),
+        ],
+        response_format=_response_format(ReviewResponse),
+    )
 
-        except (json.decoder.JSONDecodeError, ValidationError) as error:
-            print(error)
 
+async def review(
+    part: Literal["1", "2", "3"],
+    topic: str,
+    submission: str,
+    model: str = REVIEW_MODEL,
+    hints: str | None = None,
+):
+    request = _review_request(part, topic, submission, hints).model_copy(
+        update={"model": model}
+    )
+    return await single_flight(
+        fingerprint(request), lambda: _generate("review", request, ReviewResponse)
+    )
 
-async def review(part: Literal["1", "2", "3"], topic: str, submission: str):
-    for _ in range(5):
-        response = await client.post(
-            url="/proxy/v1/chat/completions",
-            json=BaseRequest(
-                model=REVIEW_MODEL,
-                messages=[
-                    BaseUserMessage(role="system", content=system_prompt_for_review_2_3),
-                    BaseUserMessage(
-                        role="user",
-                        content=base_user_prompt_for_submit_2_3.format(
-                            part=part,
-                            topic=topic,
-                            submission=submission,
-                        ),
-                    ),
-                ],
-                response_format=BaseRequestFormat(type="json_object"),
-            ).model_dump(),
-        )
-        data = BaseReponse(**(await response.json()))
-        sliced = slice_md(data.choices[0].message.content)
 
-        try:
-            parsed_review = json.loads(sliced)
-            return ReviewResponse(**parsed_review)
+# Scale scores of each level in the band descriptors, highest level first
+LEVEL_SCORES = [
+    (9, 200),
+    (8, 170),
+    (7, 140),
+    (6, 110),
+    (5, 90),
+    (4, 70),
+    (3, 50),
+    (2, 40),
+]
 
-        except (json.decoder.JSONDecodeError, ValidationError) as error:
-            print(error)
 
+def _level_of(score: int):
+    return next((level for level, low in LEVEL_SCORES if score >= low), 1)
+
+
+def _max_level(part: Literal["1", "2", "3"], submission: str):
+    """The best level a submission this long can plausibly get"""
+    if part == "1":
+        return 9
+    words = len(submission.split())
+    short, brief = (30, 80) if part == "2" else (50, 150)
+    if words < short:
+        return 3
+    if words < brief:
+        return 6
+    return 9
+
+
+def _escalation(
+    part: Literal["1", "2", "3"], submission: str, response: ReviewResponse | None
+):
+    """Why a cheap review can't be trusted as is, None when it can"""
+    if response is None:
+        return "invalid"
+    low, high = response.score_range
+    if high - low > REVIEW_CASCADE_MAX_RANGE:
+        return "wide_range"
+    if _level_of(low) != _level_of(high):
+        return "borderline"
+    if response.level_achieved != _level_of(high):
+        return "inconsistent_level"
+    if response.level_achieved > _max_level(part, submission):
+        return "heuristics"
     return None
 
 
+async def review_cascade(
+    part: Literal["1", "2", "3"], topic: str, submission: str, hints: str | None = None
+):
+    """
+    Review with the cheap model first and keep its review unless it failed, is
+    unsure, or disagrees with what the text itself suggests, then ask the review
+    model. Without a cheap model every review goes to the review model.
+    """
+    if not REVIEW_CASCADE_MODEL:
+        response = await review(part, topic, submission, hints=hints)
+        return ReviewOutcome(response=response, path="premium")
+
+    try:
+        response = await review(part, topic, submission, REVIEW_CASCADE_MODEL, hints)
+    except (UpstreamError, TimeoutError) as error:
+        print(error)
+        response = None
+
+    escalation = _escalation(part, submission, response)
+    if escalation is None:
+        inc("review_cascade.cheap")
+        return ReviewOutcome(response=response, path="cheap")
+
+    inc(f"review_cascade.escalated.{escalation}")
+    response = await review(part, topic, submission, hints=hints)
+    return ReviewOutcome(response=response, path="escalated", escalation=escalation)
+
+
+async def review_stream(
+    part: Literal["1", "2", "3"],
+    topic: str,
+    submission: str,
+    on_event: Callable[[ReviewStreamEvent], Any],
+    hints: str | None = None,
+):
+    content = ""
+    scanner = JSONObjectStreamScanner()
+    request = _review_request(part, topic, submission, hints).model_copy(
+        update={"stream": True}
+    )
+    async with _open("review", request) as (response, _):
+        async for line in response.content:
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue  # SSE comments such as ": OPENROUTER PROCESSING"
+
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                break
+
+            chunk = BaseStreamResponse.model_validate_json(data)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+
+            delta = chunk.choices[0].delta.content
+            content += delta
+            for key, raw, is_item in scanner.feed(delta):
+                try:
+                    if key == "annotations" and is_item:
+                        annotation = Annotation.model_validate_json(raw)
+                        on_event(ReviewStreamEvent(event="annotation", data=annotation))
+                    elif key != "annotations" and not is_item:
+                        on_event(
+                            ReviewStreamEvent(
+                                event="field",
+                                data={"name": key, "value": json.loads(raw)},
+                            )
+                        )
+                except (json.decoder.JSONDecodeError, ValidationError) as error:
+                    print(error)
+
+    try:
+        result = repair(content, ReviewResponse)
+    except (json.decoder.JSONDecodeError, ValidationError) as error:
+        print(error)
+        result = await review(part, topic, submission, hints=hints)
+
+    return result
+
+
 def slice_md(text: str):
     if text.startswith("```json"):
         text = text[7:]
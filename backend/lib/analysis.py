@@ -0,0 +1,268 @@
+"""
+Checks of a submission that need no model: counts, repetition and mechanical
+slips. They are stored with the pending review so the student sees something at
+once, and handed to the review model as hints so it can skip them.
+"""
+
+import re
+from collections import Counter
+from typing import Literal, Optional
+
+from sqlmodel import Field, SQLModel
+
+from .ai import Annotation
+
+TARGET_WORDS: dict[str, int] = {"3": 300}  # Recommended length per part
+
+# Frequent misspellings in learners' essays, with their correction
+MISSPELLINGS = {
+    "accomodate": "accommodate",
+    "acheive": "achieve",
+    "adress": "address",
+    "alot": "a lot",
+    "arguement": "argument",
+    "beggining": "beginning",
+    "beleive": "believe",
+    "belive": "believe",
+    "buisness": "business",
+    "calender": "calendar",
+    "collegue": "colleague",
+    "comming": "coming",
+    "commitee": "committee",
+    "completly": "completely",
+    "definately": "definitely",
+    "enviroment": "environment",
+    "existance": "existence",
+    "goverment": "government",
+    "immediatly": "immediately",
+    "independant": "independent",
+    "neccessary": "necessary",
+    "occured": "occurred",
+    "oppurtunity": "opportunity",
+    "persue": "pursue",
+    "posible": "possible",
+    "realy": "really",
+    "recieve": "receive",
+    "recomend": "recommend",
+    "responsability": "responsibility",
+    "seperate": "separate",
+    "sucess": "success",
+    "successfull": "successful",
+    "tommorow": "tomorrow",
+    "truely": "truly",
+    "untill": "until",
+    "wich": "which",
+    "writting": "writing",
+}
+
+# Words too common to count as repetition
+STOPWORDS = set(
+    "a an the and or but so of to in on at for with by from as is are was were be "
+    "been it its this that these those i you he she we they my your our their me us "
+    "them not no do does did have has had will would can could should may might must "
+    "there here which who what when where why how if than then also very more "
+    "most".split()
+)
+# Lowercase after these is not a new sentence
+ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "mr.", "mrs.", "ms.", "dr."}
+
+WORD_REGEX = re.compile(r"[A-Za-z']+")
+SENTENCE_REGEX = re.compile(r"[^.!?]+[.!?]*")
+LOWERCASE_I_REGEX = re.compile(r"(?<![\w'.])i(?![\w'.])")
+DOUBLED_WORD_REGEX = re.compile(r"\b(\w+)\s+\1\b", re.IGNORECASE)
+LOWERCASE_START_REGEX = re.compile(r"(?<=[.!?] )[a-z]\w*")
+MISSING_SPACE_REGEX = re.compile(r"\b[A-Za-z]{2,}[,;](?=[A-Za-z])")
+
+MAX_SENTENCE_WORDS = 40
+MAX_REPEATS = 4  # Uses of one word (per 100 words) before it counts as repeated
+
+
+class Analysis(SQLModel):
+    word_count: int
+    target_words: Optional[int] = Field(default=None)
+    sentence_count: int
+    average_sentence_length: float
+    longest_sentence: int
+    unique_word_ratio: float
+    repeated_words: list[str]
+    annotations: list[Annotation]
+
+
+def _context_before(text: str, start: int, target: str):
+    """
+    The words right before `start`, as many as it takes for `context target` to be
+    found first at `start` the way the frontend looks it up. None when that can't be.
+    """
+    if start < 2 or text[start - 1] != " ":
+        return None
+    words = list(re.finditer(r"\S+", text[: start - 1]))
+    end = start - 1
+    for count in range(1, min(len(words), 8) + 1):
+        context = text[words[-count].start() : end]
+        if text.find(f"{context} {target}") == end - len(context):
+            return context
+    return None
+
+
+def _annotation(
+    text: str,
+    start: int,
+    target: str,
+    type: Literal["grammar", "vocabulary", "coherence", "mechanics"],
+    replacement: str | None,
+    feedback: str,
+):
+    context = _context_before(text, start, target)
+    if context is None:
+        return None
+    return Annotation(
+        target_text=target,
+        context_before=context,
+        type=type,
+        replacement=replacement,
+        feedback=feedback,
+    )
+
+
+def _annotations(text: str):
+    found: list[tuple[int, Annotation | None]] = []
+
+    for match in LOWERCASE_I_REGEX.finditer(text):
+        annotation = _annotation(
+            text, match.start(), "i", "mechanics", "I", 'The pronoun "I" is capitalized.'
+        )
+        found.append((match.start(), annotation))
+
+    for match in DOUBLED_WORD_REGEX.finditer(text):
+        if match.group(1).isdigit():
+            continue
+        annotation = _annotation(
+            text,
+            match.start(),
+            match.group(0),
+            "mechanics",
+            match.group(1),
+            f'The word "{match.group(1)}" is written twice.',
+        )
+        found.append((match.start(), annotation))
+
+    for match in LOWERCASE_START_REGEX.finditer(text):
+        word = match.group(0)
+        if text[: match.start()].split()[-1].lower() in ABBREVIATIONS:
+            continue
+        annotation = _annotation(
+            text,
+            match.start(),
+            word,
+            "mechanics",
+            word.capitalize(),
+            "A sentence starts with a capital letter.",
+        )
+        found.append((match.start(), annotation))
+
+    for match in MISSING_SPACE_REGEX.finditer(text):
+        word = match.group(0)
+        annotation = _annotation(
+            text,
+            match.start(),
+            word,
+            "mechanics",
+            f"{word} ",
+            f'Leave a space after "{word[-1]}".',
+        )
+        found.append((match.start(), annotation))
+
+    for match in WORD_REGEX.finditer(text):
+        correction = MISSPELLINGS.get(match.group(0).lower())
+        if correction is None:
+            continue
+        if match.group(0)[0].isupper():
+            correction = correction.capitalize()
+        annotation = _annotation(
+            text,
+            match.start(),
+            match.group(0),
+            "mechanics",
+            correction,
+            f'"{match.group(0)}" is misspelled.',
+        )
+        found.append((match.start(), annotation))
+
+    # In reading order and one per spot, the frontend highlights them in one pass
+    annotations: list[Annotation] = []
+    end = -1
+    for start, annotation in sorted(found, key=lambda item: item[0]):
+        if annotation is None or start < end:
+            continue
+        annotations.append(annotation)
+        end = start + len(annotation.target_text)
+    return annotations
+
+
+def analyze(part: str, text: str):
+    words = [word.lower() for word in WORD_REGEX.findall(text)]
+    sentences = [
+        len(WORD_REGEX.findall(sentence))
+        for sentence in SENTENCE_REGEX.findall(text)
+        if WORD_REGEX.search(sentence)
+    ]
+
+    counts = Counter(word for word in words if word not in STOPWORDS)
+    max_repeats = max(MAX_REPEATS, len(words) * MAX_REPEATS // 100)
+    repeated = [word for word, count in counts.most_common(5) if count > max_repeats]
+
+    return Analysis(
+        word_count=len(words),
+        target_words=TARGET_WORDS.get(part),
+        sentence_count=len(sentences),
+        average_sentence_length=round(len(words) / max(1, len(sentences)), 1),
+        longest_sentence=max(sentences, default=0),
+        unique_word_ratio=round(len(set(words)) / max(1, len(words)), 2),
+        repeated_words=repeated,
+        annotations=_annotations(text),
+    )
+
+
+def hints(analysis: Analysis):
+    """The analysis as prompt lines, the model can rely on them instead of counting"""
+    lines = [
+        f"- Word count: {analysis.word_count}"
+        + (f" (recommended {analysis.target_words})" if analysis.target_words else ""),
+        f"- Sentences: {analysis.sentence_count}, "
+        f"{analysis.average_sentence_length} words on average, "
+        f"longest {analysis.longest_sentence} words",
+    ]
+    if analysis.longest_sentence > MAX_SENTENCE_WORDS:
+        lines.append("- At least one sentence is too long to read easily")
+    if analysis.repeated_words:
+        lines.append(f"- Overused words: {', '.join(analysis.repeated_words)}")
+    if analysis.annotations:
+        lines.append(
+            "- Already shown to the student, do NOT include these in `annotations`:"
+        )
+        lines += [
+            f'  - "{annotation.target_text}": {annotation.feedback}'
+            for annotation in analysis.annotations
+        ]
+    return "\n".join(lines)
+
+
+def merge_annotations(text: str, *groups: list[Annotation]):
+    """All annotations in reading order, dropping later ones on an already marked spot"""
+    positioned: list[tuple[int, Annotation]] = []
+    for group in groups:
+        for annotation in group:
+            phrase = f"{annotation.context_before} {annotation.target_text}"
+            index = text.find(phrase)
+            if index != -1:
+                index += len(annotation.context_before) + 1
+            positioned.append((index if index != -1 else len(text), annotation))
+
+    merged: list[Annotation] = []
+    end = -1
+    for start, annotation in sorted(positioned, key=lambda item: item[0]):
+        if start < end:
+            continue
+        merged.append(annotation)
+        end = start + len(annotation.target_text) if start < len(text) else -1
+    return merged
@@ -0,0 +1,86 @@
+from collections import deque
+from enum import IntEnum
+from time import monotonic
+
+from .env import (
+    AI_BREAKER_COOLDOWN,
+    AI_BREAKER_FAILURE_RATIO,
+    AI_BREAKER_MIN_CALLS,
+    AI_BREAKER_WINDOW,
+)
+from .metrics import gauge, inc
+
+
+class BreakerState(IntEnum):
+    closed = 0
+    half_open = 1
+    open = 2
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of the latest calls to one model. Once too many of them
+    failed or timed out the breaker opens and calls are refused, until a single
+    probe is let through after `cooldown` seconds and comes back fine.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = AI_BREAKER_WINDOW,
+        min_calls: int = AI_BREAKER_MIN_CALLS,
+        failure_ratio: float = AI_BREAKER_FAILURE_RATIO,
+        cooldown: float = AI_BREAKER_COOLDOWN,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.outcomes: deque[bool] = deque(maxlen=window)
+        self.state = BreakerState.closed
+        self.retry_at = 0.0
+
+    def _set_state(self, state: BreakerState):
+        self.state = state
+        gauge(f"ai.breaker.{self.name}.state", state)
+
+    def allow(self):
+        """Whether a call may go out now, the first one after the cooldown is a probe"""
+        if self.state == BreakerState.closed or self.failure_ratio <= 0:
+            return True
+        if monotonic() < self.retry_at:
+            return False
+
+        # One probe per cooldown, a cancelled probe doesn't leave the breaker stuck
+        self.retry_at = monotonic() + self.cooldown
+        self._set_state(BreakerState.half_open)
+        inc(f"ai.breaker.{self.name}.probes")
+        return True
+
+    def success(self):
+        if self.state == BreakerState.half_open:
+            self.outcomes.clear()
+            self._set_state(BreakerState.closed)
+            inc(f"ai.breaker.{self.name}.closed")
+        elif self.state == BreakerState.closed:
+            self.outcomes.append(True)
+
+    def failure(self):
+        # Calls sent before the breaker opened still report back, they change nothing
+        if self.state == BreakerState.open:
+            return
+        if self.state == BreakerState.half_open:
+            self._open()
+            return
+
+        self.outcomes.append(False)
+        if self.failure_ratio <= 0 or len(self.outcomes) < self.min_calls:
+            return
+        if self.outcomes.count(False) >= len(self.outcomes) * self.failure_ratio:
+            self._open()
+
+    def _open(self):
+        self.outcomes.clear()
+        self.retry_at = monotonic() + self.cooldown
+        self._set_state(BreakerState.open)
+        inc(f"ai.breaker.{self.name}.opened")
@@ -0,0 +1,55 @@
+import json
+import re
+from collections import OrderedDict
+from hashlib import sha256
+from time import monotonic
+from typing import Generic, TypeVar
+
+from .ai import system_prompt_for_review_2_3
+from .env import REVIEW_MODEL
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, max_size: int, ttl: float | None = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, value = entry
+        if self.ttl is not None and monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V):
+        self._entries[key] = (monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+REVIEW_PROMPT_HASH = sha256(system_prompt_for_review_2_3.encode()).hexdigest()
+
+
+def normalize_submission(text: str):
+    lines = [" ".join(line.split()) for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+def review_cache_key(part: str, topic: str, submission: str):
+    submission = normalize_submission(submission)
+    key = json.dumps([part, topic, submission, REVIEW_MODEL, REVIEW_PROMPT_HASH])
+    return sha256(key.encode()).hexdigest()
@@ -1,20 +1,27 @@
-import base64
-import re
-from asyncio import Task, create_task, gather, get_event_loop
-from datetime import datetime
+from asyncio import Event, Semaphore, Task, create_task, gather, sleep, wait_for
+from datetime import datetime, timedelta
 from enum import Enum as PyEnum
-from traceback import format_exc
-from typing import Any, Awaitable, Callable, Coroutine, Literal, Optional, TypeVar, cast
+from functools import partial
+from math import ceil
+from traceback import format_exc, format_exception
+from typing import Any, Awaitable, Callable, Generic, Literal, Optional, TypeVar, cast
 from uuid import uuid4
 
-from aiofiles import open
+from aiofiles.os import remove
 from pydantic import BaseModel, Field as PydanticField
-from sqlalchemy import event
-from sqlalchemy.ext.asyncio import (
-    AsyncSession,
-    async_sessionmaker,
-    create_async_engine,
+from sqlalchemy import (
+    Connection,
+    CursorResult,
+    Index,
+    Select,
+    bindparam,
+    delete,
+    func,
+    tuple_,
+    update,
 )
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlmodel import (
     JSON,
@@ -27,22 +34,57 @@ from sqlmodel import (
     select,
 )
 
+from .admission import Admission
 from .ai import (
     Annotation,
     DetailScore,
     P1Response,
     P2Response,
     P3Response,
+    ReviewOutcome,
     ReviewResponse,
+    ReviewStreamEvent,
     Summary,
     generate_image,
     generate_topic,
-    review as ai_review,
+    generate_topics_p1,
+    review_cascade as ai_review_cascade,
+    review_stream as ai_review_stream,
+)
+from .analysis import Analysis, analyze, hints, merge_annotations
+from .cache import LRUCache, review_cache_key
+from .engine import create_session_and_run, engine
+from .env import (
+    ADMISSION_REVIEW_CLIENT_LIMIT,
+    ADMISSION_REVIEW_LIMIT,
+    ADMISSION_TOPIC_CLIENT_LIMIT,
+    ADMISSION_TOPIC_LIMIT,
+    JOB_POLL_INTERVAL,
+    P1_BATCH_SIZE,
+    P1_IMAGE_CONCURRENCY,
+    P1_MIN_SUCCESS_RATIO,
+    REVIEW_CACHE_MAX_ROWS,
+    REVIEW_CACHE_SIZE,
+    REVIEW_CACHE_TTL,
+    TOPIC_POOL_HIGH_WATERMARK,
+    TOPIC_POOL_INTERVAL,
+    TOPIC_POOL_LOW_WATERMARK,
+    TOPIC_POOL_P1_COUNT,
 )
-from .env import DB_URL
 from .exception import ReviewNotFound, SubmissionNotFound, TopicNotFound
-from .task import add_task
-from .util import PydanticJSON, PydanticListJSON
+from .metrics import gauge, inc
+from .migration import Migration, add_missing_columns, create_indexes, migrate
+from .pubsub import Message, channels, has_subscribers, publish, subscribe
+from .task import (
+    Job,
+    Priority,
+    add_task,
+    current_attempt,
+    register,
+    report_progress,
+)
+from .util import PydanticJSON, PydanticListJSON, decode_cursor, encode_cursor
+from .writer import execute, write
 
 
 class Status(PyEnum):
@@ -63,6 +105,10 @@ class TopicPart(PyEnum):
 
 class Topic(SQLModel, table=True):
     __tablename__ = "topic"  # pyright: ignore[reportAssignmentType]
+    __table_args__ = (
+        Index("ix_topic_status_created_at", "status", "created_at", "id"),
+        Index("ix_topic_created_at", "created_at", "id"),
+    )
 
     id: str = SQLField(primary_key=True, default_factory=lambda: uuid4().__str__())
 
@@ -88,6 +134,7 @@ class Topic(SQLModel, table=True):
 
 class TopicQuestion(SQLModel, table=True):
     __tablename__ = "topic_question"  # pyright: ignore[reportAssignmentType]
+    __table_args__ = (Index("ix_topic_question_topic_id", "topic_id"),)
 
     id: str = SQLField(primary_key=True, default_factory=lambda: uuid4().__str__())
 
@@ -120,6 +167,23 @@ class SlicedTopic(BaseModel):
     created_at: datetime
 
 
+class ListedTopic(BaseModel):
+    id: str
+
+    status: Status
+
+    type: TopicType
+    part: TopicPart
+
+    summary: Optional[Summary]
+
+    question_count: int
+    submission_count: int
+    review_count: int
+
+    created_at: datetime
+
+
 class SlicedTopicQuestion(BaseModel):
     id: str
     topic_id: str
@@ -131,6 +195,10 @@ class SlicedTopicQuestion(BaseModel):
 
 class Submission(SQLModel, table=True):
     __tablename__ = "submission"  # type: ignore
+    __table_args__ = (
+        Index("ix_submission_topic_id_created_at", "topic_id", "created_at"),
+        Index("ix_submission_created_at", "created_at", "id"),
+    )
     id: str = SQLField(primary_key=True, default_factory=lambda: uuid4().__str__())
     topic_id: str
     submission: str
@@ -150,8 +218,25 @@ class SlicedSubmission(BaseModel):
     created_at: datetime
 
 
+class ListedSubmission(BaseModel):
+    id: str
+    topic_id: str
+    excerpt: str  # Start of the submission
+
+    review_id: Optional[str]
+    review_status: Optional[Status]
+    level_achieved: Optional[int]
+
+    created_at: datetime
+
+
 class Review(SQLModel, table=True):
     __tablename__ = "review"  # type: ignore
+    __table_args__ = (
+        Index("ix_review_submission_id", "submission_id"),
+        Index("ix_review_topic_id_created_at", "topic_id", "created_at"),
+        Index("ix_review_created_at", "created_at", "id"),
+    )
 
     id: str = SQLField(primary_key=True, default_factory=lambda: uuid4().__str__())
 
@@ -178,6 +263,10 @@ class Review(SQLModel, table=True):
     improvement_suggestions: Optional[list[str]] = SQLField(
         default=None, sa_column=Column(JSON)
     )
+    path: Optional[str] = SQLField(default=None)  # Which models wrote it
+    escalation: Optional[str] = SQLField(default=None)
+    # Checked offline when the review is asked for, shown while the model works
+    analysis: Optional[Analysis] = SQLField(default=None, sa_type=PydanticJSON(Analysis))
 
     created_at: datetime = SQLField(default_factory=lambda: datetime.now())
 
@@ -197,10 +286,37 @@ class SlicedReview(BaseModel):
     detail_score: Optional[DetailScore] = PydanticField(default=None)
     annotations: Optional[list[Annotation]] = PydanticField(default=None)
     improvement_suggestions: Optional[list[str]] = PydanticField(default=None)
+    path: Optional[str] = PydanticField(default=None)
+    escalation: Optional[str] = PydanticField(default=None)
+    analysis: Optional[Analysis] = PydanticField(default=None)
+
+    created_at: datetime
+
+
+class ListedReview(BaseModel):
+    id: str
+
+    topic_id: str
+    submission_id: str
+
+    status: Status
+
+    score_range: Optional[tuple[int, int]]
+    level_achieved: Optional[int]
+    summary_feedback: Optional[str]
+    path: Optional[str]
 
     created_at: datetime
 
 
+L = TypeVar("L", ListedTopic, ListedSubmission, ListedReview)
+
+
+class Page(BaseModel, Generic[L]):
+    items: list[L]
+    next_cursor: Optional[str] = PydanticField(default=None)  # None on the last page
+
+
 class Session(SQLModel, table=True):
     __tablename__ = "session"  # type: ignore
 
@@ -212,47 +328,199 @@ class Session(SQLModel, table=True):
     created_at: datetime = SQLField(default_factory=lambda: datetime.now())
 
 
+class TopicPool(SQLModel, table=True):
+    __tablename__ = "topic_pool"  # type: ignore
+    __table_args__ = (Index("ix_topic_pool_part_created_at", "part", "created_at"),)
+
+    topic_id: str = SQLField(primary_key=True, foreign_key="topic.id", ondelete="CASCADE")
+    part: TopicPart = SQLField(sa_column=Column(SQLEnum(TopicPart)))
+
+    created_at: datetime = SQLField(default_factory=lambda: datetime.now())
+
+
+class ReviewCache(SQLModel, table=True):
+    __tablename__ = "review_cache"  # type: ignore
+
+    key: str = SQLField(primary_key=True)
+    response: ReviewResponse = SQLField(sa_type=PydanticJSON(ReviewResponse))
+
+    created_at: datetime = SQLField(default_factory=lambda: datetime.now(), index=True)
+
+
 class Statistics(BaseModel):
     total_submission: int
     average_score: float
     improvement_rate: float
-    total_time: int
+    total_time: int  # Milliseconds
 
 
-engine = create_async_engine(DB_URL)
+class Stats(SQLModel, table=True):
+    """Running totals behind `statistics`, one row kept up to date by triggers"""
 
+    __tablename__ = "stats"  # type: ignore
 
-@event.listens_for(engine.sync_engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON;")
-    cursor.close()
+    id: int = SQLField(default=1, primary_key=True)
 
+    submission_count: int = SQLField(default=0)
+    score_count: int = SQLField(default=0)  # Done reviews with a score
+    score_sum: float = SQLField(default=0)  # Of their score range midpoints
+    first_score: Optional[float] = SQLField(default=None)
+    latest_score: Optional[float] = SQLField(default=None)
+    session_time: int = SQLField(default=0)  # Milliseconds
 
-async def init():
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
 
+def _score(row: str):
+    return (
+        f"(json_extract({row}.score_range, '$[0]') "
+        + f"+ json_extract({row}.score_range, '$[1]')) / 2.0"
+    )
 
-T = TypeVar("T")
 
+def _scored(row: str):
+    return (
+        f"{row}.status = 'done' "
+        + f"AND json_extract({row}.score_range, '$[0]') IS NOT NULL"
+    )
 
-async def create_session_and_run(
-    func: Callable[[AsyncSession], Awaitable[T]],
-    _session: AsyncSession | None = None,
-) -> T:
-    if _session:
-        return await func(_session)
-    else:
-        async_session = async_sessionmaker(engine, expire_on_commit=False)
-        async with async_session() as _session:
-            return await func(_session)
+
+def _duration(row: str):
+    return (
+        f"CAST(round((julianday({row}.ended_at) - julianday({row}.started_at)) "
+        + "* 86400000) AS INTEGER)"
+    )
+
+
+# In the database so every way a row changes is counted, the executemany of job
+# results and deletes cascading from a topic included. A deleted review leaves
+# the first and latest score as they were.
+STATS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stats_review_insert AFTER INSERT ON review
+    WHEN {_scored("new")} BEGIN
+        UPDATE stats SET
+            score_count = score_count + 1,
+            score_sum = score_sum + {_score("new")},
+            first_score = coalesce(first_score, {_score("new")}),
+            latest_score = {_score("new")}
+        WHERE id = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stats_review_update
+    AFTER UPDATE OF status, score_range ON review
+    WHEN {_scored("new")} AND NOT ({_scored("old")}) BEGIN
+        UPDATE stats SET
+            score_count = score_count + 1,
+            score_sum = score_sum + {_score("new")},
+            first_score = coalesce(first_score, {_score("new")}),
+            latest_score = {_score("new")}
+        WHERE id = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stats_review_delete AFTER DELETE ON review
+    WHEN {_scored("old")} BEGIN
+        UPDATE stats SET
+            score_count = score_count - 1,
+            score_sum = score_sum - {_score("old")}
+        WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_submission_insert AFTER INSERT ON submission
+    BEGIN
+        UPDATE stats SET submission_count = submission_count + 1 WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS stats_submission_delete AFTER DELETE ON submission
+    BEGIN
+        UPDATE stats SET submission_count = submission_count - 1 WHERE id = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stats_session_insert AFTER INSERT ON session
+    BEGIN
+        UPDATE stats SET session_time = session_time + {_duration("new")} WHERE id = 1;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS stats_session_delete AFTER DELETE ON session
+    BEGIN
+        UPDATE stats SET session_time = session_time - {_duration("old")} WHERE id = 1;
+    END
+    """,
+]
+
+# The totals of what is already stored, when the triggers start counting
+FILL_STATS = f"""
+INSERT OR REPLACE INTO stats (
+    id, submission_count, score_count, score_sum, first_score, latest_score,
+    session_time
+)
+SELECT
+    1,
+    (SELECT count(*) FROM submission),
+    (SELECT count(*) FROM review WHERE {_scored("review")}),
+    (SELECT coalesce(sum({_score("review")}), 0) FROM review WHERE {_scored("review")}),
+    (
+        SELECT {_score("review")} FROM review WHERE {_scored("review")}
+        ORDER BY created_at LIMIT 1
+    ),
+    (
+        SELECT {_score("review")} FROM review WHERE {_scored("review")}
+        ORDER BY created_at DESC LIMIT 1
+    ),
+    (SELECT coalesce(sum({_duration("session")}), 0) FROM session)
+"""
+
+
+def _add_missing_columns(conn: Connection):
+    """Columns added to the models before the schema had a version"""
+    for table in SQLModel.metadata.sorted_tables:
+        add_missing_columns(conn, table)
 
 
-async def get_session():
-    async_session = async_sessionmaker(engine, expire_on_commit=False)
-    async with async_session() as session:
-        yield session
+def _index_lookups(conn: Connection):
+    """Foreign keys the relationships load by, and the order lists are paged in"""
+    for table in (Topic, TopicQuestion, Submission, Review, TopicPool):
+        create_indexes(conn, table.__table__)  # type: ignore
+
+
+def _replace_single_indexes(conn: Connection):
+    """Single column indexes that a composite index now starts with"""
+    create_indexes(conn, Job.__table__)  # type: ignore
+    for name in ("ix_topic_pool_part", "ix_job_state"):
+        conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+
+
+def _materialize_statistics(conn: Connection):
+    """Totals for `statistics`, counted by triggers from here on. A later change to
+    a trigger drops it in its own migration before making it again."""
+    for trigger in STATS_TRIGGERS:
+        conn.exec_driver_sql(trigger)
+    conn.exec_driver_sql(FILL_STATS)
+
+
+def _clear_review_cache(conn: Connection):
+    """Cheap model reviews were cached as the review model's, there's no telling
+    them apart now"""
+    conn.execute(delete(ReviewCache))
+
+
+# Append only, the position of a migration is the version it brings the database to
+MIGRATIONS: list[Migration] = [
+    _add_missing_columns,
+    _index_lookups,
+    _replace_single_indexes,
+    _materialize_statistics,
+    _clear_review_cache,
+]
+
+
+async def init():
+    async with engine.begin() as conn:
+        await conn.run_sync(migrate, SQLModel.metadata, MIGRATIONS)
 
 
 """
@@ -311,32 +579,87 @@ def format_review(review: Review):
         detail_score=review.detail_score,
         annotations=review.annotations,
         improvement_suggestions=review.improvement_suggestions,
+        path=review.path,
+        escalation=review.escalation,
+        analysis=review.analysis,
         created_at=review.created_at,
     )
 
 
+"""
+PAGINATION
+"""
+
+EXCERPT_LENGTH = 200
+
+
+async def _get_page(
+    session: AsyncSession,
+    statement: Select,
+    table: type[Topic] | type[Submission] | type[Review],
+    listed: type[L],
+    cursor: str | None,
+    limit: int,
+):
+    """
+    One page of `statement`, newest first. The cursor is the last row of the page
+    before, so the query seeks to it through the index instead of skipping rows.
+    """
+    if cursor:
+        created_at, id = decode_cursor(cursor)
+        statement = statement.where(tuple_(table.created_at, table.id) < (created_at, id))
+    statement = statement.order_by(desc(table.created_at), desc(table.id)).limit(
+        limit + 1
+    )
+    rows = (await session.execute(statement)).all()
+
+    items = [listed.model_validate(row._mapping) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1].created_at, items[-1].id)
+    return Page[listed](items=items, next_cursor=next_cursor)
+
+
 """
 TOPIC
 """
 
 
-async def get_topics(all: bool = False, _session: AsyncSession | None = None):
+async def list_topics(
+    cursor: str | None = None,
+    limit: int = 20,
+    all: bool = False,
+    _session: AsyncSession | None = None,
+):
+    """Summary columns and child counts of topics, the full topic is `get_topic`"""
+
+    def _count(table: type[TopicQuestion] | type[Submission] | type[Review]):
+        return (
+            select(func.count())
+            .where(table.topic_id == Topic.id)
+            .correlate(Topic)
+            .scalar_subquery()
+        )
+
     async def _inner(session: AsyncSession):
-        statement = (
-            select(Topic)
-            .order_by(desc(Topic.created_at))
-            .options(
-                selectinload(Topic.submissions),  # type: ignore
-                selectinload(Topic.reviews),  # type: ignore
-                selectinload(Topic.question_set),  # type: ignore
-            )
+        statement = select(
+            Topic.id,
+            Topic.status,
+            Topic.type,
+            Topic.part,
+            Topic.summary,
+            _count(TopicQuestion).label("question_count"),
+            _count(Submission).label("submission_count"),
+            _count(Review).label("review_count"),
+            Topic.created_at,
+        ).where(
+            Topic.id.not_in(select(TopicPool.topic_id))  # type: ignore
         )
         if not all:
             statement = statement.where(Topic.status == Status.done)
-        topics = list((await session.execute(statement)).scalars().all())
-        return [format_topic(topic) for topic in topics]
+        return await _get_page(session, statement, Topic, ListedTopic, cursor, limit)
 
-    return await create_session_and_run(_inner, _session)
+    return await create_session_and_run(_inner, _session, read=True)
 
 
 async def _get_topic(id: str, _session: AsyncSession | None = None):
@@ -346,7 +669,7 @@ async def _get_topic(id: str, _session: AsyncSession | None = None):
             .where(Topic.id == id)
             .order_by(desc(Topic.created_at))
             .options(
-                selectinload(Topic.submissions),  # type: ignore
+                selectinload(Topic.submissions).selectinload(Submission.review),  # type: ignore
                 selectinload(Topic.reviews),  # type: ignore
                 selectinload(Topic.question_set),  # type: ignore
             )
@@ -357,7 +680,7 @@ async def _get_topic(id: str, _session: AsyncSession | None = None):
 
         return topic
 
-    return await create_session_and_run(_inner, _session)
+    return await create_session_and_run(_inner, _session, read=True)
 
 
 async def get_topic(id: str, _session: AsyncSession | None = None):
@@ -368,34 +691,84 @@ async def get_topic(id: str, _session: AsyncSession | None = None):
 class CombinedP1Response(BaseModel):
     prompt: str
     keywords: tuple[str, str]
-    image_url: str
+    file: str  # Already written to IMAGE_DIRECTORY
 
 
-BASE64_IMAGE_REGEX = re.compile(r"^data:image\/([a-z]+);base64,(.+)")
+IMAGE_DIRECTORY = "data/image"
 
 
-async def _create_question_p1():
-    prompt_response = cast(P1Response, await generate_topic("1"))
-    if prompt_response is None:
-        raise RuntimeError("can't generate prompt for image generation")
+async def _remove_images(files: list[str]):
+    for file in files:
+        try:
+            await remove(f"{IMAGE_DIRECTORY}/{file}")
+        except FileNotFoundError:
+            pass
 
-    image_url = await generate_image(prompt=prompt_response.artist_prompt)
-    if image_url is None:
-        raise RuntimeError("can't generate image")
 
-    return CombinedP1Response(
-        prompt=prompt_response.artist_prompt,
-        keywords=prompt_response.keywords,
-        image_url=image_url,
-    )
+async def _create_topic_p1(count: int = 1):
+    window = Semaphore(P1_IMAGE_CONCURRENCY)
+    finished = 0
+    files: list[str] = []  # Saved so far, nothing points to them until the callback
+
+    async def _create_question(prompt: P1Response):
+        nonlocal finished
+        try:
+            async with window:
+                file = await generate_image(prompt.artist_prompt, IMAGE_DIRECTORY)
+            if file:
+                files.append(file)
+        finally:
+            finished += 1
+            await report_progress(finished, count)
+        if file is None:
+            raise RuntimeError("can't generate image")
+
+        return CombinedP1Response(
+            prompt=prompt.artist_prompt,
+            keywords=prompt.keywords,
+            file=file,
+        )
 
+    async def _create_batch(size: int):
+        prompts = await generate_topics_p1(size)
+        return await gather(
+            *[_create_question(prompt) for prompt in prompts], return_exceptions=True
+        )
 
-async def _create_topic_p1(count: int = 1):
-    tasks: list[Task[CombinedP1Response]] = []
-    for _ in range(count):
-        tasks.append(create_task(_create_question_p1()))
+    await report_progress(0, count)
+    responses: list[CombinedP1Response] = []
+    try:
+        # Images of a batch start as soon as its prompts are in, while later batches
+        # are still being written
+        batches = await gather(
+            *[
+                _create_batch(min(P1_BATCH_SIZE, count - start))
+                for start in range(0, count, P1_BATCH_SIZE)
+            ],
+            return_exceptions=True,
+        )
+        for batch in batches:
+            if isinstance(batch, BaseException):
+                print("".join(format_exception(batch)))
+                continue
+            for result in batch:
+                if isinstance(result, BaseException):
+                    print("".join(format_exception(result)))
+                else:
+                    responses.append(result)
+
+        inc("topic_p1.questions", len(responses))
+        inc("topic_p1.missing", count - len(responses))
+        if len(responses) < max(1, ceil(count * P1_MIN_SUCCESS_RATIO)):
+            raise RuntimeError(
+                f"only {len(responses)} of {count} questions were generated"
+            )
+    except BaseException:
+        # Failed, cancelled or handed back at shutdown, a retry draws new pictures
+        await _remove_images(files)
+        raise
 
-    return await gather(*tasks)
+    return responses
 
 
 async def _update_topic_p1(
@@ -406,43 +779,70 @@ async def _update_topic_p1(
         if task != "topic_1":
             return
 
-        async def _update_inner(update_session: AsyncSession):
-            topic = await _get_topic(topic_id, update_session)
-            if not status or responses is None:
-                topic.status = Status.failed
-
-            else:
-                question_set: list[TopicQuestion] = []
-                for response in responses:
-                    image_id = uuid4().__str__()
-                    image_ext, image_data = cast(
-                        tuple[str, str],
-                        re.findall(BASE64_IMAGE_REGEX, response.image_url)[0],
-                    )
+        ok = status and responses is not None
 
-                    filename = f"{image_id}.{image_ext}"
-                    async with open(f"data/image/{filename}", "wb") as file:
-                        await file.write(base64.b64decode(image_data))
+        async def _apply(session: AsyncSession):
+            result = await session.execute(
+                update(Topic)
+                .where(Topic.id == topic_id, Topic.status == Status.pending)  # type: ignore
+                .values(status=Status.done if ok else Status.failed)
+            )
+            if not cast(CursorResult, result).rowcount:
+                return False
 
-                    question = TopicQuestion(
-                        topic_id=topic.id,
+            for response in responses if ok and responses else []:
+                session.add(
+                    TopicQuestion(
+                        topic_id=topic_id,
                         artist_prompt=response.prompt,
                         keywords=response.keywords,
-                        file=filename,
+                        file=response.file,
                     )
-                    question_set.append(question)
+                )
+            await session.flush()
+            return True
 
-                topic.status = Status.done
-
-                update_session.add_all([topic, *question_set])
-                await update_session.commit()
-
-        await create_session_and_run(_update_inner)
+        if not await write(_apply):
+            # Cancelled or stored by an earlier run, these pictures are unused
+            await _remove_images([response.file for response in responses or []])
+        await _publish_topic(topic_id)
 
     except Exception:
         print(format_exc())
 
 
+def _format_question(response: P2Response | P3Response):
+    if isinstance(response, P2Response):
+        content = response.test_content
+        return (
+            f"**From:** {content.email_header.from_}\n"
+            + f"**To:** {content.email_header.to}\n"
+            + f"**Subject:** {content.email_header.subject}\n"
+            + f"**Sent:** {content.email_header.sent}\n"
+            + "\n"
+            + f"{content.email_body}\n"
+            + "\n"
+            + f"**Direction:** {content.direction}"
+        )
+
+    content = response.test_content
+    return (
+        "**Directions:** Read the question below. "
+        + "You will have 30 minutes to plan, write, and revise your essay. "
+        + "Typically, an effective essay will contain a minimum of 300 words.\n"
+        + "\n"
+        + f"{content.context_statement}\n"
+        + f"{content.question_prompt}"
+    )
+
+
+# One statement object for every result, the writer sends a batch of them as one
+# executemany. The columns it sets are the other keys of the parameters.
+_store_topic = update(Topic.__table__).where(  # type: ignore
+    Topic.id == bindparam("topic_id"), Topic.status == Status.pending
+)
+
+
 async def _update_topic_p2_3(
     id: str, status: bool, response: P2Response | P3Response | None
 ):
@@ -451,90 +851,84 @@ async def _update_topic_p2_3(
         if task != "topic_2_3":
             return
 
-        async def _update_inner(update_session: AsyncSession):
-            topic = await _get_topic(topic_id, update_session)
-            if not status or response is None:
-                topic.status = Status.failed
-            else:
-                question: str
-                if isinstance(response, P2Response):
-                    content = response.test_content
-                    question = (
-                        f"**From:** {content.email_header.from_}\n"
-                        + f"**To:** {content.email_header.to}\n"
-                        + f"**Subject:** {content.email_header.subject}\n"
-                        + f"**Sent:** {content.email_header.sent}\n"
-                        + "\n"
-                        + f"{content.email_body}\n"
-                        + "\n"
-                        + f"**Direction:** {content.direction}"
-                    )
-                elif isinstance(response, P3Response):
-                    content = response.test_content
-                    question = (
-                        "**Directions:** Read the question below. "
-                        + "You will have 30 minutes to plan, write, and revise your essay. "
-                        + "Typically, an effective essay will contain a minimum of 300 words.\n"
-                        + "\n"
-                        + f"{content.context_statement}\n"
-                        + f"{content.question_prompt}"
-                    )
+        values: dict[str, Any] = {"status": Status.failed}
+        if status and response is not None:
+            question = _format_question(response)
+            values = {
+                "status": Status.done,
+                "summary": response.information,
+                "question": question,
+            }
 
-                print(question)
+        await execute(_store_topic, {"topic_id": topic_id, **values})
+        await _publish_topic(topic_id)
 
-                topic.status = Status.done
-                topic.summary = response.information
-                topic.question = question
+    except Exception:
+        print(format_exc())
 
-            update_session.add(topic)
-            await update_session.commit()
 
-        await create_session_and_run(_update_inner)
+async def _topic_p1_job(payload: dict[str, Any]):
+    return await _create_topic_p1(count=payload["count"])
+
+
+async def _topic_p2_3_job(payload: dict[str, Any]):
+    return await generate_topic(part=payload["part"])
 
-    except Exception:
-        print(format_exc())
+
+register("topic_1", _topic_p1_job, _update_topic_p1, Priority.bulk)
+register("topic_2_3", _topic_p2_3_job, _update_topic_p2_3, Priority.topic)
+
+
+async def _start_topic(
+    part: Literal["1", "2", "3"],
+    p1_count: int,
+    session: AsyncSession,
+    pooled: bool = False,
+    client: str | None = None,
+):
+    """Add a pending topic and queue its job, committed in one go"""
+    topic = Topic(
+        id=uuid4().__str__(),
+        status=Status.pending,
+        part=TopicPart(part),
+    )
+    session.add(topic)
+    priority = None
+    if pooled:
+        session.add(TopicPool(topic_id=topic.id, part=topic.part))
+        priority = Priority.background
+
+    if part == "1":
+        await add_task(
+            "topic_1", {"count": p1_count}, topic.id, client, session, priority
+        )
+    else:
+        await add_task("topic_2_3", {"part": part}, topic.id, client, session, priority)
+
+    return topic
+
+
+topic_admission = Admission(
+    "topic", ["topic_1", "topic_2_3"], ADMISSION_TOPIC_LIMIT, ADMISSION_TOPIC_CLIENT_LIMIT
+)
 
 
 async def create_topic(
     part: Literal["1", "2", "3"],
     p1_count: int = 5,
+    client: str | None = None,
     _session: AsyncSession | None = None,
 ):
     async def _inner(session: AsyncSession):
-        topic: Topic
-
-        if part == "1":
-            id = uuid4().__str__()
-            topic = Topic(
-                id=id,
-                status=Status.pending,
-                part=TopicPart.I,
-            )
-            add_task(
-                _create_topic_p1(count=p1_count),
-                f"topic_1:{id}",
-                callback=_update_topic_p1,
-                event_loop=get_event_loop(),
-            )
+        if part != "1" or p1_count == TOPIC_POOL_P1_COUNT:
+            pooled_id = await _claim_pooled_topic(TopicPart(part), session)
+            if pooled_id:
+                return format_topic(await _get_topic(pooled_id, session))
+            # Give the write connection back while waiting to be admitted
+            await session.rollback()
 
-        elif part == "2" or part == "3":
-            id = uuid4().__str__()
-            topic = Topic(
-                id=id,
-                status=Status.pending,
-                part=TopicPart.II if part == "2" else TopicPart.III,
-            )
-            add_task(
-                cast(
-                    Coroutine[Any, Any, P2Response | P3Response | None],
-                    generate_topic(part=part),
-                ),
-                f"topic_2_3:{id}",
-                callback=_update_topic_p2_3,
-                event_loop=get_event_loop(),
-            )
-        session.add(topic)
-        await session.commit()
+        async with topic_admission.admit(client):
+            topic = await _start_topic(part, p1_count, session, client=client)
 
         saved_topic = await _get_topic(topic.id, session)
         return format_topic(saved_topic)
@@ -551,22 +945,115 @@ async def delete_topic(id: str, _session: AsyncSession | None = None):
     return await create_session_and_run(_inner, _session)
 
 
+"""
+TOPIC POOL
+"""
+
+
+topic_pool_refill = Event()
+
+
+async def _claim_pooled_topic(part: TopicPart, session: AsyncSession):
+    for _ in range(3):
+        statement = (
+            select(TopicPool.topic_id)
+            .join(Topic, Topic.id == TopicPool.topic_id)  # type: ignore
+            .where(TopicPool.part == part, Topic.status == Status.done)
+            .order_by(TopicPool.created_at)
+            .limit(1)
+        )
+        topic_id = (await session.execute(statement)).scalar()
+        if topic_id is None:
+            inc("topic_pool.miss")
+            return None
+
+        # Whoever deletes the pool row owns the topic
+        claimed = await session.execute(
+            delete(TopicPool).where(TopicPool.topic_id == topic_id)  # type: ignore
+        )
+        if cast(CursorResult, claimed).rowcount:
+            await session.execute(
+                update(Topic)
+                .where(Topic.id == topic_id)  # type: ignore
+                .values(created_at=datetime.now())
+            )
+            await session.commit()
+            inc("topic_pool.hit")
+            topic_pool_refill.set()
+            return topic_id
+
+        await session.rollback()
+
+    return None
+
+
+async def _fill_topic_pool(part: TopicPart, session: AsyncSession):
+    statement = (
+        select(Topic.id, Topic.status)
+        .join(TopicPool, Topic.id == TopicPool.topic_id)  # type: ignore
+        .where(TopicPool.part == part)
+    )
+    pooled = (await session.execute(statement)).all()
+
+    failed = [id for id, status in pooled if status == Status.failed]
+    if failed:
+        await session.execute(delete(Topic).where(Topic.id.in_(failed)))  # type: ignore
+
+    ready = sum(status == Status.done for _, status in pooled)
+    pending = sum(status == Status.pending for _, status in pooled)
+    gauge(f"topic_pool.{part.value}.ready", ready)
+    gauge(f"topic_pool.{part.value}.pending", pending)
+
+    if ready + pending < TOPIC_POOL_LOW_WATERMARK:
+        for _ in range(TOPIC_POOL_HIGH_WATERMARK - ready - pending):
+            await _start_topic(part.value, TOPIC_POOL_P1_COUNT, session, pooled=True)
+            inc(f"topic_pool.{part.value}.created")
+
+    await session.commit()
+
+
+async def run_topic_pool():
+    """Keep between the low and high watermark of ready topics per part"""
+    if TOPIC_POOL_HIGH_WATERMARK <= 0:
+        return
+
+    while True:
+        for part in TopicPart:
+            try:
+                await create_session_and_run(partial(_fill_topic_pool, part))
+            except Exception:
+                print(format_exc())
+
+        try:
+            await wait_for(topic_pool_refill.wait(), TOPIC_POOL_INTERVAL)
+        except TimeoutError:
+            pass
+        topic_pool_refill.clear()
+
+
 """
 SUBMISSION
 """
 
 
-async def get_submissions(_session: AsyncSession | None = None):
+async def list_submissions(
+    cursor: str | None = None, limit: int = 20, _session: AsyncSession | None = None
+):
     async def _inner(session: AsyncSession):
-        statement = (
-            select(Submission)
-            .order_by(desc(Submission.created_at))
-            .options(selectinload(Submission.topic), selectinload(Submission.review))  # type: ignore
+        statement = select(
+            Submission.id,
+            Submission.topic_id,
+            func.substr(Submission.submission, 1, EXCERPT_LENGTH).label("excerpt"),
+            Review.id.label("review_id"),  # type: ignore
+            Review.status.label("review_status"),  # type: ignore
+            Review.level_achieved,
+            Submission.created_at,
+        ).outerjoin(Review, Review.submission_id == Submission.id)  # type: ignore
+        return await _get_page(
+            session, statement, Submission, ListedSubmission, cursor, limit
         )
-        submissions = list((await session.execute(statement)).scalars().all())
-        return [format_submission(submission) for submission in submissions]
 
-    return await create_session_and_run(_inner, _session)
+    return await create_session_and_run(_inner, _session, read=True)
 
 
 async def _get_submission(id: str, _session: AsyncSession | None = None):
@@ -582,7 +1069,7 @@ async def _get_submission(id: str, _session: AsyncSession | None = None):
             raise SubmissionNotFound(id)
         return submission
 
-    return await create_session_and_run(_inner, _session)
+    return await create_session_and_run(_inner, _session, read=True)
 
 
 async def get_submission(id: str, _session: AsyncSession | None = None):
@@ -590,20 +1077,16 @@ async def get_submission(id: str, _session: AsyncSession | None = None):
     return format_submission(submission)
 
 
-async def get_submissions_of_topic(topic_id: str, _session: AsyncSession | None = None):
-    topic = await get_topic(topic_id, _session)
-    return topic.submissions
-
-
 async def submit(
     topic_id: str, submitted_text: str, _session: AsyncSession | None = None
 ):
     async def _inner(session: AsyncSession):
-        topic = await get_topic(topic_id, _session)
+        topic = await _get_topic(topic_id, session)
         submission = Submission(topic_id=topic.id, submission=submitted_text)
         session.add(submission)
         await session.commit()
-        return format_submission(submission)
+        # Loaded again with its relations, they can't be lazy loaded here
+        return await get_submission(submission.id, session)
 
     return await create_session_and_run(_inner, _session)
 
@@ -630,18 +1113,97 @@ async def delete_submission(id: str, _session: AsyncSession | None = None):
     return await create_session_and_run(_inner, _session)
 
 
+"""
+REVIEW CACHE
+"""
+
+
+review_cache: LRUCache[str, ReviewResponse] = LRUCache(
+    REVIEW_CACHE_SIZE, REVIEW_CACHE_TTL
+)
+
+
+async def _get_cached_review(key: str, _session: AsyncSession | None = None):
+    cached = review_cache.get(key)
+    if cached:
+        inc("review_cache.hit.memory")
+        return cached
+
+    async def _inner(session: AsyncSession):
+        entry = await session.get(ReviewCache, key)
+        if entry is None:
+            return None
+        if datetime.now() - entry.created_at > timedelta(seconds=REVIEW_CACHE_TTL):
+            return None
+        return entry.response
+
+    response = await create_session_and_run(_inner, _session, read=True)
+    if response is None:
+        inc("review_cache.miss")
+        return None
+
+    inc("review_cache.hit.db")
+    review_cache.set(key, response)
+    return response
+
+
+async def _cache_review(
+    key: str, response: ReviewResponse, _session: AsyncSession | None = None
+):
+    review_cache.set(key, response)
+    gauge("review_cache.memory_size", len(review_cache))
+
+    async def _inner(session: AsyncSession):
+        await session.execute(
+            sqlite_insert(ReviewCache)
+            .values(key=key, response=response, created_at=datetime.now())
+            .on_conflict_do_update(
+                index_elements=["key"],
+                set_={"response": response, "created_at": datetime.now()},
+            )
+        )
+
+        expired_before = datetime.now() - timedelta(seconds=REVIEW_CACHE_TTL)
+        overflow = (
+            select(ReviewCache.key)
+            .order_by(desc(ReviewCache.created_at))
+            .offset(REVIEW_CACHE_MAX_ROWS)
+        )
+        await session.execute(
+            delete(ReviewCache).where(
+                (ReviewCache.created_at < expired_before)  # type: ignore
+                | ReviewCache.key.in_(overflow)  # type: ignore
+            )
+        )
+        await session.commit()
+
+    await create_session_and_run(_inner, _session)
+    inc("review_cache.store")
+
+
 """
 REVIEW
 """
 
 
-async def get_reviews(_session: AsyncSession | None = None):
+async def list_reviews(
+    cursor: str | None = None, limit: int = 20, _session: AsyncSession | None = None
+):
     async def _inner(session: AsyncSession):
-        statement = select(Review).order_by(desc(Review.created_at))
-        reviews = list((await session.execute(statement)).scalars().all())
-        return [format_review(review) for review in reviews]
+        statement = select(
+            Review.id,
+            Review.topic_id,
+            Review.submission_id,
+            Review.status,
+            Review.score_range,
+            Review.level_achieved,
+            Review.summary_feedback,
+            Review.path,
+            Review.created_at,
+        )
+        return await _get_page(session, statement, Review, ListedReview, cursor, limit)
 
-    return await create_session_and_run(_inner, _session)
+    return await create_session_and_run(_inner, _session, read=True)
 
 
 async def _get_review(id: str, _session: AsyncSession | None = None):
@@ -657,7 +1219,7 @@ async def _get_review(id: str, _session: AsyncSession | None = None):
             raise ReviewNotFound(id)
         return review
 
-    return await create_session_and_run(_inner, _session)
+    return await create_session_and_run(_inner, _session, read=True)
 
 
 async def get_review(id: str, _session: AsyncSession | None = None):
@@ -665,11 +1227,6 @@ async def get_review(id: str, _session: AsyncSession | None = None):
     return format_review(review)
 
 
-async def get_reviews_of_topic(topic_id: str, _session: AsyncSession | None = None):
-    topic = await get_topic(topic_id, _session)
-    return topic.reviews
-
-
 async def get_review_of_submission(
     submission_id: str, _session: AsyncSession | None = None
 ):
@@ -680,75 +1237,301 @@ async def get_review_of_submission(
     return None
 
 
-async def review(submission_id: str, _session: AsyncSession | None = None):
+def _review_values(response: ReviewResponse) -> dict[str, Any]:
+    """The review columns `response` fills in"""
+    return {
+        "status": Status.done,
+        "score_range": response.score_range,
+        "level_achieved": response.level_achieved,
+        "overall_feedback": response.overall_feedback,
+        "summary_feedback": response.summary_feedback,
+        "detail_score": response.detail_score,
+        "annotations": response.annotations,
+        "improvement_suggestions": response.improvement_suggestions,
+    }
+
+
+def _fill_review(review: Review, response: ReviewResponse, submission: str):
+    for key, value in _review_values(response).items():
+        setattr(review, key, value)
+    if review.analysis:
+        # The model was told to leave these out, put them back in place
+        review.annotations = merge_annotations(
+            submission, response.annotations, review.analysis.annotations
+        )
+
+
+_store_review = update(Review.__table__).where(  # type: ignore
+    Review.id == bindparam("review_id"), Review.status == Status.pending
+)
+
+
+async def _update_review(id: str, status: bool, outcome: ReviewOutcome | None):
+    try:
+        task, review_id = id.split(":")
+        if task != "review":
+            return
+
+        values: dict[str, Any] = {"status": Status.failed}
+        if status and outcome is not None and outcome.response is not None:
+            values = {
+                **_review_values(outcome.response),
+                "path": outcome.path,
+                "escalation": outcome.escalation,
+            }
+
+        await execute(_store_review, {"review_id": review_id, **values})
+        await _publish_review(review_id)
+
+    except Exception:
+        print(format_exc())
+
+
+review_listeners: dict[str, Callable[[ReviewStreamEvent], Any]] = {}
+review_watchers: set[Task] = set()
+
+
+async def _review_job(payload: dict[str, Any]):
+    # Only the process that took the request can stream to it, a resumed job can't.
+    # A failed attempt leaves the listener for the next one, the last one to fail
+    # ends the stream from the stored row in `_watch_review`
+    review_id = payload["review_id"]
+    on_event = review_listeners.get(review_id)
+    # An identical job that ran while this one was queued may have stored a review
+    cached = await _get_cached_review(payload["cache_key"])
+    if cached:
+        outcome = ReviewOutcome(response=cached, path="cached")
+    elif on_event and current_attempt.get() == 1:
+        # Fields are streamed as they are written, there is no taking them back, so
+        # a retry only sends the finished review
+        response = await ai_review_stream(
+            part=payload["part"],
+            topic=payload["topic"],
+            submission=payload["submission"],
+            on_event=on_event,
+            hints=payload.get("hints"),
+        )
+        outcome = ReviewOutcome(response=response, path="premium")
+    else:
+        outcome = await ai_review_cascade(
+            part=payload["part"],
+            topic=payload["topic"],
+            submission=payload["submission"],
+            hints=payload.get("hints"),
+        )
+
+    # Single-flight callers share one response object, so only the first stores it.
+    # The key is of the review model, the cheap model's reviews are not kept under it
+    cache_key = payload["cache_key"]
+    response = outcome.response
+    if (
+        response is not None
+        and outcome.path != "cheap"
+        and review_cache.get(cache_key) is not response
+    ):
+        await _cache_review(cache_key, response)
+
+    # The model was told to leave these out, put them back in place here so the
+    # result is stored without loading the review
+    annotations = payload.get("annotations")
+    if response is not None and annotations:
+        merged = merge_annotations(
+            payload["submission"],
+            response.annotations,
+            [Annotation.model_validate(annotation) for annotation in annotations],
+        )
+        outcome = outcome.model_copy(
+            update={"response": response.model_copy(update={"annotations": merged})}
+        )
+    if outcome.response is not None:
+        on_event = review_listeners.pop(review_id, None)
+        if on_event:
+            on_event(ReviewStreamEvent(event="done", data=outcome.response))
+    return outcome
+
+
+register("review", _review_job, _update_review, Priority.interactive)
+
+
+async def _watch_review(id: str):
+    """Finish the stream from the stored row when another process ran the job"""
+    async for message in await watch_review(id):
+        if message.event == Status.pending.value:
+            continue
+        on_event = review_listeners.pop(id, None)
+        if on_event is None:
+            return
+        if message.event == Status.done.value:
+            response = ReviewResponse.model_validate(message.data, from_attributes=True)
+            on_event(ReviewStreamEvent(event="done", data=response))
+        else:
+            on_event(ReviewStreamEvent(event="failed", data=None))
+
+
+review_admission = Admission(
+    "review", ["review"], ADMISSION_REVIEW_LIMIT, ADMISSION_REVIEW_CLIENT_LIMIT
+)
+
+
+async def review(
+    submission_id: str,
+    on_event: Callable[[ReviewStreamEvent], Any] | None = None,
+    client: str | None = None,
+    _session: AsyncSession | None = None,
+):
     async def _inner(session: AsyncSession):
-        submission = await _get_submission(submission_id, session)
+        # Read through the read pool, the write connection is taken at the commit
+        # and not held while waiting to be admitted
+        submission = await _get_submission(submission_id, _session)
         topic = submission.topic
         if not topic:
             raise TopicNotFound()
 
-        async def update_review(id: str, status: bool, response: ReviewResponse | None):
-            try:
-                task, review_id = id.split(":")
-                if task != "review":
-                    return
-
-                async def _update_inner(update_session: AsyncSession):
-                    review = await _get_review(review_id, update_session)
-                    if not status or response is None:
-                        review.status = Status.failed
-                    else:
-                        review.status = Status.done
-                        review.score_range = response.score_range
-                        review.level_achieved = response.level_achieved
-                        review.overall_feedback = response.overall_feedback
-                        review.summary_feedback = response.summary_feedback
-                        review.detail_score = response.detail_score
-                        review.annotations = response.annotations
-                        review.improvement_suggestions = response.improvement_suggestions
-                    update_session.add(review)
-                    await update_session.commit()
-
-                await create_session_and_run(_update_inner)
-            except Exception:
-                print(format_exc())
-
         id = uuid4().__str__()
-        add_task(
-            ai_review(
-                part=topic.part.value,
-                topic=cast(str, topic.question),
-                submission=submission.submission,
-            ),
-            f"review:{id}",
-            callback=update_review,
-            event_loop=get_event_loop(),
-        )
         review_obj = Review(
             id=id,
             submission_id=submission.id,
             topic_id=topic.id,
             status=Status.pending,
+            analysis=analyze(topic.part.value, submission.submission),
+        )
+
+        cache_key = review_cache_key(
+            topic.part.value, cast(str, topic.question), submission.submission
         )
+        cached = await _get_cached_review(cache_key, _session)
         session.add(review_obj)
-        await session.commit()
+        if cached:
+            _fill_review(review_obj, cached, submission.submission)
+            review_obj.path = "cached"
+            await session.commit()
+            if on_event:
+                # What was stored, with the annotations of the analysis merged in
+                merged = cached.model_copy(update={"annotations": review_obj.annotations})
+                on_event(ReviewStreamEvent(event="done", data=merged))
+
+        else:
+            payload = {
+                "review_id": id,
+                "part": topic.part.value,
+                "topic": topic.question,
+                "submission": submission.submission,
+                "hints": hints(cast(Analysis, review_obj.analysis)),
+                "annotations": [
+                    annotation.model_dump()
+                    for annotation in cast(Analysis, review_obj.analysis).annotations
+                ],
+                "cache_key": cache_key,
+            }
+            async with review_admission.admit(client):
+                if on_event:
+                    review_listeners[id] = on_event
+                try:
+                    await add_task("review", payload, id, client, session)
+                except Exception:
+                    review_listeners.pop(id, None)
+                    raise
+
+            if on_event:
+                watcher = create_task(_watch_review(id))
+                review_watchers.add(watcher)
+                watcher.add_done_callback(review_watchers.discard)
+
         return (review_obj, id)
 
     return await create_session_and_run(_inner, _session)
 
 
 """
-STATICS
+STATUS EVENTS
 """
 
 
-async def get_sessions(_session: AsyncSession | None = None):
-    async def _inner(session: AsyncSession):
-        statements = select(Session)
+async def _watch(channel: str, load: Callable[[], Awaitable[SlicedTopic | SlicedReview]]):
+    # Subscribe before reading, so a change in between is not missed
+    subscription = subscribe(channel)
+    try:
+        current = await load()
+    except Exception:
+        subscription.close()
+        raise
+
+    async def _events():
+        with subscription:
+            yield Message(event=current.status.value, data=current)
+            if current.status != Status.pending:
+                return
+            while True:
+                message = await subscription.get()
+                yield message
+                if message.event != Status.pending.value:
+                    return
 
-        return list((await session.execute(statements)).scalars().all())
+    return _events()
 
-    return await create_session_and_run(_inner, _session)
+
+async def watch_topic(id: str):
+    """The topic as it is now, then again once it is done or failed"""
+    return await _watch(f"topic:{id}", partial(get_topic, id))
+
+
+async def watch_review(id: str):
+    """The review as it is now, then again once it is done or failed"""
+    return await _watch(f"review:{id}", partial(get_review, id))
+
+
+async def _publish_topic(id: str):
+    channel = f"topic:{id}"
+    if has_subscribers(channel):
+        topic = await get_topic(id)
+        publish(channel, topic.status.value, topic)
+
+
+async def _publish_review(id: str):
+    channel = f"review:{id}"
+    if has_subscribers(channel):
+        review = await get_review(id)
+        publish(channel, review.status.value, review)
+
+
+async def run_status_watcher():
+    """Publish topics and reviews that jobs in other processes have finished"""
+    while True:
+        await sleep(JOB_POLL_INTERVAL)
+        watched: dict[str, list[str]] = {"topic": [], "review": []}
+        for channel in channels():
+            kind, id = channel.split(":", 1)
+            watched[kind].append(id)
+
+        try:
+            if watched["topic"]:
+                statement = select(Topic.id).where(
+                    Topic.id.in_(watched["topic"]),  # type: ignore
+                    Topic.status != Status.pending,
+                )
+                for id in await create_session_and_run(
+                    lambda session, statement=statement: session.scalars(statement),
+                    read=True,
+                ):
+                    await _publish_topic(id)
+
+            if watched["review"]:
+                statement = select(Review.id).where(
+                    Review.id.in_(watched["review"]),  # type: ignore
+                    Review.status != Status.pending,
+                )
+                for id in await create_session_and_run(
+                    lambda session, statement=statement: session.scalars(statement),
+                    read=True,
+                ):
+                    await _publish_review(id)
+        except Exception:
+            print(format_exc())
+
+
+"""
+STATICS
+"""
 
 
 async def add_session(
@@ -765,32 +1548,17 @@ async def add_session(
 
 async def statistics():
     async def _inner(session: AsyncSession):
-        reviews = filter(lambda x: x.score_range is not None, await get_reviews(session))
-
-        mid_points: list[float] = []
-        for review in reviews:
-            score_range = cast(tuple[int, int], review.score_range)
-            mid_points.append((score_range[0] + score_range[1]) / 2)
-
-        average_score = sum(mid_points) / len(mid_points) if len(mid_points) else 0
-        improvement_rate = (
-            (mid_points[0] + mid_points[-1]) / mid_points[0]
-            if len(mid_points) and mid_points[0]
-            else 0
-        )
-
-        sessions = await get_sessions(session)
-        total_time = sum(
-            [(session.started_at - session.ended_at).microseconds for session in sessions]
-        )
-
-        submissions = await get_submissions(session)
-
+        stats = await session.get(Stats, 1) or Stats()
+        first_score = stats.first_score
         return Statistics(
-            total_submission=submissions.__len__(),
-            average_score=average_score,
-            improvement_rate=improvement_rate,
-            total_time=total_time,
+            total_submission=stats.submission_count,
+            average_score=stats.score_sum / stats.score_count if stats.score_count else 0,
+            improvement_rate=(
+                (cast(float, stats.latest_score) - first_score) / first_score
+                if first_score
+                else 0
+            ),
+            total_time=stats.session_time,
         )
 
-    return await create_session_and_run(_inner)
+    return await create_session_and_run(_inner, read=True)
@@ -0,0 +1,87 @@
+from typing import Awaitable, Callable, TypeVar
+
+from sqlalchemy import Engine, event
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from .env import (
+    DB_BUSY_TIMEOUT,
+    DB_CACHE_SIZE,
+    DB_JOURNAL_MODE,
+    DB_MMAP_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_READ_POOL_SIZE,
+    DB_SYNCHRONOUS,
+    DB_TEMP_STORE,
+    DB_URL,
+    DB_WRITE_POOL_SIZE,
+)
+from .metrics import inc
+
+# SQLite takes one writer at a time, so writes share a couple of connections and
+# queue for them here instead of on the file lock. Reads get their own pool.
+engine = create_async_engine(
+    DB_URL, pool_size=DB_WRITE_POOL_SIZE, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT
+)
+read_engine = create_async_engine(
+    DB_URL, pool_size=DB_READ_POOL_SIZE, max_overflow=0, pool_timeout=DB_POOL_TIMEOUT
+)
+
+
+def _listen(sync_engine: Engine, read: bool):
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON;")
+        # The journal mode is kept in the file, the writer sets it
+        if not read:
+            cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE};")
+        cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS};")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT};")
+        cursor.execute(f"PRAGMA cache_size={DB_CACHE_SIZE};")
+        cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE};")
+        cursor.execute(f"PRAGMA temp_store={DB_TEMP_STORE};")
+        if read:
+            cursor.execute("PRAGMA query_only=ON;")
+        cursor.close()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def count_lock_errors(context):
+        if "database is locked" in str(context.original_exception):
+            inc("db.locked")
+
+
+_listen(engine.sync_engine, read=False)
+_listen(read_engine.sync_engine, read=True)
+
+write_session = async_sessionmaker(engine, expire_on_commit=False)
+read_session = async_sessionmaker(read_engine, expire_on_commit=False)
+
+
+T = TypeVar("T")
+
+
+async def create_session_and_run(
+    func: Callable[[AsyncSession], Awaitable[T]],
+    _session: AsyncSession | None = None,
+    read: bool = False,
+) -> T:
+    """Run `func` in `_session`, or in a new session, from the read pool if `read`"""
+    if _session:
+        return await func(_session)
+    else:
+        async with (read_session if read else write_session)() as _session:
+            return await func(_session)
+
+
+async def get_session():
+    async with write_session() as session:
+        yield session
+
+
+async def dispose():
+    await engine.dispose()
+    await read_engine.dispose()
@@ -5,6 +5,19 @@ import dotenv
 dotenv.load_dotenv()
 
 DB_URL = os.getenv("DB_URL", "sqlite+aiosqlite:///data/db.sqlite")
+# SQLite connection settings, see https://www.sqlite.org/pragma.html
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")  # Readers don't block the writer
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # Safe with WAL
+DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))  # Milliseconds for a lock
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-65536"))  # Pages, KiB when negative
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # Bytes
+DB_TEMP_STORE = os.getenv("DB_TEMP_STORE", "MEMORY")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))  # Connections per process
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", "2"))  # Writes queue beyond it
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds for a connection
+# Job results are committed together, up to this many, waiting this long for more
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", "64"))
+WRITER_WINDOW = float(os.getenv("WRITER_WINDOW", "0.005"))  # Seconds
 
 OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://ai.hackclub.com/")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -14,4 +27,81 @@ if not OPENROUTER_API_KEY:
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "google/gemini-3-flash-preview")
 QUESTION_MODEL = os.getenv("QUESTION_MODEL", DEFAULT_MODEL)
 REVIEW_MODEL = os.getenv("REVIEW_MODEL", DEFAULT_MODEL)
-ARTIST_MODEL = os.getenv("ARTIST_MODEL", DEFAULT_MODEL) # Part 1 Image generator
+ARTIST_MODEL = os.getenv("ARTIST_MODEL", DEFAULT_MODEL)  # Part 1 Image generator
+
+REVIEW_CACHE_SIZE = int(os.getenv("REVIEW_CACHE_SIZE", "256"))  # In-memory entries
+REVIEW_CACHE_MAX_ROWS = int(os.getenv("REVIEW_CACHE_MAX_ROWS", "10000"))
+REVIEW_CACHE_TTL = int(os.getenv("REVIEW_CACHE_TTL", str(7 * 24 * 60 * 60)))  # Seconds
+
+# Per-model request limits, 0 means unlimited
+QUESTION_MODEL_CONCURRENCY = int(os.getenv("QUESTION_MODEL_CONCURRENCY", "8"))
+QUESTION_MODEL_RPM = int(os.getenv("QUESTION_MODEL_RPM", "60"))
+QUESTION_MODEL_TPM = int(os.getenv("QUESTION_MODEL_TPM", "0"))
+REVIEW_MODEL_CONCURRENCY = int(os.getenv("REVIEW_MODEL_CONCURRENCY", "8"))
+REVIEW_MODEL_RPM = int(os.getenv("REVIEW_MODEL_RPM", "60"))
+REVIEW_MODEL_TPM = int(os.getenv("REVIEW_MODEL_TPM", "0"))
+ARTIST_MODEL_CONCURRENCY = int(os.getenv("ARTIST_MODEL_CONCURRENCY", "4"))
+ARTIST_MODEL_RPM = int(os.getenv("ARTIST_MODEL_RPM", "20"))
+ARTIST_MODEL_TPM = int(os.getenv("ARTIST_MODEL_TPM", "0"))
+AI_MAX_ATTEMPTS = int(os.getenv("AI_MAX_ATTEMPTS", "5"))  # Per request, on 429/5xx
+AI_MAX_GENERATIONS = int(os.getenv("AI_MAX_GENERATIONS", "3"))  # Full prompt re-sends
+
+# Deadline of one upstream call, in seconds
+QUESTION_MODEL_TIMEOUT = float(os.getenv("QUESTION_MODEL_TIMEOUT", "120"))
+REVIEW_MODEL_TIMEOUT = float(os.getenv("REVIEW_MODEL_TIMEOUT", "120"))
+ARTIST_MODEL_TIMEOUT = float(os.getenv("ARTIST_MODEL_TIMEOUT", "180"))
+# A call slower than this percentile of recent ones gets a duplicate, 0 disables it
+AI_HEDGE_PERCENTILE = float(os.getenv("AI_HEDGE_PERCENTILE", "90"))
+AI_HEDGE_MIN_SAMPLES = int(os.getenv("AI_HEDGE_MIN_SAMPLES", "20"))
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "30"))  # Until there are samples
+# Model for the duplicate, calls without one are not duplicated
+QUESTION_FALLBACK_MODEL = os.getenv("QUESTION_FALLBACK_MODEL")
+REVIEW_FALLBACK_MODEL = os.getenv("REVIEW_FALLBACK_MODEL")
+AI_HEDGE_SAME_MODEL = os.getenv("AI_HEDGE_SAME_MODEL", "0") == "1"  # Unless this is set
+# Cheap model that reviews first, the review model only gets what it can't settle
+REVIEW_CASCADE_MODEL = os.getenv("REVIEW_CASCADE_MODEL")  # Unset disables the cascade
+REVIEW_CASCADE_MAX_RANGE = int(os.getenv("REVIEW_CASCADE_MAX_RANGE", "20"))  # Points
+# Stop calling a model once this share of its latest calls failed, 0 disables it
+AI_BREAKER_FAILURE_RATIO = float(os.getenv("AI_BREAKER_FAILURE_RATIO", "0.5"))
+AI_BREAKER_WINDOW = int(os.getenv("AI_BREAKER_WINDOW", "20"))  # Latest calls kept
+AI_BREAKER_MIN_CALLS = int(os.getenv("AI_BREAKER_MIN_CALLS", "5"))  # Before judging
+AI_BREAKER_COOLDOWN = float(os.getenv("AI_BREAKER_COOLDOWN", "30"))  # Between probes
+# Models that accept `json_schema` response formats, comma separated, "*" for all
+AI_JSON_SCHEMA_MODELS = [
+    model.strip() for model in os.getenv("AI_JSON_SCHEMA_MODELS", "").split(",") if model
+]
+
+# Ready-made topics per part, refilled up to HIGH once fewer than LOW are left
+TOPIC_POOL_LOW_WATERMARK = int(os.getenv("TOPIC_POOL_LOW_WATERMARK", "1"))
+TOPIC_POOL_HIGH_WATERMARK = int(os.getenv("TOPIC_POOL_HIGH_WATERMARK", "3"))
+TOPIC_POOL_P1_COUNT = int(os.getenv("TOPIC_POOL_P1_COUNT", "5"))  # Pictures per topic
+TOPIC_POOL_INTERVAL = int(os.getenv("TOPIC_POOL_INTERVAL", "30"))  # Seconds
+
+P1_BATCH_SIZE = int(os.getenv("P1_BATCH_SIZE", "10"))  # Picture prompts per request
+P1_IMAGE_CONCURRENCY = int(os.getenv("P1_IMAGE_CONCURRENCY", "3"))  # Per topic
+# Share of a Part 1 topic's pictures that must succeed for the topic to be kept
+P1_MIN_SUCCESS_RATIO = float(os.getenv("P1_MIN_SUCCESS_RATIO", "0.6"))
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))  # Jobs run at once per process
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "30"))  # Renewed while running
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))  # Seconds
+JOB_BULK_SHARE = float(os.getenv("JOB_BULK_SHARE", "0.5"))  # Of slots, for bulk jobs
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", str(24 * 60 * 60)))  # Finished jobs
+JOB_RETENTION_MAX_ROWS = int(os.getenv("JOB_RETENTION_MAX_ROWS", "10000"))
+JOB_PRUNE_INTERVAL = int(os.getenv("JOB_PRUNE_INTERVAL", "300"))  # Seconds
+# Set to 0 when jobs run in separate `python -m lib.worker` processes
+EMBEDDED_WORKER = os.getenv("EMBEDDED_WORKER", "1") == "1"
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "16"))  # Per subscriber
+
+P1_MAX_COUNT = int(os.getenv("P1_MAX_COUNT", "20"))  # Pictures per requested topic
+# Unfinished jobs allowed at once, over all clients and per client address. A whole
+# classroom behind one NAT shares an address, so the per-client limits are off (0)
+# unless set. Behind a proxy, start uvicorn with `--forwarded-allow-ips` so the
+# address is the one the proxy saw and not the proxy's own
+ADMISSION_TOPIC_LIMIT = int(os.getenv("ADMISSION_TOPIC_LIMIT", "20"))
+ADMISSION_TOPIC_CLIENT_LIMIT = int(os.getenv("ADMISSION_TOPIC_CLIENT_LIMIT", "0"))
+ADMISSION_REVIEW_LIMIT = int(os.getenv("ADMISSION_REVIEW_LIMIT", "50"))
+ADMISSION_REVIEW_CLIENT_LIMIT = int(os.getenv("ADMISSION_REVIEW_CLIENT_LIMIT", "0"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "32"))  # Waiting requests
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "5"))  # Seconds
@@ -1,17 +1,48 @@
-class TopicNotFound(ValueError): 
+class TopicNotFound(ValueError):
     def __init__(self, id: str | None = None):
         super()
         self.message = "topic not found"
         self.id = id
 
-class SubmissionNotFound(ValueError): 
+
+class SubmissionNotFound(ValueError):
     def __init__(self, id: str | None = None):
         super()
         self.message = "submission not found"
         self.id = id
 
-class ReviewNotFound(ValueError): 
+
+class ReviewNotFound(ValueError):
     def __init__(self, id: str | None = None):
         super()
         self.message = "review not found"
-        self.id = id
\ No newline at end of file
+        self.id = id
+
+
+class UpstreamError(RuntimeError):
+    def __init__(self, status: int, message: str = "upstream request failed"):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class Overloaded(RuntimeError):
+    def __init__(self, status: int, retry_after: int, message: str = "server is busy"):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.retry_after = retry_after
+
+
+class JobNotFound(ValueError):
+    def __init__(self, id: str | None = None):
+        super()
+        self.message = "job not found"
+        self.id = id
+
+
+class InvalidCursor(ValueError):
+    def __init__(self, cursor: str | None = None):
+        super()
+        self.message = "invalid cursor"
+        self.cursor = cursor
@@ -0,0 +1,35 @@
+from collections import defaultdict, deque
+
+counters: dict[str, float] = defaultdict(float)
+gauges: dict[str, float] = {}
+
+
+def inc(name: str, value: float = 1):
+    counters[name] += value
+
+
+def gauge(name: str, value: float):
+    gauges[name] = value
+
+
+def snapshot():
+    return {"counters": dict(counters), "gauges": dict(gauges)}
+
+
+class LatencyWindow:
+    """Durations of the latest calls, to derive percentiles from"""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, percent: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def __len__(self):
+        return len(self.samples)
@@ -0,0 +1,54 @@
+from typing import Callable
+
+from sqlalchemy import Connection, MetaData, Table, inspect, literal, text
+
+Migration = Callable[[Connection], None]
+
+
+def add_missing_columns(conn: Connection, table: Table):
+    """Add the columns of `table` the database doesn't have yet, with their indexes"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        return
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        definition = f'"{column.name}" {column.type.compile(conn.dialect)}'
+        if column.default is not None and column.default.is_scalar:
+            default = literal(column.default.arg, column.type).compile(
+                conn, compile_kwargs={"literal_binds": True}
+            )
+            definition += f" DEFAULT {default}"
+        conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN {definition}'))
+        if column.index:
+            conn.execute(
+                text(
+                    f'CREATE INDEX IF NOT EXISTS "ix_{table.name}_{column.name}" '
+                    + f'ON "{table.name}" ("{column.name}")'
+                )
+            )
+
+
+def create_indexes(conn: Connection, table: Table):
+    """Create the indexes declared on `table` that don't exist yet"""
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def migrate(conn: Connection, metadata: MetaData, migrations: list[Migration]):
+    """
+    Bring the database up to the models. Missing tables are created as they are
+    now, then the migrations after the version stored in `PRAGMA user_version` run
+    in order, each one recorded once it's done. A new database runs them all too,
+    so a migration must also work on tables `create_all` just made.
+    """
+    new = not inspect(conn).get_table_names()
+    metadata.create_all(conn)
+
+    version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+    for number, migration in enumerate(migrations[version:], start=version + 1):
+        migration(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+        if not new:
+            print(f"database migrated to version {number}")
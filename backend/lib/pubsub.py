@@ -0,0 +1,71 @@
+from asyncio import Queue
+from typing import Any
+
+from pydantic import BaseModel
+
+from .env import PUBSUB_QUEUE_SIZE
+from .metrics import gauge, inc
+
+
+class Message(BaseModel):
+    event: str
+    data: Any
+
+
+class Subscription:
+    def __init__(self, channel: str, size: int = PUBSUB_QUEUE_SIZE):
+        self.channel = channel
+        self._queue: Queue[Message] = Queue(size)
+
+    def put(self, message: Message):
+        # A slow consumer loses the oldest updates, never the latest one
+        if self._queue.full():
+            self._queue.get_nowait()
+            inc("pubsub.dropped")
+        self._queue.put_nowait(message)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def close(self):
+        subscribers = subscriptions.get(self.channel)
+        if subscribers is None:
+            return
+        subscribers.discard(self)
+        if not subscribers:
+            del subscriptions[self.channel]
+        gauge("pubsub.channels", len(subscriptions))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+subscriptions: dict[str, set[Subscription]] = {}
+
+
+def subscribe(channel: str):
+    subscription = Subscription(channel)
+    subscriptions.setdefault(channel, set()).add(subscription)
+    gauge("pubsub.channels", len(subscriptions))
+    return subscription
+
+
+def has_subscribers(channel: str):
+    return channel in subscriptions
+
+
+def channels():
+    return list(subscriptions.keys())
+
+
+def publish(channel: str, event: str, data: Any = None):
+    subscribers = subscriptions.get(channel)
+    if not subscribers:
+        return
+    message = Message(event=event, data=data)
+    for subscription in list(subscribers):
+        subscription.put(message)
+    inc("pubsub.published")
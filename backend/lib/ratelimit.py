@@ -0,0 +1,141 @@
+from asyncio import Future, get_running_loop, sleep
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic
+
+from .metrics import gauge, inc
+
+# Lower goes first when requests wait for a model slot, set per job
+request_priority: ContextVar[int] = ContextVar("request_priority", default=0)
+
+
+class PrioritySemaphore:
+    """Semaphore that wakes the waiter with the lowest priority, then the oldest"""
+
+    def __init__(self, value: int):
+        self.value = value
+        self._waiters: list[tuple[int, int, Future]] = []
+        self._order = count()
+
+    async def acquire(self, priority: int = 0):
+        while self._waiters and self._waiters[0][2].done():
+            heappop(self._waiters)
+        if self.value > 0 and not self._waiters:
+            self.value -= 1
+            return
+
+        future = get_running_loop().create_future()
+        heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await future
+        except BaseException:
+            # Handed a slot right as we were cancelled, pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.value += 1
+
+
+class TokenBucket:
+    """Refills `rate` tokens per minute up to `capacity`. A rate of 0 disables it."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate / 60
+        )
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1):
+        if not self.rate:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await sleep((amount - self.tokens) * 60 / self.rate)
+
+    def adjust(self, amount: float):
+        """Give back (positive) or take (negative) tokens after the real cost is known"""
+        if not self.rate:
+            return
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class ModelLimiter:
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+    ):
+        self.name = name
+        self.semaphore = PrioritySemaphore(concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.blocked_until = 0.0
+        self.waiting = 0
+        self.in_flight = 0
+
+    def pause(self, seconds: float):
+        """Hold back every request to this model, e.g. after a 429 with Retry-After"""
+        self.blocked_until = max(self.blocked_until, monotonic() + seconds)
+        inc(f"ai.{self.name}.throttled")
+
+    def _report(self):
+        gauge(f"ai.{self.name}.waiting", self.waiting)
+        gauge(f"ai.{self.name}.in_flight", self.in_flight)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int):
+        self.waiting += 1
+        self._report()
+        try:
+            await self.semaphore.acquire(request_priority.get())
+        finally:
+            self.waiting -= 1
+
+        try:
+            while (delay := self.blocked_until - monotonic()) > 0:
+                await sleep(delay)
+            await self.requests.acquire()
+            await self.tokens.acquire(estimated_tokens)
+
+            self.in_flight += 1
+            self._report()
+            inc(f"ai.{self.name}.requests")
+            usage = Usage(estimated_tokens)
+            try:
+                yield usage
+            finally:
+                self.in_flight -= 1
+                self._report()
+                self.tokens.adjust(estimated_tokens - usage.tokens)
+                inc(f"ai.{self.name}.tokens", usage.tokens)
+        finally:
+            self.semaphore.release()
+
+
+class Usage:
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.started_at = monotonic()  # Once the slot is taken, after any wait for it
@@ -0,0 +1,193 @@
+import json
+import re
+from functools import cache
+from types import UnionType
+from typing import (
+    Any,
+    Literal,
+    Sequence,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
+
+from pydantic import BaseModel
+
+M = TypeVar("M", bound=BaseModel)
+
+FENCE_REGEX = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+
+
+def strip_fences(text: str):
+    text = FENCE_REGEX.sub("", text)
+    start = text.find("{")
+    return text[start:] if start != -1 else text
+
+
+def close_json(text: str):
+    """
+    Drop trailing commas and close whatever strings, arrays and objects a
+    truncated response left open. A key left without a value is dropped.
+    """
+    output: list[str] = []
+    # Open containers, with whether the next string in an object is a key
+    stack: list[list[Any]] = []
+    in_string = False
+    escaped = False
+    string_is_key = False
+    key_start: int | None = None  # Set while a key has no value yet
+
+    for char in text:
+        if in_string:
+            output.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+                if string_is_key:
+                    stack[-1][1] = False
+            continue
+
+        if char.isspace() or char == ":":
+            output.append(char)
+            continue
+
+        if char == '"':
+            string_is_key = bool(stack) and stack[-1][0] == "{" and stack[-1][1]
+            key_start = len(output) if string_is_key else None
+            in_string = True
+        elif char == ",":
+            if stack and stack[-1][0] == "{":
+                stack[-1][1] = True
+        elif char in "{[":
+            key_start = None
+            stack.append([char, char == "{"])
+        elif char in "}]":
+            key_start = None
+            _drop_trailing_comma(output)
+            if stack:
+                stack.pop()
+        else:
+            key_start = None
+        output.append(char)
+
+        if not stack and char in "}]":
+            break  # Ignore anything after the top-level value
+
+    if key_start is not None:
+        del output[key_start:]
+    elif in_string:
+        if escaped:
+            output.pop()
+        output.append('"')
+
+    _drop_trailing_comma(output)
+    text = "".join(output).rstrip()
+    for opener, _ in reversed(stack):
+        text += "}" if opener == "{" else "]"
+    return text
+
+
+def _drop_trailing_comma(output: list[str]):
+    index = len(output) - 1
+    while index >= 0 and output[index].isspace():
+        index -= 1
+    if index >= 0 and output[index] == ",":
+        del output[index:]
+
+
+def coerce(model: type[BaseModel], data: Any) -> Any:
+    """Nudge near-miss data (key casing, `from` vs `from_`, literal case...) to `model`"""
+    if not isinstance(data, dict):
+        return data
+
+    fields = _field_types(model)
+    lookup = {_normalize_key(name): name for name in fields}
+    result: dict[str, Any] = {}
+    for key, value in data.items():
+        name = key if key in fields else lookup.get(_normalize_key(key), key)
+        result[name] = _coerce_value(fields[name], value) if name in fields else value
+    return result
+
+
+@cache
+def _field_types(model: type[BaseModel]) -> dict[str, Any]:
+    # Resolves forward references such as `list["Annotation"]`
+    hints = get_type_hints(model)
+    return {
+        name: hints.get(name, field.annotation)
+        for name, field in model.model_fields.items()
+    }
+
+
+def _normalize_key(key: str):
+    return re.sub(r"[^a-z0-9]", "", key.lower())
+
+
+def _coerce_value(annotation: Any, value: Any) -> Any:
+    origin = get_origin(annotation)
+
+    if origin in (Union, UnionType):
+        options = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if value is None:
+            return value
+        if all(get_origin(option) is Literal for option in options):
+            return _coerce_literal([arg for o in options for arg in get_args(o)], value)
+        if len(options) != 1:
+            return value
+        return _coerce_value(options[0], value)
+
+    if origin is Literal:
+        return _coerce_literal(get_args(annotation), value)
+    if origin is list and isinstance(value, list):
+        (item_type,) = get_args(annotation) or (Any,)
+        return [_coerce_value(item_type, item) for item in value]
+
+    if origin is tuple:
+        if isinstance(value, str):
+            value = [part.strip() for part in re.split(r"[,\-–]", value)]
+        if isinstance(value, list):
+            item_types = get_args(annotation)
+            if item_types and item_types[-1] is not Ellipsis:
+                value = value[: len(item_types)]
+                return [_coerce_value(t, v) for t, v in zip(item_types, value)]
+        return value
+
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return coerce(annotation, value)
+
+    if annotation is int and isinstance(value, float):
+        return round(value)
+
+    if annotation is str and isinstance(value, (int, float)):
+        return str(value)
+
+    return value
+
+
+def _coerce_literal(allowed: Sequence[Any], value: Any):
+    if isinstance(value, str) and value not in allowed:
+        for option in allowed:
+            if isinstance(option, str) and option.lower() == value.strip().lower():
+                return option
+    return value
+
+
+def repair(text: str, model: type[M]) -> M:
+    """
+    Best-effort local fix of a model response, raising the same errors as a
+    plain `json.loads` + `model_validate` when it can't be saved.
+    """
+    text = strip_fences(text)
+    try:
+        data = json.loads(text)
+    except json.decoder.JSONDecodeError:
+        data = json.loads(close_json(text))
+
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]  # The prompts forbid it, but models still wrap objects in [ ]
+    return model.model_validate(coerce(model, data))
@@ -1,9 +1,18 @@
+import json
 from functools import wraps
-from typing import Awaitable, Callable, TypeVar
+from typing import Any, Awaitable, Callable, TypeVar
 
 from fastapi import HTTPException, status
+from pydantic import BaseModel
 
-from lib.exception import ReviewNotFound, SubmissionNotFound, TopicNotFound
+from lib.exception import (
+    InvalidCursor,
+    JobNotFound,
+    Overloaded,
+    ReviewNotFound,
+    SubmissionNotFound,
+    TopicNotFound,
+)
 
 R = TypeVar("R")
 
@@ -13,9 +22,22 @@ def exception_handler(func: Callable[..., Awaitable[R]]):
     async def wrapper(*args, **kwargs):
         try:
             return await func(*args, **kwargs)
-        except (TopicNotFound, SubmissionNotFound, ReviewNotFound) as e:
+        except (TopicNotFound, SubmissionNotFound, ReviewNotFound, JobNotFound) as e:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        except InvalidCursor as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.message)
+        except Overloaded as e:
+            raise HTTPException(
+                status_code=e.status,
+                detail=e.message,
+                headers={"Retry-After": str(e.retry_after)},
+            )
         except Exception as e:
             raise e
 
     return wrapper
+
+
+def format_sse(event: str, data: Any = None):
+    payload = data.model_dump_json() if isinstance(data, BaseModel) else json.dumps(data)
+    return f"event: {event}\ndata: {payload}\n\n"
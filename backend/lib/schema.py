@@ -0,0 +1,50 @@
+from functools import cache
+from typing import Any
+
+from pydantic import BaseModel
+
+
+def _strict(node: Any) -> Any:
+    """
+    Rewrite a pydantic JSON schema into the subset structured outputs accept: every
+    property required, no extra properties, no titles or defaults, enums instead of
+    unions of constants and `items` instead of tuple `prefixItems`.
+    """
+    if isinstance(node, list):
+        return [_strict(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+
+    node = {
+        key: _strict(value)
+        for key, value in node.items()
+        if key not in ("title", "default")
+    }
+
+    options = node.get("anyOf")
+    if options and all("const" in option for option in options):
+        del node["anyOf"]
+        node["enum"] = [option["const"] for option in options]
+        types = {option.get("type") for option in options}
+        if len(types) == 1 and None not in types:
+            node["type"] = types.pop()
+
+    prefix = node.pop("prefixItems", None)
+    if prefix:
+        node["items"] = prefix[0] if all(item == prefix[0] for item in prefix) else {}
+
+    if node.get("type") == "object" and "properties" in node:
+        node["required"] = list(node["properties"])
+        node["additionalProperties"] = False
+
+    return node
+
+
+@cache
+def json_schema(model: type[BaseModel]) -> dict[str, Any]:
+    """The `json_schema` response format for `model`, built once per class"""
+    return {
+        "name": model.__name__,
+        "strict": True,
+        "schema": _strict(model.model_json_schema()),
+    }
@@ -1,81 +1,512 @@
 import traceback
 from asyncio import (
-    AbstractEventLoop,
+    CancelledError,
+    Event,
+    Semaphore,
     Task,
     Timeout,
     create_task,
     gather,
-    run_coroutine_threadsafe,
+    sleep,
+    wait_for,
 )
-from typing import Any, Callable, Coroutine, TypeVar
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from enum import Enum as PyEnum, IntEnum
+from functools import partial
+from os import getpid
+from socket import gethostname
+from time import monotonic
+from typing import Any, Callable, Coroutine, NamedTuple, Optional, cast
 from uuid import uuid4
 
-tasks: dict[str, Task] = {}
+from sqlalchemy import CursorResult, Index, delete, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlmodel import (
+    JSON,
+    Column,
+    Enum as SQLEnum,
+    Field as SQLField,
+    SQLModel,
+    desc,
+    select,
+)
+
+from .engine import create_session_and_run
+from .env import (
+    JOB_BULK_SHARE,
+    JOB_CONCURRENCY,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_PRUNE_INTERVAL,
+    JOB_RETENTION,
+    JOB_RETENTION_MAX_ROWS,
+)
+from .exception import JobNotFound
+from .metrics import gauge, inc
+from .ratelimit import request_priority
+from .writer import write
+
+
+class JobState(PyEnum):
+    queued = "queued"
+    running = "running"
+    done = "done"
+    failed = "failed"
+    cancelled = "cancelled"
+
+
+class Priority(IntEnum):
+    interactive = 0  # A student is waiting on it
+    topic = 1
+    bulk = 2  # Part 1 picture sets
+    background = 3  # Topic pool refills
+
+
+class Job(SQLModel, table=True):
+    __tablename__ = "job"  # type: ignore
+    # Also the running jobs of a client, counted for every job `_claim` weighs
+    __table_args__ = (Index("ix_job_state_client", "state", "client"),)
+
+    id: str = SQLField(primary_key=True)
+    kind: str = SQLField(index=True)
+    payload: dict[str, Any] = SQLField(default={}, sa_column=Column(JSON))
+    client: Optional[str] = SQLField(default=None, index=True)  # Who asked for it
+    priority: int = SQLField(default=Priority.topic, index=True)  # Lower runs first
+
+    state: JobState = SQLField(
+        default=JobState.queued, sa_column=Column(SQLEnum(JobState))
+    )
+    attempts: int = SQLField(default=0)
+    error: Optional[str] = SQLField(default=None)
+    progress: int = SQLField(default=0)  # Steps done, out of `progress_total`
+    progress_total: Optional[int] = SQLField(default=None)
+
+    lease_owner: Optional[str] = SQLField(default=None)
+    lease_expires_at: Optional[datetime] = SQLField(default=None)
+    available_at: datetime = SQLField(default_factory=lambda: datetime.now())
+
+    created_at: datetime = SQLField(default_factory=lambda: datetime.now())
+    started_at: Optional[datetime] = SQLField(default=None)  # Of the latest attempt
+    finished_at: Optional[datetime] = SQLField(default=None, index=True)
+    updated_at: datetime = SQLField(default_factory=lambda: datetime.now())
+
+
+Handler = Callable[[dict[str, Any]], Coroutine[Any, Any, Any]]
+Callback = Callable[[str, bool, Any], Coroutine[Any, Any, Any]]
+
+
+class JobKind(NamedTuple):
+    handler: Handler
+    callback: Callback | None
+    priority: Priority
+
+
+kinds: dict[str, JobKind] = {}
+tasks: dict[str, Task] = {}  # Jobs running in this process
+current_job: ContextVar[str | None] = ContextVar("current_job", default=None)
+current_attempt: ContextVar[int] = ContextVar("current_attempt", default=1)
 
-T = TypeVar("T")
+worker_id = f"{gethostname()}:{getpid()}:{uuid4().hex[:8]}"
+wakeup = Event()
+stopping = Event()
 
 
-def add_task(
-    coro: Coroutine[Any, Any, T],
-    id: str = uuid4().__str__(),
-    callback: Callable[[str, bool, T | None], Coroutine[Any, Any, Any]] | None = None,
-    event_loop: AbstractEventLoop | None = None,
+def register(
+    kind: str,
+    handler: Handler,
+    callback: Callback | None = None,
+    priority: Priority = Priority.topic,
 ):
-    task = create_task(coro, name=id)
-    task.add_done_callback(_done_callback(id, callback, event_loop))
-    tasks[id] = task
+    """`handler(payload)` does the work, `callback(id, ok, result)` stores it.
+    A job can run more than once after a crash, so callbacks must be idempotent."""
+    kinds[kind] = JobKind(handler, callback, priority)
+
+
+async def add_task(
+    kind: str,
+    payload: dict[str, Any],
+    id: str | None = None,
+    client: str | None = None,
+    _session: AsyncSession | None = None,
+    priority: Priority | None = None,
+):
+    """Queue `kind:id` and commit it together with whatever `_session` holds"""
+    id = f"{kind}:{id or uuid4().__str__()}"
+    if priority is None:
+        priority = kinds[kind].priority
+
+    async def _inner(session: AsyncSession):
+        session.add(
+            Job(id=id, kind=kind, payload=payload, client=client, priority=priority)
+        )
+        await session.commit()
+
+    await create_session_and_run(_inner, _session)
+    inc(f"job.{kind}.queued")
+    wakeup.set()
     return id
 
 
-def _done_callback(
+async def get_job(id: str, _session: AsyncSession | None = None):
+    async def _inner(session: AsyncSession):
+        job = await session.get(Job, id)
+        if not job:
+            raise JobNotFound(id)
+        return job
+
+    return await create_session_and_run(_inner, _session, read=True)
+
+
+async def get_jobs(
+    state: JobState | None = None,
+    kind: str | None = None,
+    limit: int = 100,
+    _session: AsyncSession | None = None,
+):
+    async def _inner(session: AsyncSession):
+        statement = select(Job).order_by(desc(Job.created_at)).limit(limit)
+        if state:
+            statement = statement.where(Job.state == state)
+        if kind:
+            statement = statement.where(Job.kind == kind)
+        return list((await session.execute(statement)).scalars().all())
+
+    return await create_session_and_run(_inner, _session, read=True)
+
+
+async def status(id: str, _session: AsyncSession | None = None):
+    try:
+        return (await get_job(id, _session)).state
+    except JobNotFound:
+        return None
+
+
+async def report_progress(done: int, total: int | None = None):
+    """Record progress of the job this is called from. A job that was cancelled or
+    taken over elsewhere is stopped here, before it starts its next step."""
+    id = current_job.get()
+    if id is None:
+        return
+
+    async def _inner(session: AsyncSession):
+        values: dict[str, Any] = {"progress": done, "updated_at": datetime.now()}
+        if total is not None:
+            values["progress_total"] = total
+        result = await session.execute(
+            update(Job)
+            .where(
+                Job.id == id,  # type: ignore
+                Job.state == JobState.running,  # type: ignore
+                Job.lease_owner == worker_id,  # type: ignore
+            )
+            .values(**values)
+        )
+        await session.commit()
+        return cast(CursorResult, result).rowcount > 0
+
+    if not await create_session_and_run(_inner):
+        task = tasks.get(id)
+        if task:
+            task.cancel()
+
+
+async def cancel(id: str, _session: AsyncSession | None = None):
+    """Stop the job and mark it cancelled. A job running in this process has cleaned
+    up after itself by then, one in another process does so on its next heartbeat."""
+
+    async def _inner(session: AsyncSession):
+        result = await session.execute(
+            update(Job)
+            .where(
+                Job.id == id,  # type: ignore
+                Job.state.in_([JobState.queued, JobState.running]),  # type: ignore
+            )
+            .values(
+                state=JobState.cancelled,
+                finished_at=datetime.now(),
+                updated_at=datetime.now(),
+            )
+        )
+        await session.commit()
+        return cast(CursorResult, result).rowcount > 0
+
+    # Handlers clean up what they have done so far as the cancellation reaches them
+    task = tasks.get(id)
+    if task:
+        task.cancel()
+        await gather(task, return_exceptions=True)
+
+    cancelled = await create_session_and_run(_inner, _session)
+    if not cancelled:
+        return False
+
+    await _notify(id, False, None)
+    return True
+
+
+async def _claim(session: AsyncSession, max_priority: int = Priority.background):
+    now = datetime.now()
+    claimable = (
+        (Job.state == JobState.queued) & (Job.available_at <= now)  # type: ignore
+    ) | (
+        (Job.state == JobState.running) & (Job.lease_expires_at < now)  # type: ignore
+    )
+    # Within a priority, the client with the fewest running jobs goes first
+    running = aliased(Job)
+    client_load = (
+        select(func.count())
+        .where(running.client == Job.client, running.state == JobState.running)
+        .scalar_subquery()
+    )
+    candidate = (
+        select(Job.id)
+        .where(claimable, Job.priority <= max_priority)
+        .order_by(Job.priority, client_load, Job.available_at)
+        .limit(1)
+        .scalar_subquery()
+    )
+    # A single UPDATE, so two workers can never claim the same job
+    result = await session.execute(
+        update(Job)
+        .where(Job.id == candidate, claimable)  # type: ignore
+        .values(
+            state=JobState.running,
+            attempts=Job.attempts + 1,
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=JOB_LEASE_SECONDS),
+            started_at=now,
+            progress=0,
+            updated_at=now,
+        )
+        .returning(Job.id, Job.kind, Job.payload, Job.attempts, Job.priority)
+    )
+    claimed = result.first()
+    await session.commit()
+    return claimed
+
+
+async def _set_state(
     id: str,
-    callback: Callable[[str, bool, T | None], Coroutine[Any, Any, Any]] | None,
-    event_loop: AbstractEventLoop | None,
+    state: JobState,
+    available_at: datetime | None = None,
+    error: str | None = None,
+    attempts: int | None = None,
 ):
-    def _inner(task: Task[T]):
-        if (task.exception()):
-            print("".join(traceback.format_exception(task.exception())))
-            if callback and event_loop:
-                run_coroutine_threadsafe(coro=callback(id, False, None), loop=event_loop)
-            return
-        del tasks[id]
-        if callback and event_loop:
-            try:
-                result = task.result()
-                run_coroutine_threadsafe(
-                    coro=callback(id, True, result), loop=event_loop
+    """Only touch the job while this worker still owns it"""
+
+    async def _inner(session: AsyncSession):
+        values: dict[str, Any] = {
+            "state": state,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": datetime.now(),
+        }
+        if available_at:
+            values["available_at"] = available_at
+        if error is not None:
+            values["error"] = error
+        if attempts is not None:
+            values["attempts"] = attempts
+        if state in (JobState.done, JobState.failed):
+            values["finished_at"] = datetime.now()
+        result = await session.execute(
+            update(Job)
+            .where(
+                Job.id == id,  # type: ignore
+                Job.state == JobState.running,  # type: ignore
+                Job.lease_owner == worker_id,  # type: ignore
+            )
+            .values(**values)
+        )
+        return cast(CursorResult, result).rowcount > 0
+
+    # Committed along with the results stored by callbacks
+    return await write(_inner)
+
+
+async def _heartbeat(id: str, task: Task):
+    while True:
+        await sleep(JOB_LEASE_SECONDS / 3)
+
+        async def _inner(session: AsyncSession):
+            result = await session.execute(
+                update(Job)
+                .where(
+                    Job.id == id,  # type: ignore
+                    Job.state == JobState.running,  # type: ignore
+                    Job.lease_owner == worker_id,  # type: ignore
                 )
-            except Exception:
-                run_coroutine_threadsafe(coro=callback(id, False, None), loop=event_loop)
+                .values(
+                    lease_expires_at=datetime.now() + timedelta(seconds=JOB_LEASE_SECONDS)
+                )
+            )
+            await session.commit()
+            return cast(CursorResult, result).rowcount > 0
 
-    return _inner
+        try:
+            if not await create_session_and_run(_inner):
+                # Cancelled or taken over by another worker
+                task.cancel()
+                return
+        except Exception:
+            print(traceback.format_exc())
 
 
-def status(id: str):
-    task = tasks[id]
-    if not task:
-        return None
-    return task.done()
+async def _notify(id: str, ok: bool, result: Any):
+    kind = kinds.get(id.split(":")[0])
+    if kind is None or kind.callback is None:
+        return
+    await kind.callback(id, ok, result)
 
 
-def cancel(id: str):
-    task = tasks[id]
-    if not task:
-        return None
-    return task.cancel()
+async def _run(
+    id: str, kind_name: str, payload: dict[str, Any], attempts: int, priority: int
+):
+    kind = kinds.get(kind_name)
+    if kind is None:
+        await _set_state(id, JobState.failed, error=f"unknown job kind {kind_name}")
+        return
+    if attempts > JOB_MAX_ATTEMPTS:
+        # Lease kept expiring, most likely the job takes the worker down with it
+        if await _set_state(id, JobState.failed, error="lease expired too many times"):
+            await _notify(id, False, None)
+        return
+
+    # Model slots go to the most urgent waiting request, so long jobs give way to
+    # urgent ones between their upstream calls
+    request_priority.set(priority)
+    current_job.set(id)
+    current_attempt.set(attempts)
+    work = create_task(kind.handler(payload))
+    heartbeat = create_task(_heartbeat(id, work))
+    started = datetime.now()
+    try:
+        result = await work
+    except CancelledError:
+        if stopping.is_set():
+            # Hand the job back untouched so the next worker starts over
+            await _set_state(id, JobState.queued, attempts=attempts - 1)
+        return
+    except Exception as error:
+        print("".join(traceback.format_exception(error)))
+        message = "".join(traceback.format_exception_only(error)).strip()
+        if attempts < JOB_MAX_ATTEMPTS:
+            inc(f"job.{kind_name}.retried")
+            await _set_state(
+                id,
+                JobState.queued,
+                available_at=datetime.now() + timedelta(seconds=2**attempts),
+                error=message,
+            )
+        elif await _set_state(id, JobState.failed, error=message):
+            inc(f"job.{kind_name}.failed")
+            await _notify(id, False, None)
+        return
+    finally:
+        heartbeat.cancel()
+
+    inc(f"job.{kind_name}.seconds", (datetime.now() - started).total_seconds())
+    # Store the result before marking done, a crash in between only repeats the job
+    await _notify(id, True, result)
+    await _set_state(id, JobState.done)
+    inc(f"job.{kind_name}.done")
+
+
+async def _prune(session: AsyncSession):
+    """Forget finished jobs past their retention, or beyond the newest few"""
+    finished = Job.state.in_(  # type: ignore
+        [JobState.done, JobState.failed, JobState.cancelled]
+    )
+    finished_at = func.coalesce(Job.finished_at, Job.updated_at)
+    overflow = (
+        select(Job.id)
+        .where(finished)
+        .order_by(desc(finished_at))
+        .offset(JOB_RETENTION_MAX_ROWS)
+    )
+    result = await session.execute(
+        delete(Job).where(
+            finished,
+            (finished_at < datetime.now() - timedelta(seconds=JOB_RETENTION))
+            | Job.id.in_(overflow),  # type: ignore
+        )
+    )
+    await session.commit()
+    inc("job.pruned", cast(CursorResult, result).rowcount)
+
+
+async def run_worker(concurrency: int = JOB_CONCURRENCY):
+    """Claim and run jobs until `shutdown`, picking up jobs left by dead workers.
+    Bulk and background jobs only get a share of the slots, the rest stay free for
+    interactive and single topic jobs."""
+    slots = Semaphore(concurrency)
+    bulk_slots = max(1, int(concurrency * JOB_BULK_SHARE))
+    pruned_at = 0.0
+    bulk_running: set[str] = set()
+
+    def _release(id: str):
+        tasks.pop(id, None)
+        bulk_running.discard(id)
+        slots.release()
+        gauge("job.running", len(tasks))
+        gauge("job.bulk_running", len(bulk_running))
+
+    while not stopping.is_set():
+        if monotonic() - pruned_at > JOB_PRUNE_INTERVAL:
+            pruned_at = monotonic()
+            try:
+                await create_session_and_run(_prune)
+            except Exception:
+                print(traceback.format_exc())
+
+        await slots.acquire()
+        max_priority = (
+            Priority.background if len(bulk_running) < bulk_slots else Priority.topic
+        )
+        try:
+            claimed = await create_session_and_run(
+                partial(_claim, max_priority=max_priority)
+            )
+        except Exception:
+            print(traceback.format_exc())
+            claimed = None
+
+        if claimed is None:
+            slots.release()
+            try:
+                await wait_for(wakeup.wait(), JOB_POLL_INTERVAL)
+            except TimeoutError:
+                pass
+            wakeup.clear()
+            continue
+
+        id, kind, payload, attempts, priority = claimed
+        task = create_task(_run(id, kind, payload, attempts, priority), name=id)
+        tasks[id] = task
+        if priority >= Priority.bulk:
+            bulk_running.add(id)
+        gauge("job.running", len(tasks))
+        gauge("job.bulk_running", len(bulk_running))
+        task.add_done_callback(lambda _, id=id: _release(id))
 
 
 async def shutdown(timeout: int | None = None):
+    stopping.set()
+    wakeup.set()
     if timeout:
         try:
             async with Timeout(timeout):
                 await gather(*list(tasks.values()), return_exceptions=True)
         except TimeoutError:
-            _cancel_all_task()
-    else:
-        _cancel_all_task()
+            pass
+    await _cancel_all_task()
 
 
-def _cancel_all_task():
-    for _, task in tasks.items():
+async def _cancel_all_task():
+    running = list(tasks.values())
+    for task in running:
         task.cancel()
+    await gather(*running, return_exceptions=True)
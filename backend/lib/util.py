@@ -1,11 +1,20 @@
-from typing import Optional, Type, TypeVar, cast
+import json
+import re
+from base64 import b64decode, urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from typing import Callable, Optional, Type, TypeVar, cast
 
 from sqlmodel import JSON, SQLModel, TypeDecorator
 
-T = TypeVar('T', bound=SQLModel)
+from .exception import InvalidCursor
+
+T = TypeVar("T", bound=SQLModel)
+
 
 class PydanticJSON(TypeDecorator):
     impl = JSON
+    cache_ok = True  # Statements using it can be compiled once and cached
 
     def __init__(self, pydantic_model: Type[T]):
         super().__init__()
@@ -16,39 +25,233 @@ class PydanticJSON(TypeDecorator):
         if value is None:
             return None
         # Use mode='json' to handle nested types like datetime automatically
-        return value.model_dump(mode='json')
+        return value.model_dump(mode="json")
 
     def process_result_value(self, value: Optional[dict], dialect) -> Optional[T]:
         # Database -> Python (Loading)
         if value is None:
             return None
         return cast(T, self.pydantic_model.model_validate(value))
-    
+
+
 class PydanticListJSON(TypeDecorator):
     impl = JSON
+    cache_ok = True
 
     def __init__(self, pydantic_model: Type[T]):
         super().__init__()
         self.pydantic_model = pydantic_model
 
-    def process_bind_param(self, value: Optional[list[T]], dialect) -> Optional[list[dict]]:
+    def process_bind_param(
+        self, value: Optional[list[T]], dialect
+    ) -> Optional[list[dict]]:
         if value is None:
             return None
-        
+
         if not isinstance(value, list):
-            raise TypeError(f"Expected list but got {type(value)}: {value}. PydanticListJSON can only handle lists of SQLModel objects.")
-        
+            raise TypeError(
+                f"Expected list but got {type(value)}: {value}. "
+                + "PydanticListJSON can only handle lists of SQLModel objects."
+            )
+
         result = []
         for i, item in enumerate(value):
-            if hasattr(item, 'model_dump'):
-                result.append(item.model_dump(mode='json'))
+            if hasattr(item, "model_dump"):
+                result.append(item.model_dump(mode="json"))
             elif isinstance(item, dict):
                 result.append(item)
             else:
-                raise TypeError(f"Cannot serialize item {i} of type {type(item)}: {item}. Expected SQLModel with model_dump method.")
+                raise TypeError(
+                    f"Cannot serialize item {i} of type {type(item)}: {item}. "
+                    + "Expected SQLModel with model_dump method."
+                )
         return result
 
-    def process_result_value(self, value: Optional[list[dict]], dialect) -> Optional[list[T]]:
+    def process_result_value(
+        self, value: Optional[list[dict]], dialect
+    ) -> Optional[list[T]]:
         if value is None:
             return None
         return cast(list[T], [self.pydantic_model.model_validate(item) for item in value])
+
+
+class JSONObjectStreamScanner:
+    """
+    Incrementally scans a JSON object that arrives in chunks and reports every
+    top-level field once its value is complete, plus every element of top-level
+    arrays as soon as that element is complete.
+    Anything before the first `{` (e.g. a markdown fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._expecting_key = False
+        self._key: str | None = None
+        self._key_start: int | None = None
+        self._value_start: int | None = None
+        self._item_start: int | None = None
+        self._in_array = False
+
+    def feed(self, chunk: str) -> list[tuple[str, str, bool]]:
+        """Return a list of `(key, raw_json, is_array_item)` completed by `chunk`"""
+        self.buffer += chunk
+        completed: list[tuple[str, str, bool]] = []
+
+        for index in range(self._position, len(self.buffer)):
+            char = self.buffer[index]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(self.buffer[self._key_start : index + 1])
+                        self._key_start = None
+                continue
+
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._expecting_key = True
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._expecting_key:
+                    self._key_start = index
+                else:
+                    self._mark_value_start(index)
+
+            elif char in "{[":
+                self._mark_value_start(index)
+                if self._depth == 1:
+                    self._in_array = char == "["
+                self._depth += 1
+
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._in_array and char == "]":
+                    self._complete_item(index, completed)
+                elif self._depth == 0:
+                    self._complete_field(index, completed)
+
+            elif char == ":" and self._depth == 1:
+                self._expecting_key = False
+
+            elif char == ",":
+                if self._depth == 1:
+                    self._complete_field(index, completed)
+                elif self._depth == 2 and self._in_array:
+                    self._complete_item(index, completed)
+
+            elif not char.isspace():
+                self._mark_value_start(index)
+
+        self._position = len(self.buffer)
+        return completed
+
+    def _mark_value_start(self, index: int):
+        if self._depth == 1 and not self._expecting_key and self._value_start is None:
+            self._value_start = index
+        elif self._depth == 2 and self._in_array and self._item_start is None:
+            self._item_start = index
+
+    def _complete_item(self, index: int, completed: list[tuple[str, str, bool]]):
+        if self._key is not None and self._item_start is not None:
+            completed.append(
+                (self._key, self.buffer[self._item_start : index].strip(), True)
+            )
+        self._item_start = None
+
+    def _complete_field(self, index: int, completed: list[tuple[str, str, bool]]):
+        if self._key is not None and self._value_start is not None:
+            completed.append(
+                (self._key, self.buffer[self._value_start : index].strip(), False)
+            )
+        self._key = None
+        self._value_start = None
+        self._in_array = False
+        self._expecting_key = True
+
+
+DATA_URL_REGEX = re.compile(rb'"data:image\\?/([a-z]+);base64,')
+
+
+class DataURLStreamDecoder:
+    """
+    Scans a JSON document that arrives in chunks for its first base64 image data
+    URL and decodes the image as it streams by. Only the rest of the document is
+    kept, in `document`, with the URL replaced by `replacement(extension)`.
+    """
+
+    def __init__(self, replacement: Callable[[str], str]):
+        self.replacement = replacement
+        self.document = bytearray()
+        self.extension: str | None = None
+        self._pending = b""  # Unscanned tail that may hold part of the URL prefix
+        self._carry = b""  # Base64 characters short of a full 4-character group
+        self._done = False
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Return the image bytes decoded from `chunk`"""
+        if self._done:
+            self.document += chunk
+            return b""
+
+        if self.extension is None:
+            self._pending += chunk
+            match = DATA_URL_REGEX.search(self._pending)
+            if match is None:
+                keep = len(self._pending) - 64
+                if keep > 0:
+                    self.document += self._pending[:keep]
+                    self._pending = self._pending[keep:]
+                return b""
+
+            self.extension = match.group(1).decode()
+            self.document += self._pending[: match.start() + 1]
+            self.document += self.replacement(self.extension).encode()
+            chunk = self._pending[match.end() :]
+            self._pending = b""
+
+        end = chunk.find(b'"')
+        payload = chunk if end == -1 else chunk[:end]
+        # JSON may escape the "/" of the base64 alphabet as "\/"
+        data = self._carry + payload.replace(b"\\", b"")
+        if end == -1:
+            size = len(data) - len(data) % 4
+            self._carry = data[size:]
+            return b64decode(data[:size])
+
+        self._done = True
+        self._carry = b""
+        self.document += chunk[end:]
+        return b64decode(data + b"=" * (-len(data) % 4))
+
+    def close(self):
+        """Flush what was held back, when the document had no data URL"""
+        if self.extension is None:
+            self.document += self._pending
+            self._pending = b""
+
+
+def encode_cursor(created_at: datetime, id: str):
+    """Opaque position of a row in a newest first list"""
+    raw = json.dumps([created_at.isoformat(), id]).encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(id)
+    except (BinasciiError, UnicodeDecodeError, ValueError, TypeError) as error:
+        raise InvalidCursor(cursor) from error
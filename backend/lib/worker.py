@@ -0,0 +1,45 @@
+"""Run queued jobs outside the API: `python -m lib.worker [--concurrency N]`
+
+Start it from the backend directory, next to the API, with the same env.
+Any number of workers can share one database, each claims its own jobs."""
+
+import signal
+from argparse import ArgumentParser
+from asyncio import Event, create_task, get_running_loop, run
+
+from .ai import init as ai_init, run_probe
+from .db import init as db_init
+from .engine import dispose
+from .env import JOB_CONCURRENCY
+from .task import run_worker, shutdown, worker_id
+from .writer import run_writer, stop_writer
+
+
+async def main(concurrency: int):
+    ai_init()
+    await db_init()
+
+    stop = Event()
+    loop = get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"worker {worker_id} running {concurrency} jobs at a time")
+    writer = create_task(run_writer())
+    worker = create_task(run_worker(concurrency))
+    probe = create_task(run_probe())
+    await stop.wait()
+
+    print(f"worker {worker_id} shutting down")
+    await shutdown(10)
+    worker.cancel()
+    probe.cancel()
+    await stop_writer()
+    writer.cancel()
+    await dispose()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Run queued topic and review jobs")
+    parser.add_argument("--concurrency", type=int, default=JOB_CONCURRENCY)
+    run(main(parser.parse_args().concurrency))
@@ -0,0 +1,168 @@
+"""
+One writer per process for job results. Callbacks hand their statements over a
+queue instead of each taking the write lock for a transaction of its own, the
+writer runs whatever has piled up in one transaction and commits it once. Runs
+of the same statement go to the database together as one executemany.
+"""
+
+from asyncio import Event, Future, Queue, get_running_loop, wait_for
+from time import monotonic
+from traceback import format_exc
+from typing import Any, Awaitable, Callable, NamedTuple, cast
+
+from sqlalchemy import Executable
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .engine import create_session_and_run
+from .env import WRITER_BATCH_SIZE, WRITER_WINDOW
+from .metrics import gauge, inc
+
+Apply = Callable[[AsyncSession], Awaitable[Any]]
+
+
+class Write(NamedTuple):
+    apply: Apply | None
+    statement: Executable | None  # With `parameters`, when there's no `apply`
+    parameters: dict[str, Any]
+    done: Future
+
+
+queue: Queue[Write | None] = Queue()
+running = False
+stopped = Event()
+
+
+async def write(apply: Apply):
+    """Run `apply(session)` in the writer's next transaction and return its result
+    once that is committed. `apply` must not commit, and may run a second time on
+    its own when another write of its batch fails."""
+    if not running:
+
+        async def _inner(session: AsyncSession):
+            result = await apply(session)
+            await session.commit()
+            return result
+
+        return await create_session_and_run(_inner)
+
+    return await _queue(Write(apply, None, {}, get_running_loop().create_future()))
+
+
+async def execute(statement: Executable, parameters: dict[str, Any]):
+    """Run `statement` with `parameters` in the writer's next transaction, along
+    with the other runs of the same statement object with the same keys, and
+    return once that is committed. Writes of one batch run in no set order."""
+    if not running:
+
+        async def _inner(session: AsyncSession):
+            await session.execute(statement, parameters)
+            await session.commit()
+
+        return await create_session_and_run(_inner)
+
+    await _queue(Write(None, statement, parameters, get_running_loop().create_future()))
+
+
+async def _queue(item: Write):
+    queue.put_nowait(item)
+    gauge("writer.queued", queue.qsize())
+    return await item.done
+
+
+async def _commit(batch: list[Write]):
+    async def _inner(session: AsyncSession):
+        results = []
+        runs: dict[tuple[int, frozenset[str]], list[Write]] = {}
+        for item in batch:
+            if item.apply:
+                results.append(await item.apply(session))
+                continue
+            results.append(None)
+            key = (id(item.statement), frozenset(item.parameters))
+            runs.setdefault(key, []).append(item)
+
+        for run in runs.values():
+            await session.execute(
+                cast(Executable, run[0].statement), [item.parameters for item in run]
+            )
+        await session.commit()
+        return results
+
+    try:
+        results = await create_session_and_run(_inner)
+    except Exception as error:
+        if len(batch) > 1:
+            # Find the write that broke it, the others still go in
+            inc("writer.split")
+            for item in batch:
+                await _commit([item])
+            return
+        print(format_exc())
+        inc("writer.failed")
+        if not batch[0].done.done():
+            batch[0].done.set_exception(error)
+        return
+
+    inc("writer.commits")
+    inc("writer.writes", len(batch))
+    gauge("writer.batch_size", len(batch))
+    for item, result in zip(batch, results):
+        # Skip callers that stopped waiting, their write is in anyway
+        if not item.done.done():
+            item.done.set_result(result)
+
+
+async def run_writer():
+    """Commit queued writes in batches of up to `WRITER_BATCH_SIZE`, waiting at most
+    `WRITER_WINDOW` after the first one for others to join it, until `stop_writer`"""
+    global running
+    running = True
+    stopped.clear()
+    batch: list[Write] = []
+    try:
+        while True:
+            first = await queue.get()
+            if first is None:
+                return
+            batch = [first]
+            closing = False
+            deadline = monotonic() + WRITER_WINDOW
+            while len(batch) < WRITER_BATCH_SIZE:
+                if queue.empty():
+                    timeout = deadline - monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await wait_for(queue.get(), timeout)
+                    except TimeoutError:
+                        break
+                else:
+                    item = queue.get_nowait()
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+
+            await _commit(batch)
+            if closing:
+                return
+    finally:
+        running = False
+        # Only left behind when the writer was cancelled
+        while not queue.empty():
+            item = queue.get_nowait()
+            if item is not None:
+                batch.append(item)
+        for item in batch:
+            if not item.done.done():
+                item.done.cancel()
+        stopped.set()
+
+
+async def stop_writer():
+    """Commit what is queued and stop the writer, later writes commit on their own"""
+    global running
+    if running:
+        running = False
+        queue.put_nowait(None)
+        await stopped.wait()
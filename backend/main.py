@@ -1,4 +1,5 @@
 import os
+from asyncio import create_task
 from contextlib import asynccontextmanager
 
 from fastapi import APIRouter, FastAPI, HTTPException
@@ -6,18 +7,46 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
-from lib.ai import init as ai_init
-from lib.db import init as db_init
-from lib.task import shutdown
-from route import review_route, statics_route, submission_route, topic_route
+from lib.ai import init as ai_init, run_probe
+from lib.db import (
+    IMAGE_DIRECTORY,
+    init as db_init,
+    run_status_watcher,
+    run_topic_pool,
+)
+from lib.engine import dispose
+from lib.env import EMBEDDED_WORKER
+from lib.task import run_worker, shutdown
+from lib.writer import run_writer, stop_writer
+from route import (
+    job_route,
+    metrics_route,
+    review_route,
+    statics_route,
+    submission_route,
+    topic_route,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     ai_init()
     await db_init()
+    writer = create_task(run_writer())
+    topic_pool = create_task(run_topic_pool())
+    status_watcher = create_task(run_status_watcher())
+    probe = create_task(run_probe())
+    worker = create_task(run_worker()) if EMBEDDED_WORKER else None
     yield
-    await shutdown(10)
+    topic_pool.cancel()
+    status_watcher.cancel()
+    probe.cancel()
+    if worker:
+        await shutdown(10)
+        worker.cancel()
+    await stop_writer()
+    writer.cancel()
+    await dispose()
 
 
 app = FastAPI(
@@ -27,14 +56,16 @@ app = FastAPI(
 )
 
 api_router = APIRouter()
+api_router.include_router(job_route)
+api_router.include_router(metrics_route)
 api_router.include_router(review_route)
 api_router.include_router(statics_route)
 api_router.include_router(submission_route)
 api_router.include_router(topic_route)
 
-if not os.path.exists("data/image"):
-    os.mkdir("data/image")
-app.mount("/file", StaticFiles(directory="data/image"))
+if not os.path.exists(IMAGE_DIRECTORY):
+    os.mkdir(IMAGE_DIRECTORY)
+app.mount("/file", StaticFiles(directory=IMAGE_DIRECTORY))
 
 ENV = os.getenv("ENV", "DEV")
 if ENV == "PROD":
@@ -1,11 +1,15 @@
+from .job import route as job_route
+from .metrics import route as metrics_route
 from .review import route as review_route
 from .statistics import route as statics_route
 from .submission import route as submission_route
 from .topic import route as topic_route
 
 __all__ = [
+    "job_route",
+    "metrics_route",
     "review_route",
     "statics_route",
     "submission_route",
-    "topic_route"
+    "topic_route",
 ]
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Query
+
+from lib.response import exception_handler
+from lib.task import JobState, cancel, get_job, get_jobs
+
+route = APIRouter(
+    prefix="/job",
+    tags=["job"],
+)
+
+
+@route.get("s", description="Get the latest jobs, newest first")
+@exception_handler
+async def api_get_jobs(
+    state: JobState | None = None,
+    kind: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    return await get_jobs(state, kind, limit)
+
+
+@route.get("", description="Get a single job")
+@exception_handler
+async def api_get_job(id: str):
+    return await get_job(id)
+
+
+@route.delete("", description="Cancel a queued or running job, return the job")
+@exception_handler
+async def api_cancel_job(id: str):
+    await cancel(id)
+    return await get_job(id)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+
+from lib.metrics import snapshot
+
+route = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+)
+
+
+@route.get("", description="Get in-process counters and gauges")
+async def api_get_metrics():
+    return snapshot()
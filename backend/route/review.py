@@ -1,7 +1,17 @@
-from fastapi import APIRouter
+from asyncio import Queue
 
-from lib.db import get_review, get_review_of_submission, get_reviews, review
-from lib.response import exception_handler
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+
+from lib.ai import ReviewStreamEvent
+from lib.db import (
+    get_review,
+    get_review_of_submission,
+    list_reviews,
+    review,
+    watch_review,
+)
+from lib.response import exception_handler, format_sse
 
 route = APIRouter(
     prefix="/review",
@@ -9,9 +19,13 @@ route = APIRouter(
 )
 
 
-@route.get("s", description="Get all reviews")
-async def api_get_reviews():
-    return await get_reviews()
+@route.get("s", description="Get a page of reviews, newest first")
+@exception_handler
+async def api_get_reviews(
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    return await list_reviews(cursor, limit)
 
 
 @route.get("", description="Get a single review")
@@ -19,12 +33,51 @@ async def api_get_reviews():
 async def api_get_review(id: str):
     return await get_review(id)
 
+
+@route.get(
+    "/events",
+    description="Server-Sent Events of the review now and once it is done or failed",
+)
+@exception_handler
+async def api_review_events(id: str):
+    events = await watch_review(id)
+
+    async def _stream():
+        async for message in events:
+            yield format_sse(message.event, message.data)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream")
+
+
 @route.get("/of", description="Get review of a Submission")
 @exception_handler
 async def api_get_review_of_submission(submission_id: str):
     return await get_review_of_submission(submission_id)
 
+
 @route.post("", description="Request a review, return review id")
 @exception_handler
-async def api_review(submission_id: str):
-    return (await review(submission_id))[1]
+async def api_review(request: Request, submission_id: str):
+    client = request.client.host if request.client else None
+    return (await review(submission_id, client=client))[1]
+
+
+@route.post(
+    "/stream",
+    description="Request a review and receive it as Server-Sent Events",
+)
+@exception_handler
+async def api_stream_review(request: Request, submission_id: str):
+    client = request.client.host if request.client else None
+    events: Queue[ReviewStreamEvent] = Queue()
+    _, id = await review(submission_id, on_event=events.put_nowait, client=client)
+
+    async def _stream():
+        yield format_sse("review", id)
+        while True:
+            event = await events.get()
+            yield format_sse(event.event, event.data)
+            if event.event in ("done", "failed"):
+                break
+
+    return StreamingResponse(_stream(), media_type="text/event-stream")
@@ -1,10 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from pydantic import BaseModel
 
 from lib.db import (
     delete_submission,
     get_submission,
-    get_submissions,
+    list_submissions,
     submit,
     update_submission,
 )
@@ -20,9 +20,13 @@ class SubmitBody(BaseModel):
     submission: str
 
 
-@route.get("s", description="Get all submissions")
-async def api_get_submissions():
-    return await get_submissions()
+@route.get("s", description="Get a page of submissions, newest first")
+@exception_handler
+async def api_get_submissions(
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    return await list_submissions(cursor, limit)
 
 
 @route.get("", description="Get a single submission")
@@ -36,6 +40,7 @@ async def api_get_submission(id: str):
 async def api_submit(topic_id: str, body: SubmitBody):
     return await submit(topic_id=topic_id, submitted_text=body.submission)
 
+
 @route.put("", description="Update a submission")
 @exception_handler
 async def api_update_submission(id: str, body: SubmitBody):
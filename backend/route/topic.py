@@ -1,9 +1,11 @@
 from typing import Literal
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
 
-from lib.db import create_topic, delete_topic, get_topic, get_topics
-from lib.response import exception_handler
+from lib.db import create_topic, delete_topic, get_topic, list_topics, watch_topic
+from lib.env import P1_MAX_COUNT
+from lib.response import exception_handler, format_sse
 
 route = APIRouter(
     prefix="/topic",
@@ -11,9 +13,13 @@ route = APIRouter(
 )
 
 
-@route.get("s", description="Get all topics")
-async def api_get_topics():
-    return await get_topics()
+@route.get("s", description="Get a page of topics, newest first")
+@exception_handler
+async def api_get_topics(
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    return await list_topics(cursor, limit)
 
 
 @route.get("", description="Get a single topic")
@@ -22,10 +28,31 @@ async def api_get_topic(id: str):
     return await get_topic(id)
 
 
+@route.get(
+    "/events",
+    description="Server-Sent Events of the topic now and once it is done or failed",
+)
+@exception_handler
+async def api_topic_events(id: str):
+    events = await watch_topic(id)
+
+    async def _stream():
+        async for message in events:
+            yield format_sse(message.event, message.data)
+
+    return StreamingResponse(_stream(), media_type="text/event-stream")
+
+
 @route.post("", description="Request a topic")
 @exception_handler
-async def api_create_topic(part: Literal["1", "2", "3"], p1_count: int = 5):
-    return await create_topic(part=part, p1_count=p1_count)
+async def api_create_topic(
+    request: Request,
+    part: Literal["1", "2", "3"],
+    p1_count: int = Query(5, ge=1, le=P1_MAX_COUNT),
+):
+    client = request.client.host if request.client else None
+    return await create_topic(part=part, p1_count=p1_count, client=client)
+
 
 @route.delete("", description="Delete a topic")
 @exception_handler
@@ -0,0 +1,61 @@
+"""Run from the backend directory: `python -m unittest discover tests`"""
+
+import os
+import unittest
+from asyncio import Event, create_task, sleep
+from tempfile import TemporaryDirectory
+
+directory = TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory.name}/test.sqlite"
+os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+
+from lib import admission, db  # noqa: E402
+from lib.admission import Admission  # noqa: E402
+from lib.engine import dispose  # noqa: E402
+from lib.exception import Overloaded  # noqa: E402
+
+
+async def _hold(gate: Admission, admitted: Event, release: Event):
+    async with gate.admit("client"):
+        admitted.set()
+        await release.wait()
+
+
+class AdmissionTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await db.init()
+        self.queue_size = admission.ADMISSION_QUEUE_SIZE
+        admission.ADMISSION_QUEUE_SIZE = 1
+
+    async def asyncTearDown(self):
+        admission.ADMISSION_QUEUE_SIZE = self.queue_size
+        await dispose()
+
+    async def test_queue_counts_every_waiting_request(self):
+        # No job of this kind is ever queued, only admitted requests take the slot
+        gate = Admission("test", ["test"], limit=1, client_limit=0)
+        first, second = Event(), Event()
+        release = Event()
+        holding = create_task(_hold(gate, first, release))
+        await first.wait()
+
+        waiting = create_task(_hold(gate, second, release))
+        for _ in range(100):
+            if gate.waiting:
+                break
+            await sleep(0.01)
+        self.assertEqual(gate.waiting, 1)
+        self.assertFalse(second.is_set())
+        with self.assertRaises(Overloaded):
+            async with gate.admit():
+                pass
+
+        release.set()
+        await holding
+        await second.wait()
+        await waiting
+        self.assertEqual((gate.waiting, gate.reserved), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+"""Run from the backend directory: `python -m unittest discover tests`"""
+
+import json
+import os
+import unittest
+from asyncio import sleep
+from contextlib import asynccontextmanager
+from tempfile import TemporaryDirectory
+
+from pydantic import BaseModel
+
+directory = TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory.name}/test.sqlite"
+os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+
+from lib import ai  # noqa: E402
+from lib.ai import BaseRequest  # noqa: E402
+
+request = BaseRequest(model="primary", messages=[])
+
+
+def _parse(content: str):
+    return None, ValueError(content)
+
+
+async def _complete(role, request: BaseRequest, metric, latency=None):
+    if request.model == "primary":
+        await sleep(0.05)
+        return "primary"
+    if request.model == "broken":
+        await sleep(0.1)  # After the primary answered
+        raise ConnectionError()
+    return "fallback"
+
+
+class _Answer(BaseModel):
+    answer: str
+
+
+def _repair_times_out():
+    metrics: list[str] = []
+
+    async def _complete(role, request: BaseRequest, metric, latency=None):
+        metrics.append(metric)
+        if metric.endswith("repair_request"):
+            raise TimeoutError("review model kept timing out")
+        if len(metrics) == 1:
+            return "not json"
+        return '{"answer": "ok"}'
+
+    return _complete, metrics
+
+
+class _Content:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, size: int):
+        for start in range(0, len(self.body), size):
+            yield self.body[start : start + size]
+
+
+class _Response:
+    def __init__(self, body: bytes):
+        self.content = _Content(body)
+
+
+class _Usage:
+    tokens = 0
+
+
+def _replying(message: dict):
+    body = json.dumps(
+        {
+            "id": "id",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "artist",
+            "choices": [{"index": 0, "message": message}],
+        }
+    ).encode()
+
+    @asynccontextmanager
+    async def _open(role, request):
+        yield _Response(body), _Usage()
+
+    return _open
+
+
+class ImageTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.open = ai._open
+
+    def tearDown(self):
+        ai._open = self.open
+
+    async def test_data_url_outside_images(self):
+        url = "data:image/png;base64,iVBORw0KGgo="
+        ai._open = _replying({"role": "assistant", "content": url})
+        with TemporaryDirectory() as directory:
+            self.assertIsNone(await ai.generate_image("a cat", directory))
+            self.assertEqual(os.listdir(directory), [])
+
+
+class HedgeTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.complete, self.hedge_delay = ai._complete, ai._hedge_delay
+        ai._complete = _complete
+
+    def tearDown(self):
+        ai._complete, ai._hedge_delay = self.complete, self.hedge_delay
+        ai.fallback_models["review"] = None
+
+    def test_needs_fallback(self):
+        self.assertIsNone(ai._hedge_delay("review"))
+        ai.fallback_models["review"] = "fallback"
+        self.assertIsNotNone(ai._hedge_delay("review"))
+
+    async def test_first_parse_error(self):
+        ai.fallback_models["review"] = "fallback"
+        ai._hedge_delay = lambda role: 0.01
+        content, result, error = await ai._hedged("review", request, _parse, "test")
+        self.assertIsNone(result)
+        self.assertEqual((content, str(error)), ("fallback", "fallback"))
+
+    async def test_failed_duplicate(self):
+        ai.fallback_models["review"] = "broken"
+        ai._hedge_delay = lambda role: 0.01
+        content, result, error = await ai._hedged("review", request, _parse, "test")
+        self.assertEqual((content, str(error)), ("primary", "primary"))
+
+
+class GenerateTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.complete, self.random = ai._complete, ai.random
+        ai.random = lambda: 0
+
+    def tearDown(self):
+        ai._complete, ai.random = self.complete, self.random
+
+    async def test_failed_repair_request(self):
+        ai._complete, metrics = _repair_times_out()
+        result = await ai._generate("review", request, _Answer)
+        self.assertEqual(result, _Answer(answer="ok"))
+        self.assertEqual(
+            metrics,
+            [
+                "json_repair._Answer.generation",
+                "json_repair._Answer.repair_request",
+                "json_repair._Answer.generation",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,204 @@
+"""Run from the backend directory: `python -m unittest discover tests`"""
+
+import os
+import re
+import sqlite3
+import unittest
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+from typing import Any, Awaitable, Callable
+
+directory = TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory.name}/test.sqlite"
+os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+
+from sqlalchemy import delete, event  # noqa: E402
+
+from lib import db, task  # noqa: E402
+from lib.ai import ReviewResponse  # noqa: E402
+from lib.engine import dispose, engine, read_engine  # noqa: E402
+
+ROWS = 200
+# Tables that stay a few rows long, scanning them is fine
+SMALL_TABLES = {"topic_pool"}
+# Calls that sort by something computed per row. `_claim` weighs the client load
+# of the claimable jobs only, which admission keeps few.
+SORTED_CALLS = {"_claim"}
+
+SCAN_REGEX = re.compile(r"^SCAN (\w+)\b(?! USING (?:COVERING )?INDEX)")
+SORT_REGEX = re.compile(r"USE TEMP B-TREE FOR (?:RIGHT PART OF )?ORDER BY")
+
+response = ReviewResponse.model_validate(
+    {
+        "score_range": [140, 160],
+        "level_achieved": 7,
+        "overall_feedback": "Clear and well organized.",
+        "summary_feedback": "Good.",
+        "detail_score": {
+            "grammar": 4,
+            "vocabulary": 4,
+            "organization": 4,
+            "task_fulfillment": 4,
+        },
+        "annotations": [],
+        "improvement_suggestions": [],
+    }
+)
+
+
+def _problems(name: str, plan: list[str]):
+    problems = []
+    for detail in plan:
+        match = SCAN_REGEX.match(detail)
+        if match and match.group(1) not in SMALL_TABLES:
+            problems.append(f"full scan of {match.group(1)}")
+        if SORT_REGEX.search(detail) and name not in SORTED_CALLS:
+            problems.append("sorted without an index")
+    return problems
+
+
+def _explain(path: str, statement: str, parameters: Any):
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    depth = {0: -1}
+    plan = []
+    for id, parent, _, detail in rows:
+        depth[id] = depth.get(parent, -1) + 1
+        plan.append("  " * depth[id] + detail)
+    return plan
+
+
+class PlanTest(unittest.IsolatedAsyncioTestCase):
+    """Calls the read paths of `lib.db` and runs `EXPLAIN QUERY PLAN` on every
+    statement they send, a query that lost its index fails here before it ships"""
+
+    async def asyncSetUp(self):
+        await db.init()
+        self.low_watermark = db.TOPIC_POOL_LOW_WATERMARK
+        db.TOPIC_POOL_LOW_WATERMARK = 0
+        self.jobs: list[str] = []
+        self.topic, self.submission, self.review = await db.create_session_and_run(
+            self._seed
+        )
+
+    async def asyncTearDown(self):
+        db.TOPIC_POOL_LOW_WATERMARK = self.low_watermark
+
+        # Queued jobs that no worker of the other tests should pick up
+        async def _inner(session):
+            await session.execute(delete(task.Job).where(task.Job.id.in_(self.jobs)))  # type: ignore
+            await session.commit()
+
+        await db.create_session_and_run(_inner)
+        await dispose()
+
+    async def _seed(self, session):
+        # Oldest first, so the newest rows are the ones a first page returns
+        started_at = datetime.now() - timedelta(days=1)
+        for index in range(ROWS):
+            created_at = started_at + timedelta(seconds=index)
+            topic = db.Topic(
+                status=db.Status.done if index % 10 else db.Status.failed,
+                part=db.TopicPart.II if index % 2 else db.TopicPart.III,
+                question="Do you agree?",
+                created_at=created_at,
+            )
+            submission = db.Submission(
+                topic_id=topic.id, submission="I agree.", created_at=created_at
+            )
+            review = db.Review(
+                topic_id=topic.id,
+                submission_id=submission.id,
+                status=db.Status.done,
+                score_range=response.score_range,
+                level_achieved=response.level_achieved,
+                created_at=created_at,
+            )
+            job = task.Job(
+                id=f"review:{review.id}",
+                kind="review",
+                client=f"10.0.0.{index % 50}",
+                priority=task.Priority.interactive,
+                state=task.JobState.done if index % 10 else task.JobState.queued,
+                created_at=created_at,
+                available_at=created_at,
+            )
+            self.jobs.append(job.id)
+            session.add_all([topic, submission, review, job])
+        session.add(db.TopicPool(topic_id=topic.id, part=topic.part))
+        await session.commit()
+        return topic, submission, review
+
+    async def _statements(self):
+        topic, submission, review = self.topic, self.submission, self.review
+        label = ""
+        statements: list[tuple[str, str, Any]] = []
+
+        def _capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                statements.append((label, statement, parameters))
+
+        calls: list[tuple[str, Callable[[], Awaitable[Any]]]] = [
+            ("list_topics", lambda: db.list_topics()),
+            ("list_topics all", lambda: db.list_topics(all=True)),
+            ("get_topic", lambda: db.get_topic(topic.id)),
+            ("list_submissions", lambda: db.list_submissions()),
+            ("get_submission", lambda: db.get_submission(submission.id)),
+            ("list_reviews", lambda: db.list_reviews()),
+            ("get_review", lambda: db.get_review(review.id)),
+            (
+                "get_review_of_submission",
+                lambda: db.get_review_of_submission(submission.id),
+            ),
+            ("_get_cached_review", lambda: db._get_cached_review("missing")),
+            ("statistics", lambda: db.statistics()),
+            ("_cache_review", lambda: db._cache_review("plan", response)),
+            (
+                "_fill_topic_pool",
+                lambda: db.create_session_and_run(
+                    lambda session: db._fill_topic_pool(topic.part, session)
+                ),
+            ),
+            ("_claim", lambda: db.create_session_and_run(task._claim)),
+            (
+                "_claim_pooled_topic",
+                lambda: db.create_session_and_run(
+                    lambda session: db._claim_pooled_topic(topic.part, session)
+                ),
+            ),
+        ]
+        sync_engines = (engine.sync_engine, read_engine.sync_engine)
+        for sync_engine in sync_engines:
+            event.listen(sync_engine, "before_cursor_execute", _capture)
+        try:
+            for name, call in calls:
+                label = name
+                result = await call()
+                # The next page too, it seeks past the cursor instead of starting over
+                if isinstance(result, db.Page) and result.next_cursor:
+                    label = f"{name} next page"
+                    if name == "list_topics all":
+                        await db.list_topics(cursor=result.next_cursor, all=True)
+                    else:
+                        await getattr(db, name)(cursor=result.next_cursor)
+        finally:
+            for sync_engine in sync_engines:
+                event.remove(sync_engine, "before_cursor_execute", _capture)
+        return statements
+
+    async def test_indexes_are_used(self):
+        statements = await self._statements()
+        self.assertTrue(statements)
+
+        failures = []
+        for name, statement, parameters in statements:
+            plan = _explain(str(engine.url.database), statement, parameters)
+            problems = _problems(name, plan)
+            if problems:
+                lines = [f"{name}: {' '.join(statement.split())}", *plan, *problems]
+                failures.append("\n    ".join(lines))
+        self.assertEqual(failures, [], "\n".join(failures))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+"""Run from the backend directory: `python -m unittest discover tests`"""
+
+import os
+import unittest
+from tempfile import TemporaryDirectory
+
+directory = TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory.name}/test.sqlite"
+os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+
+from lib import db  # noqa: E402
+from lib.ai import DetailScore, ReviewOutcome, ReviewResponse  # noqa: E402
+from lib.engine import dispose  # noqa: E402
+from lib.task import current_attempt  # noqa: E402
+
+response = ReviewResponse(
+    score_range=(5, 6),
+    level_achieved=5,
+    overall_feedback="Good",
+    summary_feedback="Good",
+    detail_score=DetailScore(grammar=5, vocabulary=5, organization=5, task_fulfillment=5),
+    annotations=[],
+    improvement_suggestions=[],
+)
+
+
+def _payload(review_id: str, cache_key: str):
+    return {
+        "review_id": review_id,
+        "part": db.TopicPart.III,
+        "topic": "?",
+        "submission": "Hi",
+        "cache_key": cache_key,
+    }
+
+
+async def _unreachable(**_):
+    raise AssertionError("the model was called")
+
+
+async def _upstream_down(**_):
+    raise ConnectionError()
+
+
+async def _cascade(**_):
+    return ReviewOutcome(response=response, path="premium")
+
+
+class ReviewJobTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await db.init()
+        self.stream, self.cascade = db.ai_review_stream, db.ai_review_cascade
+
+    async def asyncTearDown(self):
+        db.ai_review_stream, db.ai_review_cascade = self.stream, self.cascade
+        await dispose()
+
+    async def test_cache_hit(self):
+        db.review_cache.set("hit", response)
+        db.ai_review_cascade = _unreachable
+        outcome = await db._review_job(_payload("cached", "hit"))
+        self.assertEqual(outcome.path, "cached")
+        self.assertIs(outcome.response, response)
+
+    async def test_stream_retried(self):
+        events = []
+        db.review_listeners["retried"] = events.append
+        db.ai_review_stream = _upstream_down
+        with self.assertRaises(ConnectionError):
+            await db._review_job(_payload("retried", "miss"))
+        self.assertEqual(events, [])  # A retry can still succeed
+
+        db.ai_review_cascade = _cascade
+        current_attempt.set(2)
+        await db._review_job(_payload("retried", "miss"))
+        self.assertEqual([event.event for event in events], ["done"])
+        self.assertNotIn("retried", db.review_listeners)
+
+    async def test_cache_hit_on_request(self):
+        text = "Working from home is good. I think i like it, it saves the the time."
+
+        async def _inner(session):
+            topic = db.Topic(status=db.Status.done, part=db.TopicPart.III, question="?")
+            submission = db.Submission(topic_id=topic.id, submission=text)
+            session.add_all([topic, submission])
+            await session.commit()
+            return submission.id
+
+        submission_id = await db.create_session_and_run(_inner)
+        db.review_cache.set(db.review_cache_key("3", "?", text), response)
+        events = []
+        _, id = await db.review(submission_id, on_event=events.append)
+
+        [event] = events
+        self.assertEqual(event.event, "done")
+        self.assertEqual(len(event.data.annotations), 2)  # Found by the analysis
+        stored = await db.get_review(id)
+        self.assertEqual(event.data.annotations, stored.annotations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Run from the backend directory: `python -m unittest discover tests`"""
+
+import os
+import unittest
+from contextlib import asynccontextmanager
+from datetime import datetime
+from tempfile import TemporaryDirectory
+
+directory = TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory.name}/test.sqlite"
+os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from lib import db  # noqa: E402
+from lib.engine import dispose  # noqa: E402
+from route import submission_route, topic_route  # noqa: E402
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.init()
+    yield
+    await dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(submission_route)
+app.include_router(topic_route)
+
+
+async def _add_topic():
+    async def _inner(session):
+        topic = db.Topic(status=db.Status.done, part=db.TopicPart.III, question="?")
+        session.add(topic)
+        await session.commit()
+        return topic.id
+
+    return await db.create_session_and_run(_inner)
+
+
+class SubmissionTest(unittest.TestCase):
+    def test_created_at(self):
+        with TestClient(app) as client:
+            topic_id = client.portal.call(_add_topic)  # type: ignore
+
+            response = client.post(
+                "/submission", params={"topic_id": topic_id}, json={"submission": "Hi"}
+            )
+            self.assertEqual(response.status_code, 200)
+            submitted = response.json()
+            datetime.fromisoformat(submitted["created_at"])
+
+            response = client.get("/submission", params={"id": submitted["id"]})
+            self.assertEqual(response.json()["created_at"], submitted["created_at"])
+
+            response = client.get("/topic", params={"id": topic_id})
+            [listed] = response.json()["submissions"]
+            self.assertEqual(listed["created_at"], submitted["created_at"])
+
+            response = client.get("/submissions")
+            [listed] = [
+                item for item in response.json()["items"] if item["id"] == submitted["id"]
+            ]
+            self.assertEqual(listed["created_at"], submitted["created_at"])
+
+
+if __name__ == "__main__":
+    unittest.main()
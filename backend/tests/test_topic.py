@@ -0,0 +1,101 @@
+"""Run from the backend directory: `python -m unittest discover tests`"""
+
+import os
+import unittest
+from asyncio import create_task, sleep
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+directory = TemporaryDirectory()
+os.environ["DB_URL"] = f"sqlite+aiosqlite:///{directory.name}/test.sqlite"
+os.environ.setdefault("OPENROUTER_API_KEY", "unused")
+
+from lib import db, task  # noqa: E402
+from lib.ai import P1Response  # noqa: E402
+from lib.engine import dispose  # noqa: E402
+
+
+async def _prompts(count: int):
+    return [
+        P1Response(artist_prompt=str(index), keywords=("a", "b"))
+        for index in range(count)
+    ]
+
+
+async def _image(prompt: str, directory: str):
+    """Only the first two pictures are drawn"""
+    if int(prompt) >= 2:
+        raise RuntimeError("can't draw")
+    file = f"{uuid4()}.png"
+    with open(f"{directory}/{file}", "wb"):
+        pass
+    return file
+
+
+async def _slow_image(prompt: str, directory: str):
+    """The first two pictures are drawn, the others take a minute"""
+    if int(prompt) >= 2:
+        await sleep(60)
+    return await _image(prompt, directory)
+
+
+class TopicP1Test(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.images = TemporaryDirectory()
+        self.patched = db.generate_topics_p1, db.generate_image, db.IMAGE_DIRECTORY
+        db.generate_topics_p1, db.generate_image = _prompts, _image
+        db.IMAGE_DIRECTORY = self.images.name
+
+    async def asyncTearDown(self):
+        db.generate_topics_p1, db.generate_image, db.IMAGE_DIRECTORY = self.patched
+        self.images.cleanup()
+
+    async def test_failed_job_removes_pictures(self):
+        # Two of five is short of the success ratio
+        with self.assertRaises(RuntimeError):
+            await db._create_topic_p1(count=5)
+        self.assertEqual(os.listdir(self.images.name), [])
+
+    async def test_cancelled_job_removes_pictures(self):
+        db.generate_image = _slow_image
+        job = create_task(db._create_topic_p1(count=5))
+        while len(os.listdir(self.images.name)) < 2:
+            await sleep(0.01)
+        job.cancel()
+        with self.assertRaises(BaseException):
+            await job
+        self.assertEqual(os.listdir(self.images.name), [])
+
+
+class CancelJobTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        await db.init()
+        self.images = TemporaryDirectory()
+        self.patched = db.generate_topics_p1, db.generate_image, db.IMAGE_DIRECTORY
+        db.generate_topics_p1, db.generate_image = _prompts, _slow_image
+        db.IMAGE_DIRECTORY = self.images.name
+        self.worker = create_task(task.run_worker())
+
+    async def asyncTearDown(self):
+        await task.shutdown()
+        await self.worker
+        task.stopping.clear()
+        db.generate_topics_p1, db.generate_image, db.IMAGE_DIRECTORY = self.patched
+        self.images.cleanup()
+        await dispose()
+
+    async def test_cancel_topic_p1(self):
+        topic = await db.create_topic("1", p1_count=4)
+        task.wakeup.set()
+        while len(os.listdir(self.images.name)) < 2:
+            await sleep(0.01)
+
+        self.assertTrue(await task.cancel(f"topic_1:{topic.id}"))
+        self.assertEqual(os.listdir(self.images.name), [])
+        job = await task.get_job(f"topic_1:{topic.id}")
+        self.assertEqual(job.state, task.JobState.cancelled)
+        self.assertEqual((await db.get_topic(topic.id)).status, db.Status.failed)
+
+
+if __name__ == "__main__":
+    unittest.main()
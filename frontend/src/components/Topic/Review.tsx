@@ -1,9 +1,9 @@
-import type { ReviewAnnotation, Review as ReviewType, Submission } from "@/lib/typing";
+import type { ReviewAnalysis, ReviewAnnotation, Review as ReviewType, Submission } from "@/lib/typing";
 import { BookOpen, Bug, ChevronLeft, CircleQuestionMark, MessageSquare, PenTool, Percent, Sparkle, Sparkles } from "lucide-react";
 import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { BarLoader } from "react-spinners";
 import { HoverCard, HoverCardContent, HoverCardTrigger } from "../ui/hover-card";
-import api from "@/lib/api";
+import api, { listen, stream } from "@/lib/api";
 import axios from "axios";
 import { error } from "../Toast";
 import { useNavigate } from "react-router";
@@ -31,9 +31,11 @@ function Review({ submissionId }: { submissionId: string }) {
     const [reviewId, setReviewId] = useState<string>();
     const [status, setStatus] = useState<"no_review" | "reviewing" | "failed" | "done" | "error">("reviewing");
     const [review, setReview] = useState<ReviewType & { submission: string }>();
+    const [analysis, setAnalysis] = useState<ReviewAnalysis>();
+    const [streamed, setStreamed] = useState<Partial<ReviewType>>();
+    const stopStream = useRef<() => void>(undefined);
     const [currentAnnotation, setCurrentAnnotation] = useState<Annotation | null>(null);
     const [clickToReveal, setCTR] = useState<boolean>(false);
-    const interval = useRef<any>(null);
 
     const getReviewId = useCallback(async () => {
         try {
@@ -66,19 +68,25 @@ function Review({ submissionId }: { submissionId: string }) {
                 setStatus("error");
         }
     }, [submissionId, navigator]);
+    const showReview = useCallback(async (data: ReviewType) => {
+        if (data.status == "pending") {
+            setAnalysis(data.analysis);
+            return setStatus("reviewing");
+        }
+        if (data.status == "failed")
+            return setStatus("failed");
+        const submission = await getSubmission();
+        setReview({
+            ...data,
+            submission: submission!.submission
+        });
+        setStatus('done');
+    }, [getSubmission]);
     const getReview = useCallback(async () => {
         if (!reviewId) return;
         try {
             const response = await api.get<ReviewType>(`/review?id=${reviewId}`);
-            if (response.data.status == "pending")
-                return setStatus("reviewing");
-            const submission = await getSubmission();
-            setReview({
-                ...response.data,
-                submission: submission!.submission
-            });
-            setStatus('done');
-            clearInterval(interval.current);
+            await showReview(response.data);
         } catch (err) {
             console.error(err);
             if (axios.isAxiosError(err) && err.status == 404) {
@@ -87,17 +95,15 @@ function Review({ submissionId }: { submissionId: string }) {
             } else
                 setStatus("error");
         }
-    }, [reviewId, getSubmission, navigator]);
+    }, [reviewId, showReview, navigator]);
     useEffect(() => {
         if (!reviewId) return;
-        getReview();
-        interval.current = setInterval(() => void getReview(), 5000);
-        return () => clearInterval(interval.current);
-    }, [reviewId, getReview]);
-    useEffect(() => {
-        if (status == "error" || status == "done" || status == "failed")
-            clearInterval(interval.current);
-    }, [status]);
+        return listen<ReviewType>(
+            `/review/events?id=${reviewId}`,
+            (_, data) => void showReview(data),
+            () => void getReview()
+        );
+    }, [reviewId, showReview, getReview]);
     useEffect(() => {
         if (!review) return;
         // Trigger animation shortly after mount
@@ -105,20 +111,36 @@ function Review({ submissionId }: { submissionId: string }) {
         return () => clearTimeout(timer);
     }, [review]);
 
-    const reviewNow = useCallback(async () => {
-        try {
-            const response = await api.post<string>(`/review?submission_id=${submissionId}`);
-            setStatus("reviewing");
-            setReviewId(response.data);
-        } catch (err) {
-            console.error(err);
-            if (axios.isAxiosError(err) && err.status == 404) {
-                error("Submission or review not found");
-                navigator("/");
-            } else
-                setStatus("error");
-        }
-    }, [submissionId, navigator]);
+    useEffect(() => () => stopStream.current?.(), []);
+
+    const reviewNow = useCallback(() => {
+        setStatus("reviewing");
+        setStreamed({});
+        let id: string | undefined, failed = false;
+        stopStream.current = stream(`/review/stream?submission_id=${submissionId}`, (event, data) => {
+            if (event == "review")
+                id = data as string;
+            else if (event == "field") {
+                const { name, value } = data as { name: keyof ReviewType, value: unknown };
+                setStreamed(streamed => ({ ...streamed, [name]: value }));
+            } else if (event == "annotation")
+                setStreamed(streamed => ({
+                    ...streamed,
+                    annotations: [...streamed?.annotations ?? [], data as ReviewAnnotation]
+                }));
+            else if (event == "failed") {
+                failed = true;
+                setStatus("failed");
+            }
+        }, (err) => {
+            if (err) console.error(err);
+            if (failed) return;
+            // The stored review has the quick fixes merged in, and is still there if
+            // the stream broke off
+            if (id) setReviewId(id);
+            else if (err) setStatus("error");
+        });
+    }, [submissionId]);
 
     const annotations = useMemo<Annotation[]>(() => {
         if (!review) return [];
@@ -177,6 +199,20 @@ function Review({ submissionId }: { submissionId: string }) {
                     <p className="text-xl px-10 text-center lg:p-0">The AI is reviewing your submission based on TOEIC standards</p>
                 </div>
                 <BarLoader width={300} />
+                {analysis && <div className="flex flex-row gap-5 text-lg text-gray-600">
+                    <p>{analysis.word_count}{analysis.target_words ? ` / ${analysis.target_words}` : ""} words</p>
+                    <p>{analysis.sentence_count} sentences</p>
+                    <p>{analysis.annotations.length} quick fixes found</p>
+                </div>}
+                {streamed?.score_range && <p className="text-xl font-bold text-indigo-700">
+                    {streamed.score_range[0]} - {streamed.score_range[1]}
+                </p>}
+                {streamed?.overall_feedback && <p className="text-lg px-10 lg:w-3/5 text-center text-gray-600">
+                    {streamed.overall_feedback}
+                </p>}
+                {streamed?.annotations && <p className="text-lg text-gray-600">
+                    {streamed.annotations.length} annotations so far
+                </p>}
             </div>
                 : status == "failed"
                     ? <div className="m-auto flex flex-col items-center gap-5">
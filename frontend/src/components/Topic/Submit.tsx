@@ -1,4 +1,4 @@
-import api from "@/lib/api";
+import api, { listen } from "@/lib/api";
 import type { Submission, Topic } from "@/lib/typing";
 import axios from "axios";
 import { useCallback, useEffect, useRef, useState } from "react";
@@ -15,18 +15,14 @@ function Submit({ topicId: id, preloadedData }: { topicId: string, preloadedData
     const [timeLeft, setTimeLeft] = useState<number>(0);
     const [confirmed, setConfirm] = useState<boolean>(false);
     const [submissionStatus, setSubmissionStatus] = useState<"sending" | "sent">();
-    const topicReloadTimer = useRef<any>(null);
     const submissionTimer = useRef<any>(null);
 
     const getTopic = useCallback(async () => {
         try {
             const response = await api.get<Topic>(`/topic?id=${id}`);
             setTopic(response.data);
-            if (response.data.status != "pending") {
-                if (response.data.status == "done")
-                    setTimeLeft((response.data.part == "2" ? 10 : 30) * 60);
-                clearInterval(topicReloadTimer.current);
-            }
+            if (response.data.status == "done")
+                setTimeLeft((response.data.part == "2" ? 10 : 30) * 60);
         } catch (err) {
             if (axios.isAxiosError(err) && err.status == 404) {
                 error("Topic not found >:(");
@@ -35,14 +31,18 @@ function Submit({ topicId: id, preloadedData }: { topicId: string, preloadedData
             console.error(err);
         }
     }, [id, navigator]);
+    const waiting = !topic || topic.status == "pending";
     useEffect(() => {
         if (preloadedData && preloadedData.status == "done")
             return void setTimeLeft((preloadedData.part == "2" ? 10 : 30) * 60);
-        if (topic && topic.status != "pending")
+        if (!waiting)
             return;
-        topicReloadTimer.current = setInterval(() => void getTopic(), 1000);
-        return () => clearInterval(topicReloadTimer.current);
-    }, [preloadedData, topic, getTopic]);
+        return listen<Topic>(`/topic/events?id=${id}`, (status, data) => {
+            setTopic(data);
+            if (status == "done")
+                setTimeLeft((data.part == "2" ? 10 : 30) * 60);
+        }, () => void getTopic());
+    }, [id, preloadedData, waiting, getTopic]);
     useEffect(() => {
         submissionTimer.current = setInterval(
             () => timeLeft > 0 && confirmed
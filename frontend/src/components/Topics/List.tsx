@@ -1,5 +1,5 @@
 import api from "@/lib/api";
-import type { Topic } from "@/lib/typing";
+import type { ListedTopic, Page } from "@/lib/typing";
 import { reduceWords } from "@/lib/utils";
 import { Mail, NotebookText, Plus } from "lucide-react";
 import { useCallback, useEffect, useState } from "react";
@@ -7,17 +7,18 @@ import { useNavigate } from "react-router";
 
 function List() {
     const navigator = useNavigate();
-    const [topics, setTopics] = useState<(Topic & { icon: typeof Mail })[]>();
+    const [topics, setTopics] = useState<(ListedTopic & { icon: typeof Mail })[]>();
+    const [cursor, setCursor] = useState<string>();
 
-    const getTopics = useCallback(async () => {
+    const getTopics = useCallback(async (cursor?: string) => {
         try {
-            const response = await api.get<Topic[]>("/topics");
-            setTopics(
-                response.data.map(val => ({
-                    ...val,
-                    icon: val.part == "2" ? Mail : NotebookText
-                }))
-            );
+            const response = await api.get<Page<ListedTopic>>("/topics", { params: { cursor } });
+            const page = response.data.items.map(val => ({
+                ...val,
+                icon: val.part == "2" ? Mail : NotebookText
+            }));
+            setTopics(topics => cursor && topics ? [...topics, ...page] : page);
+            setCursor(response.data.next_cursor);
         } catch (error) {
             console.error(error);
         }
@@ -52,6 +53,12 @@ function List() {
                 </div>
             </div>
         </div>
+        {cursor && <button
+            className="mx-auto px-5 py-2 border-2 rounded-md text-lg text-slate-600 hover:border-slate-500 transition-all duration-150 cursor-pointer"
+            onClick={() => void getTopics(cursor)}
+        >
+            Load more
+        </button>}
     </div>;
 }
 
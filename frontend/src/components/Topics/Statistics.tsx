@@ -26,7 +26,7 @@ function Statics() {
                 {[
                     { label: 'Essays written', value: statistics.total_submission, icon: FileText },
                     { label: 'Average score', value: `${statistics.average_score.toFixed(0)}`, icon: ChartNoAxesCombined },
-                    { label: 'Improvement rate', value: `+${(statistics.improvement_rate * 100).toFixed(1)}%`, icon: Percent, hiddenOnMobile: true },
+                    { label: 'Improvement rate', value: `${statistics.improvement_rate < 0 ? '' : '+'}${(statistics.improvement_rate * 100).toFixed(1)}%`, icon: Percent, hiddenOnMobile: true },
                     { label: 'Total time', value: `${ms(statistics.total_time)}`, icon: Clock, hiddenOnMobile: true },
                 ].map((stat, idx) => (
                     <div key={idx} className={cn(
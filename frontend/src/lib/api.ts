@@ -1,5 +1,78 @@
 import axios from "axios";
+import type { Status } from "./typing";
 
-export default axios.create({
+const api = axios.create({
     baseURL: import.meta.env.MODE == "production" ? "/api" : import.meta.env.VITE_BACKEND_URL || "http://localhost:8000"
 });
+
+export default api;
+
+/**
+ * Listen to a status stream, which sends the current state then the final one.
+ * A dropped or refused connection calls `onError` and is opened again after a
+ * while, until the final state comes.
+ * Returns a function that closes the stream.
+ */
+export function listen<T>(path: string, onEvent: (status: Status, data: T) => void, onError?: () => void) {
+    let source: EventSource | undefined;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    const close = () => {
+        clearTimeout(retry);
+        source?.close();
+        source = undefined;
+    };
+    const open = () => {
+        const current = source = new EventSource(`${api.defaults.baseURL}${path}`);
+        for (const status of ["pending", "done", "failed"] as const)
+            current.addEventListener(status, (event) => {
+                if (current != source) return;
+                onEvent(status, JSON.parse(event.data));
+                if (status != "pending") close();
+            });
+        current.onerror = () => {
+            // Not left to the browser, which gives up once the server is unreachable
+            if (current != source) return;
+            close();
+            onError?.();
+            retry = setTimeout(open, 5000);
+        };
+    };
+    open();
+    return close;
+}
+
+/**
+ * POST to a Server-Sent Events endpoint, which EventSource can't do, and hand each
+ * event over as it comes. Calls `onEnd` once the response ends, with the error if
+ * it broke off. Returns a function that stops reading.
+ */
+export function stream(
+    path: string,
+    onEvent: (event: string, data: unknown) => void,
+    onEnd: (error?: unknown) => void
+) {
+    const controller = new AbortController();
+    (async () => {
+        const response = await fetch(`${api.defaults.baseURL}${path}`, { method: "POST", signal: controller.signal });
+        if (!response.ok || !response.body)
+            throw new Error(`${response.status} ${response.statusText}`);
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = "";
+        for (let chunk = await reader.read(); !chunk.done; chunk = await reader.read()) {
+            buffer += chunk.value;
+            const messages = buffer.split("\n\n");
+            buffer = messages.pop()!;
+            for (const message of messages) {
+                let event = "message", data = "";
+                for (const line of message.split("\n"))
+                    if (line.startsWith("event:")) event = line.slice(6).trim();
+                    else if (line.startsWith("data:")) data += line.slice(5).trim();
+                onEvent(event, data ? JSON.parse(data) : null);
+            }
+        }
+    })().then(
+        () => onEnd(),
+        (err) => void (controller.signal.aborted || onEnd(err))
+    );
+    return () => controller.abort();
+}
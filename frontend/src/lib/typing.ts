@@ -31,6 +31,28 @@ export interface Topic {
     reviews: Review[]
 }
 
+export interface ListedTopic {
+    id: string
+
+    status: Status
+
+    type: "writing"
+    part: "2" | "3"
+
+    summary?: Summary
+
+    question_count: number
+    submission_count: number
+    review_count: number
+
+    created_at: string
+}
+
+export interface Page<T> {
+    items: T[]
+    next_cursor?: string
+}
+
 export interface TopicQuestion {
     id: string
     topic_id: string
@@ -64,6 +86,17 @@ export interface DetailScore {
     task_fulfillment: number
 }
 
+export interface ReviewAnalysis {
+    word_count: number
+    target_words?: number
+    sentence_count: number
+    average_sentence_length: number
+    longest_sentence: number
+    unique_word_ratio: number
+    repeated_words: string[]
+    annotations: ReviewAnnotation[]
+}
+
 export interface Review {
     id: string
 
@@ -79,6 +112,7 @@ export interface Review {
     detail_score?: DetailScore
     annotations?: ReviewAnnotation[]
     improvement_suggestions?: string[]
+    analysis?: ReviewAnalysis
 
     created_at: string
 }